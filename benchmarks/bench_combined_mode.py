@@ -0,0 +1,120 @@
+"""
+Benchmark: two-step (classify + analyze) vs combined (single request) OpenAI flow.
+
+Runs both flows over sample OCR texts and reports latency and token usage
+(from response.usage) per flow. Needs OPENAI_API_KEY and OPENAI_MODEL, or
+OPENAI_BASE_URL pointing at an OpenAI-compatible server.
+
+Usage:
+    python benchmarks/bench_combined_mode.py [--runs 3] [--json] [sample.txt ...]
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+load_dotenv()
+
+import openai_service
+
+SAMPLES_DIR = Path(__file__).resolve().parent / "samples"
+
+
+class UsageRecorder:
+    """Wraps client.chat.completions.create to count requests and tokens."""
+
+    def __init__(self, create):
+        self._create = create
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    async def __call__(self, *args, **kwargs):
+        response = await self._create(*args, **kwargs)
+        self.requests += 1
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            self.prompt_tokens += usage.prompt_tokens or 0
+            self.completion_tokens += usage.completion_tokens or 0
+        return response
+
+
+async def run_two_step(text: str) -> str:
+    classification = await openai_service.classify_document(text)
+    doc_type = classification.get("document_type", "GeneralDocument")
+    await openai_service.analyze_document_by_type(text, doc_type)
+    return doc_type
+
+
+async def run_combined(text: str) -> str:
+    result = await openai_service.classify_and_analyze(text)
+    return result.get("document_type", "GeneralDocument")
+
+
+async def benchmark(paths, runs: int) -> list:
+    completions = openai_service.get_client().client.chat.completions
+    recorder = UsageRecorder(completions.create)
+    completions.create = recorder
+
+    rows = []
+    for path in paths:
+        text = Path(path).read_text(encoding="utf-8")
+        for flow_name, flow in (("two_step", run_two_step), ("combined", run_combined)):
+            latencies = []
+            doc_types = set()
+            recorder.reset()
+            for _ in range(runs):
+                start = time.perf_counter()
+                doc_types.add(await flow(text))
+                latencies.append(time.perf_counter() - start)
+            rows.append({
+                "sample": Path(path).name,
+                "flow": flow_name,
+                "document_type": ", ".join(sorted(doc_types)),
+                "median_seconds": round(statistics.median(latencies), 3),
+                "requests_per_doc": recorder.requests / runs,
+                "prompt_tokens_per_doc": recorder.prompt_tokens / runs,
+                "completion_tokens_per_doc": recorder.completion_tokens / runs,
+            })
+    return rows
+
+
+def print_table(rows: list) -> None:
+    header = f"{'sample':<22}{'flow':<10}{'type':<16}{'median s':>10}{'reqs':>6}{'prompt tok':>12}{'compl tok':>11}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(
+            f"{row['sample']:<22}{row['flow']:<10}{row['document_type']:<16}"
+            f"{row['median_seconds']:>10.3f}{row['requests_per_doc']:>6.1f}"
+            f"{row['prompt_tokens_per_doc']:>12.0f}{row['completion_tokens_per_doc']:>11.0f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("samples", nargs="*", help="OCR text files (default: benchmarks/samples/*.txt)")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per sample and flow")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    paths = args.samples or sorted(str(p) for p in SAMPLES_DIR.glob("*.txt"))
+    rows = asyncio.run(benchmark(paths, args.runs))
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Benchmark: streaming DOCX extraction (docx_extract) vs the python-docx object model.
+
+python-docx parses the whole document into its object model and the old
+extractor joined only `doc.paragraphs`; docx_extract streams the XML parts
+and also reads tables, headers, footers and text boxes. "python-docx-full"
+is python-docx made to read the same parts (text boxes excepted). Reports
+latency, the peak memory growth of a fresh process running the extractor
+once (max RSS, so lxml's C allocations count) and the characters each path
+extracts.
+
+Documents default to generated ones: a form-like page (header, footer and
+a field table) repeated `--pages` times, at each size in `--sizes`.
+
+Usage:
+    python benchmarks/bench_docx.py [--sizes 10,100,500] [--runs 5] [--json] [file.docx ...]
+"""
+import io
+import sys
+import json
+import time
+import argparse
+import resource
+import statistics
+import subprocess
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import docx_extract
+
+
+def generate(pages: int) -> bytes:
+    """A KYC-style form: fields in a table, header and footer, `pages` times."""
+    from docx import Document
+
+    document = Document()
+    document.sections[0].header.paragraphs[0].text = "ACME BANK - Customer Onboarding Form"
+    document.sections[0].footer.paragraphs[0].text = "Form KYC-01 | Confidential"
+    for page in range(pages):
+        document.add_heading(f"Applicant {page + 1}", level=1)
+        document.add_paragraph("Please fill in every field in block letters. " * 5)
+        table = document.add_table(rows=8, cols=2)
+        for row, (label, value) in enumerate([
+            ("Name", f"APPLICANT NUMBER {page}"), ("Father's Name", "RAMESH KUMAR"),
+            ("Date of Birth", "01/02/1990"), ("PAN Number", "ABCDE1234F"),
+            ("Aadhar Number", "1234 5678 9012"), ("Address", "12 MG Road, Bengaluru 560001"),
+            ("Account Number", f"00{page:08d}"), ("Signature", "Yes"),
+        ]):
+            table.cell(row, 0).text = label
+            table.cell(row, 1).text = value
+        document.add_page_break()
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def python_docx_text(file_bytes: bytes) -> str:
+    """The previous extractor: paragraphs of the body only."""
+    from docx import Document
+
+    document = Document(io.BytesIO(file_bytes))
+    return "\n".join(paragraph.text for paragraph in document.paragraphs).strip()
+
+
+def python_docx_full_text(file_bytes: bytes) -> str:
+    """python-docx reading headers, paragraphs, table cells and footers."""
+    from docx import Document
+
+    document = Document(io.BytesIO(file_bytes))
+    lines = [p.text for section in document.sections for p in section.header.paragraphs]
+    lines += [p.text for p in document.paragraphs]
+    for table in document.tables:
+        lines += [" | ".join(cell.text for cell in row.cells) for row in table.rows]
+    lines += [p.text for section in document.sections for p in section.footer.paragraphs]
+    return "\n".join(line for line in lines if line.strip()).strip()
+
+
+def streaming_text(file_bytes: bytes) -> str:
+    return docx_extract.extract(file_bytes)["text"].strip()
+
+
+EXTRACTORS = {"python-docx": python_docx_text, "python-docx-full": python_docx_full_text, "streaming": streaming_text}
+
+
+def peak_rss_mb(extractor: str, file_bytes: bytes) -> float:
+    """Growth of max RSS while a fresh process runs `extractor` once (libraries imported first)."""
+    with tempfile.NamedTemporaryFile(suffix=".docx") as document:
+        document.write(file_bytes)
+        document.flush()
+        result = subprocess.run(
+            [sys.executable, __file__, "--rss-of", extractor, document.name],
+            capture_output=True, text=True, check=True,
+        )
+    return float(result.stdout.strip())
+
+
+def _max_rss_kb() -> int:
+    # ru_maxrss of a child started by a large parent keeps the parent's peak,
+    # so Linux's per-address-space high-water mark is preferred
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _print_rss_growth(extractor: str, path: str) -> None:
+    import docx  # noqa: F401
+    file_bytes = Path(path).read_bytes()
+    before = _max_rss_kb()
+    EXTRACTORS[extractor](file_bytes)
+    print(round((_max_rss_kb() - before) / 1024, 2))
+
+
+def measure(extractor: str, file_bytes: bytes, runs: int) -> dict:
+    extract = EXTRACTORS[extractor]
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        text = extract(file_bytes)
+        latencies.append(time.perf_counter() - start)
+    return {
+        "median_seconds": round(statistics.median(latencies), 4),
+        "peak_mb": peak_rss_mb(extractor, file_bytes),
+        "chars": len(text),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help=".docx files (default: generated forms)")
+    parser.add_argument("--sizes", default="10,100,500", help="Pages of the generated documents")
+    parser.add_argument("--runs", type=int, default=5, help="Timed runs per document and extractor")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--rss-of", nargs=2, metavar=("EXTRACTOR", "FILE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.rss_of:
+        _print_rss_growth(*args.rss_of)
+        return
+
+    try:
+        import docx  # noqa: F401
+    except ImportError:
+        sys.exit("python-docx is not installed (needed for the comparison and to generate documents).")
+
+    if args.files:
+        documents = [(Path(path).name, Path(path).read_bytes()) for path in args.files]
+    else:
+        documents = [(f"{pages} pages", generate(pages)) for pages in map(int, args.sizes.split(","))]
+
+    rows = []
+    for name, file_bytes in documents:
+        for extractor in EXTRACTORS:
+            rows.append({"document": name, "kb": len(file_bytes) // 1024, "extractor": extractor,
+                         **measure(extractor, file_bytes, args.runs)})
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    header = f"{'document':<16}{'KB':>7}  {'extractor':<18}{'median s':>10}{'peak MB':>9}{'chars':>9}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(
+            f"{row['document']:<16}{row['kb']:>7}  {row['extractor']:<18}"
+            f"{row['median_seconds']:>10.4f}{row['peak_mb']:>9.2f}{row['chars']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+Load test: documents per second and per-stage latency of a deployment.
+
+Starts the OpenAI stub (benchmarks/stub_openai.py) and the real service
+(`gunicorn main:app` with uvicorn workers, as start.sh does) pointed at it,
+then, for each concurrency level, keeps that many POST /analyze requests
+in flight for `--duration` seconds. Documents are synthetic KYC scans from
+benchmarks/kyc_documents.py unless `--documents` names a directory.
+
+Requests ask for `?debug_timing=1` and send `Cache-Control: no-store`, so
+every document is extracted and analyzed and the response carries its span
+tree. Reported per level: throughput (successful documents per second),
+errors by status, and p50/p95/p99 of the whole request as the client saw
+it and of each pipeline stage (upload_read, extraction, ocr,
+classification.*, analysis, llm.chat_completion, ...). Stages that ran
+several times in a request (OCR of each page, LLM retries) are summed.
+
+`--url` load-tests a server that is already running instead; the stub and
+gunicorn options are then ignored.
+
+Usage:
+    python benchmarks/bench_load.py [--concurrency 1,4,16] [--duration 30] [--workers 3]
+        [--llm-latency-ms 800] [--llm-error-rate 0.01] [--documents DIR] [--url URL] [--json]
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import mimetypes
+import subprocess
+import urllib.error
+import urllib.request
+from pathlib import Path
+from collections import Counter
+
+import httpx
+
+BENCHMARKS = Path(__file__).resolve().parent
+ROOT = BENCHMARKS.parent
+sys.path.insert(0, str(BENCHMARKS))
+
+import kyc_documents
+
+# Stages reported when they occur, in pipeline order
+STAGES = [
+    "upload_read", "cache_lookup", "extraction", "pool.extract_text_from_upload", "image.load", "pdf.text_layer",
+    "pdf.render", "ocr", "ocr.strategy", "classification.local", "classification.llm", "classify_and_analyze",
+    "analysis", "llm.provider", "llm.chat_completion", "pipeline",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _status(url: str):
+    try:
+        with urllib.request.urlopen(url, timeout=2) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        return None
+
+
+def wait_until(url: str, process: subprocess.Popen, timeout: float, successes: int = 1) -> None:
+    """Poll `url` until it returns 200 `successes` times in a row (each gunicorn worker warms up on its own)."""
+    deadline = time.time() + timeout
+    streak = 0
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"{process.args[0]} exited with code {process.returncode}")
+        streak = streak + 1 if _status(url) == 200 else 0
+        if streak >= successes:
+            return
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {timeout:.0f}s")
+
+
+def start_stub(port: int, args, log) -> subprocess.Popen:
+    command = [
+        sys.executable, str(BENCHMARKS / "stub_openai.py"), "--port", str(port),
+        "--latency-ms", str(args.llm_latency_ms), "--latency-sigma", str(args.llm_latency_sigma),
+        "--error-rate", str(args.llm_error_rate), "--rate-limit-rate", str(args.llm_rate_limit_rate),
+        "--timeout-rate", str(args.llm_timeout_rate),
+    ]
+    process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT)
+    wait_until(f"http://127.0.0.1:{port}/stub/stats", process, timeout=30)
+    return process
+
+
+def start_server(port: int, stub_port: int, workers: int, metrics_dir: str, log, timeout: float) -> subprocess.Popen:
+    """gunicorn main:app as start.sh runs it, with OpenAI pointed at the stub."""
+    env = dict(
+        os.environ,
+        OPENAI_BASE_URL=f"http://127.0.0.1:{stub_port}/v1",
+        OPENAI_API_KEY="stub",
+        OPENAI_MODEL="stub-model",
+        LLM_PROVIDERS="openai",
+        PROMETHEUS_MULTIPROC_DIR=metrics_dir,
+    )
+    command = [
+        sys.executable, "-m", "gunicorn", "main:app", "--config", "gunicorn.conf.py",
+        "--workers", str(workers), "--worker-class", "uvicorn.workers.UvicornWorker",
+        "--bind", f"127.0.0.1:{port}", "--timeout", "300",
+    ]
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    wait_until(f"http://127.0.0.1:{port}/ready", process, timeout, successes=2 * workers)
+    return process
+
+
+def load_documents(directory: Path) -> list:
+    """[(file name, bytes, content type)] of the manifest's files, or of every file in `directory`."""
+    manifest = directory / "manifest.json"
+    if manifest.exists():
+        names = [entry["file"] for entry in json.loads(manifest.read_text())]
+    else:
+        names = sorted(path.name for path in directory.iterdir() if path.is_file())
+    return [
+        (name, (directory / name).read_bytes(), mimetypes.guess_type(name)[0] or "application/octet-stream")
+        for name in names
+    ]
+
+
+def stage_durations(node: dict, totals: dict = None) -> dict:
+    """Milliseconds per span name in a debug_timing tree, summed over repeats."""
+    totals = {} if totals is None else totals
+    if node:
+        totals[node["name"]] = totals.get(node["name"], 0) + node["duration_ms"]
+        for child in node.get("children", []):
+            stage_durations(child, totals)
+    return totals
+
+
+async def run_level(base_url: str, documents: list, concurrency: int, duration: float,
+                    request_timeout: float, mode: str = None) -> dict:
+    """Keep `concurrency` requests in flight for `duration` seconds; returns the samples of the level."""
+    samples = []
+    next_document = 0
+    params = {"debug_timing": "1", **({"mode": mode} if mode else {})}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=request_timeout, limits=limits) as client:
+        started = time.perf_counter()
+        stop_at = started + duration
+
+        async def user():
+            nonlocal next_document
+            while time.perf_counter() < stop_at:
+                name, content, content_type = documents[next_document % len(documents)]
+                next_document += 1
+                sent = time.perf_counter()
+                sample = {"document": name}
+                try:
+                    response = await client.post(
+                        "/analyze", params=params, headers={"Cache-Control": "no-store"},
+                        files={"file": (name, content, content_type)},
+                    )
+                    sample["status"] = response.status_code
+                    if response.status_code == 200:
+                        spans = response.json().get("debug_timing", {}).get("spans")
+                        sample["stages"] = stage_durations(spans)
+                except httpx.TimeoutException:
+                    sample["status"] = "timeout"
+                except httpx.HTTPError as e:
+                    sample["status"] = type(e).__name__
+                sample["ms"] = (time.perf_counter() - sent) * 1000
+                samples.append(sample)
+
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return {"concurrency": concurrency, "seconds": elapsed, "samples": samples}
+
+
+def percentile(values: list, q: float) -> float:
+    """Nearest-rank percentile (q in 0-100) of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered) + 0.5) - 1))]
+
+
+def summarize(level: dict) -> dict:
+    samples = level["samples"]
+    ok = [sample for sample in samples if sample["status"] == 200]
+    statuses = Counter(str(sample["status"]) for sample in samples if sample["status"] != 200)
+    latencies = {"request": [sample["ms"] for sample in ok]}
+    for sample in ok:
+        for name, ms in sample.get("stages", {}).items():
+            latencies.setdefault(name, []).append(ms)
+    names = ["request"] + [name for name in STAGES if name in latencies]
+    return {
+        "concurrency": level["concurrency"],
+        "seconds": round(level["seconds"], 1),
+        "requests": len(samples),
+        "ok": len(ok),
+        "errors": dict(statuses),
+        "docs_per_second": round(len(ok) / level["seconds"], 2),
+        "stages": {
+            name: {
+                "count": len(latencies[name]),
+                **{f"p{q}_ms": round(percentile(latencies[name], q), 1) for q in (50, 95, 99)},
+            }
+            for name in names if latencies[name]
+        },
+    }
+
+
+def print_report(results: list) -> None:
+    for result in results:
+        errors = ", ".join(f"{status}: {count}" for status, count in result["errors"].items()) or "none"
+        print(
+            f"\nconcurrency {result['concurrency']}: {result['docs_per_second']} docs/s "
+            f"({result['ok']}/{result['requests']} ok in {result['seconds']}s, errors: {errors})"
+        )
+        print(f"  {'stage':<32}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for name, stage in result["stages"].items():
+            print(f"  {name:<32}{stage['count']:>7}{stage['p50_ms']:>10.1f}{stage['p95_ms']:>10.1f}{stage['p99_ms']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated levels of requests in flight")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per concurrency level")
+    parser.add_argument("--request-timeout", type=float, default=300)
+    parser.add_argument("--mode", choices=["combined", "two_step"], help="?mode= of every request")
+    parser.add_argument("--documents", type=Path, help="Directory of documents (default: generated KYC scans)")
+    parser.add_argument("--count", type=int, default=30, help="Generated documents")
+    parser.add_argument("--formats", default=",".join(kyc_documents.FORMATS), help="Generated formats: png, jpg, pdf")
+    parser.add_argument("--url", help="Load-test this running server instead of starting one")
+    parser.add_argument("--workers", type=int, default=3, help="gunicorn workers")
+    parser.add_argument("--ready-timeout", type=float, default=180, help="Seconds to wait for /ready")
+    parser.add_argument("--llm-latency-ms", type=float, default=800, help="Median latency of the OpenAI stub")
+    parser.add_argument("--llm-latency-sigma", type=float, default=0.4, help="Log-normal spread of the stub latency")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Share of stub answers that are 500s")
+    parser.add_argument("--llm-rate-limit-rate", type=float, default=0.0, help="Share of stub answers that are 429s")
+    parser.add_argument("--llm-timeout-rate", type=float, default=0.0, help="Share of stub requests never answered")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="kyc-load-") as workdir:
+        workdir = Path(workdir)
+        if args.documents:
+            documents = load_documents(args.documents)
+        else:
+            kyc_documents.generate(workdir / "documents", args.count, tuple(args.formats.split(",")))
+            documents = load_documents(workdir / "documents")
+        if not documents:
+            sys.exit("No documents to send.")
+
+        processes = []
+        log_path = workdir / "servers.log"
+        try:
+            with open(log_path, "w") as log:
+                if args.url:
+                    base_url = args.url.rstrip("/")
+                else:
+                    stub_port, port = free_port(), free_port()
+                    processes.append(start_stub(stub_port, args, log))
+                    os.makedirs(workdir / "metrics")
+                    processes.append(start_server(
+                        port, stub_port, args.workers, str(workdir / "metrics"), log, args.ready_timeout
+                    ))
+                    base_url = f"http://127.0.0.1:{port}"
+
+                results = []
+                for concurrency in map(int, args.concurrency.split(",")):
+                    level = asyncio.run(run_level(
+                        base_url, documents, concurrency, args.duration, args.request_timeout, args.mode
+                    ))
+                    results.append(summarize(level))
+        except RuntimeError as e:
+            sys.exit(f"{e}\n\n{log_path.read_text()[-4000:]}")
+        finally:
+            for process in reversed(processes):
+                process.terminate()
+                try:
+                    process.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{len(documents)} documents, {args.duration:.0f}s per level, target {base_url}")
+        print_report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark: per-image OCR latency of the pytesseract and tesserocr backends.
+
+pytesseract starts the tesseract binary (and loads eng.traineddata) for every
+call; tesserocr keeps one API handle loaded per thread. The first call of each
+backend is reported separately as "cold". Needs Tesseract with English
+language data; backends that are not installed are reported and skipped.
+
+Images default to synthetic pages rendered from benchmarks/samples/*.txt.
+
+Usage:
+    python benchmarks/bench_ocr_engines.py [--runs 10] [--psm 6] [--json] [image ...]
+"""
+import sys
+import json
+import time
+import argparse
+import statistics
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageFont
+from dotenv import load_dotenv
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# TESSERACT_CMD / TESSDATA_PREFIX may come from .env
+load_dotenv()
+
+import textract_service
+
+SAMPLES_DIR = Path(__file__).resolve().parent / "samples"
+
+
+def render_sample(path: Path) -> Image.Image:
+    """Draw a text sample onto a white page, roughly like a 200 DPI scan."""
+    lines = path.read_text(encoding="utf-8").splitlines()
+    try:
+        font = ImageFont.load_default(size=28)
+    except TypeError:
+        font = ImageFont.load_default()
+    image = Image.new("L", (1650, 80 + 40 * len(lines)), 255)
+    draw = ImageDraw.Draw(image)
+    for index, line in enumerate(lines):
+        draw.text((60, 40 + 40 * index), line, fill=0, font=font)
+    return image
+
+
+def load_images(paths) -> list:
+    if paths:
+        return [(Path(path).name, Image.open(path)) for path in paths]
+    return [(path.name.replace(".txt", ".png"), render_sample(path)) for path in sorted(SAMPLES_DIR.glob("*.txt"))]
+
+
+def available_engines() -> list:
+    engines = []
+    if textract_service.PYTESSERACT_AVAILABLE:
+        engines.append(textract_service.PytesseractEngine())
+    if textract_service.TESSEROCR_AVAILABLE:
+        engines.append(textract_service.TesserocrEngine())
+    return engines
+
+
+def benchmark(images: list, runs: int, psm: int = None) -> list:
+    rows = []
+    for engine in available_engines():
+        for name, image in images:
+            row = {"backend": engine.name, "image": name}
+            try:
+                start = time.perf_counter()
+                text = engine.image_to_string(image, psm=psm)
+                row["cold_seconds"] = round(time.perf_counter() - start, 3)
+                latencies = []
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    engine.image_to_string(image, psm=psm)
+                    latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                row["error"] = str(e).splitlines()[0] if str(e) else type(e).__name__
+                rows.append(row)
+                continue
+            latencies.sort()
+            row.update({
+                "median_seconds": round(statistics.median(latencies), 3),
+                "p95_seconds": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+                "chars": len(text.strip()),
+            })
+            rows.append(row)
+    return rows
+
+
+def print_table(rows: list) -> None:
+    header = f"{'backend':<13}{'image':<22}{'cold s':>9}{'median s':>10}{'p95 s':>9}{'chars':>7}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        if "error" in row:
+            print(f"{row['backend']:<13}{row['image']:<22}  error: {row['error']}")
+            continue
+        print(
+            f"{row['backend']:<13}{row['image']:<22}{row['cold_seconds']:>9.3f}"
+            f"{row['median_seconds']:>10.3f}{row['p95_seconds']:>9.3f}{row['chars']:>7}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", help="Image files (default: pages rendered from benchmarks/samples/*.txt)")
+    parser.add_argument("--runs", type=int, default=10, help="Timed runs per image and backend")
+    parser.add_argument("--psm", type=int, default=None, help="Tesseract page segmentation mode (default: automatic)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    engines = available_engines()
+    if not engines:
+        sys.exit("Neither pytesseract nor tesserocr is installed.")
+    print(f"Backends: {', '.join(engine.name for engine in engines)}", file=sys.stderr)
+
+    rows = benchmark(load_images(args.images), args.runs, args.psm)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
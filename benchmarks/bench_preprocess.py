@@ -0,0 +1,148 @@
+"""
+Benchmark: image preprocessing time and OCR accuracy.
+
+Every text sample in benchmarks/samples is rendered to an image and degraded
+the way uploads usually are (a tilted phone photo on a dark table, a faded
+scan). Each image is then OCR'd without preprocessing, with the default
+preprocessing profile and with the profile of its document type. Accuracy is
+the similarity (0-1) of the OCR text to the sample text. Without Tesseract
+only the preprocessing times are reported.
+
+Usage:
+    python benchmarks/bench_preprocess.py [--psm 6] [--json]
+"""
+import sys
+import json
+import time
+import difflib
+import argparse
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from dotenv import load_dotenv
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# TESSERACT_CMD / TESSDATA_PREFIX may come from .env
+load_dotenv()
+
+import image_preprocess
+import textract_service
+
+SAMPLES_DIR = Path(__file__).resolve().parent / "samples"
+SAMPLE_TYPES = {
+    "passport": "Passport",
+    "pan": "PAN",
+    "aadhaar": "Aadhar",
+    "driving_licence": "DrivingLicence",
+    "utility_bill": "UtilityBill",
+}
+
+
+def render(text: str) -> Image.Image:
+    lines = text.splitlines()
+    try:
+        font = ImageFont.load_default(size=28)
+    except TypeError:
+        font = ImageFont.load_default()
+    image = Image.new("L", (1650, 80 + 40 * len(lines)), 255)
+    draw = ImageDraw.Draw(image)
+    for index, line in enumerate(lines):
+        draw.text((60, 40 + 40 * index), line, fill=0, font=font)
+    return image
+
+
+def phone_photo(page: Image.Image) -> Image.Image:
+    """The page tilted by 3 degrees on a dark background, as a 12 MP photo."""
+    background = Image.new("L", (4000, 3000), 70)
+    scale = 3000 * 0.7 / max(page.size)
+    page = page.resize((int(page.width * scale), int(page.height * scale)), Image.Resampling.BICUBIC)
+    background.paste(page, ((4000 - page.width) // 2, (3000 - page.height) // 2))
+    photo = background.rotate(3, resample=Image.Resampling.BICUBIC, fillcolor=70)
+    noise = np.random.default_rng(0).normal(0, 12, (3000, 4000))
+    return Image.fromarray(np.clip(np.asarray(photo, dtype=np.float32) + noise, 0, 255).astype(np.uint8))
+
+
+def faded_scan(page: Image.Image) -> Image.Image:
+    """Low contrast grey-on-grey with uneven lighting."""
+    values = np.asarray(page, dtype=np.float32) * 0.35 + 150
+    values += np.linspace(-30, 30, page.width)[None, :]
+    return Image.fromarray(np.clip(values, 0, 255).astype(np.uint8))
+
+
+VARIANTS = {"clean": lambda page: page, "phone_photo": phone_photo, "faded_scan": faded_scan}
+
+
+def similarity(expected: str, actual: str) -> float:
+    normalize = lambda text: " ".join(text.split()).upper()
+    return round(difflib.SequenceMatcher(None, normalize(expected), normalize(actual)).ratio(), 3)
+
+
+def benchmark(psm: int = None) -> list:
+    engine = textract_service.get_ocr_engine() if textract_service.TESSERACT_AVAILABLE else None
+    rows = []
+    for path in sorted(SAMPLES_DIR.glob("*.txt")):
+        text = path.read_text(encoding="utf-8")
+        doc_type = SAMPLE_TYPES.get(path.stem)
+        page = render(text)
+        for variant, degrade in VARIANTS.items():
+            source = degrade(page)
+            for pipeline in ("none", "default", "document_type"):
+                start = time.perf_counter()
+                image = image_preprocess.load(source.copy())
+                if pipeline != "none":
+                    image, _ = image_preprocess.preprocess(image, doc_type if pipeline == "document_type" else None)
+                row = {
+                    "sample": path.stem,
+                    "variant": variant,
+                    "pipeline": pipeline,
+                    "preprocess_seconds": round(time.perf_counter() - start, 3),
+                    "ocr_seconds": None,
+                    "accuracy": None,
+                }
+                if engine is not None:
+                    try:
+                        start = time.perf_counter()
+                        ocr_text = engine.image_to_string(image, psm=psm)
+                        row["ocr_seconds"] = round(time.perf_counter() - start, 3)
+                        row["accuracy"] = similarity(text, ocr_text)
+                    except Exception as e:
+                        row["error"] = str(e).splitlines()[0] if str(e) else type(e).__name__
+                rows.append(row)
+    return rows
+
+
+def print_table(rows: list) -> None:
+    header = f"{'sample':<17}{'variant':<13}{'pipeline':<15}{'prep s':>8}{'ocr s':>8}{'accuracy':>10}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        ocr = f"{row['ocr_seconds']:>8.3f}" if row["ocr_seconds"] is not None else f"{'-':>8}"
+        accuracy = f"{row['accuracy']:>10.3f}" if row["accuracy"] is not None else f"{'-':>10}"
+        print(f"{row['sample']:<17}{row['variant']:<13}{row['pipeline']:<15}{row['preprocess_seconds']:>8.3f}{ocr}{accuracy}")
+    scored = [row for row in rows if row["accuracy"] is not None]
+    if scored:
+        print()
+        for pipeline in ("none", "default", "document_type"):
+            accuracies = [row["accuracy"] for row in scored if row["pipeline"] == pipeline]
+            print(f"mean accuracy {pipeline:<14}{sum(accuracies) / len(accuracies):.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--psm", type=int, default=None, help="Tesseract page segmentation mode (default: automatic)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    if not textract_service.TESSERACT_AVAILABLE:
+        print("Tesseract not installed: reporting preprocessing time only.", file=sys.stderr)
+    rows = benchmark(args.psm)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
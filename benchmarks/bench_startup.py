@@ -0,0 +1,138 @@
+"""
+Benchmark: worker startup time.
+
+Measures, in fresh processes:
+  - import: seconds to `import main`, and which heavy libraries that loads
+    (with their cumulative import time from `python -X importtime`);
+  - server: seconds from starting `uvicorn main:app` until GET /health
+    answers (liveness) and until GET /ready reports ready (warm-up done:
+    extraction workers started, Tesseract resolved, LLM connections open).
+
+The warm-up connects to OpenAI when OPENAI_API_KEY is set; point
+OPENAI_BASE_URL at a local server (or unset the key) to keep the network
+out of the numbers.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--port 8765] [--no-server] [--json]
+"""
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Libraries worth knowing about when they are loaded at import
+HEAVY_MODULES = ["openai", "pandas", "pdfplumber", "docx", "pytesseract", "tesserocr", "numpy", "PIL", "fastapi"]
+
+
+def import_seconds() -> float:
+    code = "import time; started = time.perf_counter(); import main; print(time.perf_counter() - started)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def heavy_imports() -> dict:
+    """Cumulative import seconds of the HEAVY_MODULES that `import main` loads."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    loaded = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        if name in HEAVY_MODULES and cumulative.strip().isdigit():
+            loaded[name] = round(int(cumulative) / 1e6, 3)
+    return loaded
+
+
+def _get(url: str):
+    """(status, JSON body) of a GET, or None while the server is not listening."""
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"null")
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        return None
+
+
+def server_startup(port: int, timeout: float = 120) -> dict:
+    """Seconds from spawning uvicorn until /health answers and until /ready returns 200."""
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    row = {}
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {server.returncode}")
+            if "health_seconds" not in row and _get(f"{base}/health") is not None:
+                row["health_seconds"] = round(time.perf_counter() - started, 3)
+            if "health_seconds" in row:
+                status, body = _get(f"{base}/ready") or (None, None)
+                if status == 200:
+                    row["ready_seconds"] = round(time.perf_counter() - started, 3)
+                    row["warm_up_seconds"] = body["seconds"]
+                    row["steps"] = {name: step["seconds"] for name, step in body["steps"].items()}
+                    return row
+            time.sleep(0.02)
+        raise RuntimeError(f"/ready not reached within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def summarize(values: list) -> dict:
+    return {
+        "median": round(statistics.median(values), 3),
+        "min": round(min(values), 3),
+        "max": round(max(values), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per measurement")
+    parser.add_argument("--port", type=int, default=8765, help="Port for the uvicorn runs")
+    parser.add_argument("--no-server", action="store_true", help="Only measure `import main`")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = {
+        "import_seconds": summarize([import_seconds() for _ in range(args.runs)]),
+        "heavy_modules_at_import": heavy_imports(),
+    }
+    if not args.no_server:
+        runs = [server_startup(args.port) for _ in range(args.runs)]
+        for key in ("health_seconds", "ready_seconds", "warm_up_seconds"):
+            results[key] = summarize([run[key] for run in runs])
+        for step in runs[0]["steps"]:
+            results[f"warm_up.{step}_seconds"] = summarize([run["steps"][step] for run in runs])
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'measurement':<30}{'median s':>10}{'min s':>9}{'max s':>9}")
+    print("-" * 58)
+    for key, value in results.items():
+        if key != "heavy_modules_at_import":
+            print(f"{key:<30}{value['median']:>10.3f}{value['min']:>9.3f}{value['max']:>9.3f}")
+    heavy = results["heavy_modules_at_import"]
+    print("\nHeavy libraries loaded by `import main`: " + (
+        ", ".join(f"{name} ({seconds:.3f}s)" for name, seconds in heavy.items()) or "none"
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Synthetic KYC documents for load tests and benchmarks.
+
+Renders passport, PAN and Aadhaar look-alikes with random holders: names,
+dates and numbers that pass the same checks as real ones (MRZ check digits,
+PAN format, Aadhaar Verhoeff checksum), so the local classifier and field
+extractors treat them like real uploads. Every document is different, so
+the result cache never answers a load test.
+
+Each document is written in one of three forms:
+  - png:  a clean rendering, as from a good scanner;
+  - jpg:  a tilted, noisy phone photo of the card on a dark table;
+  - pdf:  a faded, image-only scanned PDF (OCR path, no text layer).
+
+manifest.json lists every file with its document type, the rendered text
+and the fields a correct extraction returns.
+
+Usage:
+    python benchmarks/kyc_documents.py OUTPUT_DIR [--count 30] [--formats png,jpg,pdf]
+        [--types passport,pan,aadhaar] [--seed 0]
+"""
+import io
+import sys
+import json
+import random
+import argparse
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from field_extractors import mrz_check_digit, _VERHOEFF_D, _VERHOEFF_P
+
+FIRST_NAMES = ["RAHUL", "PRIYA", "AMIT", "SNEHA", "VIKRAM", "ANANYA", "ARJUN", "KAVYA", "ROHAN", "MEERA",
+               "SURESH", "DIVYA", "KARAN", "NEHA", "ADITYA", "POOJA", "SANJAY", "ISHA", "MANOJ", "LAKSHMI"]
+MIDDLE_NAMES = ["KUMAR", "DEVI", "RAJ", "LAL", "", "", ""]
+SURNAMES = ["SHARMA", "KAPOOR", "NAIR", "IYER", "PATEL", "REDDY", "GUPTA", "SINGH", "MEHTA", "DAS",
+            "JOSHI", "RAO", "VERMA", "BOSE", "PILLAI", "KHAN", "CHOPRA", "MISHRA", "GHOSH", "MENON"]
+CITIES = ["JAIPUR, RAJASTHAN", "PUNE, MAHARASHTRA", "KOCHI, KERALA", "LUCKNOW, UTTAR PRADESH",
+          "BENGALURU, KARNATAKA", "CHENNAI, TAMIL NADU", "KOLKATA, WEST BENGAL", "SURAT, GUJARAT"]
+_VERHOEFF_INV = (0, 4, 3, 2, 1, 5, 6, 7, 8, 9)
+_LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+DOCUMENT_TYPES = {"passport": "Passport", "pan": "PAN", "aadhaar": "Aadhar"}
+FORMATS = ("png", "jpg", "pdf")
+
+
+def _date(value: date) -> str:
+    return value.strftime("%d/%m/%Y")
+
+
+def _person(rng: random.Random) -> dict:
+    first, middle, surname = rng.choice(FIRST_NAMES), rng.choice(MIDDLE_NAMES), rng.choice(SURNAMES)
+    return {
+        "given_names": f"{first} {middle}".strip(),
+        "surname": surname,
+        "gender": rng.choice("MF"),
+        "birth": date(1960, 1, 1) + timedelta(days=rng.randrange(365 * 45)),
+    }
+
+
+def verhoeff_digit(number: str) -> str:
+    """The check digit that makes `number` + digit Verhoeff-valid."""
+    checksum = 0
+    for i, digit in enumerate(reversed(number)):
+        checksum = _VERHOEFF_D[checksum][_VERHOEFF_P[(i + 1) % 8][int(digit)]]
+    return str(_VERHOEFF_INV[checksum])
+
+
+def passport(rng: random.Random) -> tuple:
+    """(text, expected fields) of a passport data page with a valid TD3 MRZ."""
+    person = _person(rng)
+    number = rng.choice(_LETTERS) + "".join(rng.choice("0123456789") for _ in range(7))
+    issued = date(2016, 1, 1) + timedelta(days=rng.randrange(365 * 8))
+    expiry = issued.replace(year=issued.year + 10) - timedelta(days=1)
+    place_of_birth = rng.choice(CITIES)
+    place_of_issue = rng.choice(CITIES).split(",")[0]
+
+    names = f"{person['surname']}<<{person['given_names'].replace(' ', '<')}"
+    first_line = f"P<IND{names}".ljust(44, "<")[:44]
+    document = number.ljust(9, "<")
+    birth, expires = person["birth"].strftime("%y%m%d"), expiry.strftime("%y%m%d")
+    optional = "<" * 14
+    composite = (document + mrz_check_digit(document) + birth + mrz_check_digit(birth)
+                 + expires + mrz_check_digit(expires) + optional + mrz_check_digit(optional))
+    second_line = (
+        document + mrz_check_digit(document) + "IND" + birth + mrz_check_digit(birth) + person["gender"]
+        + expires + mrz_check_digit(expires) + optional + mrz_check_digit(optional) + mrz_check_digit(composite)
+    )
+    text = "\n".join([
+        "REPUBLIC OF INDIA", "Type / Code / Passport No.", f"P IND {number}",
+        "Surname", person["surname"], "Given Name(s)", person["given_names"],
+        "Nationality Sex Date of Birth", f"INDIAN {person['gender']} {_date(person['birth'])}",
+        "Place of Birth", place_of_birth, "Place of Issue", place_of_issue,
+        "Date of Issue Date of Expiry", f"{_date(issued)} {_date(expiry)}",
+        first_line, second_line,
+    ])
+    fields = {
+        "Passport Number": number,
+        "Name": f"{person['given_names']} {person['surname']}",
+        "Date of Birth": _date(person["birth"]),
+        "Gender": person["gender"],
+        "Expiry Date": _date(expiry),
+        "Nationality": "INDIAN",
+        "Issue Date": _date(issued),
+        "Place of Birth": place_of_birth,
+        "Place of Issue": place_of_issue,
+    }
+    return text, fields
+
+
+def pan(rng: random.Random) -> tuple:
+    """(text, expected fields) of a PAN card of an individual (fourth letter P)."""
+    person = _person(rng)
+    father = f"{rng.choice(FIRST_NAMES)} {person['surname']}"
+    number = (
+        "".join(rng.choice(_LETTERS) for _ in range(3)) + "P" + person["surname"][0]
+        + "".join(rng.choice("0123456789") for _ in range(4)) + rng.choice(_LETTERS)
+    )
+    name = f"{person['given_names']} {person['surname']}"
+    text = "\n".join([
+        "INCOME TAX DEPARTMENT GOVT. OF INDIA", "Permanent Account Number Card", number,
+        "Name", name, "Father's Name", father, "Date of Birth", _date(person["birth"]), "Signature",
+    ])
+    fields = {
+        "PAN Number": number, "Name": name, "Father's Name": father,
+        "Date of Birth": _date(person["birth"]), "Signature": "Present",
+    }
+    return text, fields
+
+
+def aadhaar(rng: random.Random) -> tuple:
+    """(text, expected fields) of the front of an Aadhaar card with a Verhoeff-valid number."""
+    person = _person(rng)
+    digits = str(rng.randrange(2, 10)) + "".join(rng.choice("0123456789") for _ in range(10))
+    digits += verhoeff_digit(digits)
+    number = f"{digits[:4]} {digits[4:8]} {digits[8:]}"
+    name = f"{person['given_names']} {person['surname']}".title()
+    gender = "Male / MALE" if person["gender"] == "M" else "Female / FEMALE"
+    text = "\n".join([
+        "Government of India", name, f"DOB: {_date(person['birth'])}", gender, number,
+        "Mera Aadhaar, Meri Pehchan",
+    ])
+    fields = {
+        "Aadhar Number": number, "Date of Birth": _date(person["birth"]), "Name": name,
+        "Gender": "Male" if person["gender"] == "M" else "Female", "Address": "Not provided",
+    }
+    return text, fields
+
+
+GENERATORS = {"passport": passport, "pan": pan, "aadhaar": aadhaar}
+
+
+def _font(size: int):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+def render(text: str, rng: random.Random) -> Image.Image:
+    """The text on a card: a coloured header band, a photo box and the lines at 300 dpi."""
+    lines = text.splitlines()
+    width, height = 1650, 140 + 44 * len(lines)
+    card = Image.new("RGB", (width, height), (250, 248, 240))
+    draw = ImageDraw.Draw(card)
+    band = tuple(rng.randrange(40, 160) for _ in range(3))
+    draw.rectangle((0, 0, width, 30), fill=band)
+    draw.rectangle((width - 330, 80, width - 70, 400), fill=(205, 205, 205), outline=(120, 120, 120), width=3)
+    font = _font(30)
+    for index, line in enumerate(lines):
+        draw.text((60, 70 + 44 * index), line, fill=(15, 15, 15), font=font)
+    return card
+
+
+def phone_photo(page: Image.Image, rng: random.Random) -> Image.Image:
+    """The card tilted on a dark background with sensor noise, as a 5 MP photo."""
+    background = Image.new("RGB", (2592, 1944), (60, 55, 50))
+    scale = 1944 * 0.75 / page.height if page.height > page.width else 2592 * 0.75 / page.width
+    page = page.resize((int(page.width * scale), int(page.height * scale)), Image.Resampling.BICUBIC)
+    background.paste(page, ((2592 - page.width) // 2, (1944 - page.height) // 2))
+    photo = background.rotate(rng.uniform(-4, 4), resample=Image.Resampling.BICUBIC, fillcolor=(60, 55, 50))
+    noise = np.random.default_rng(rng.randrange(2 ** 32)).normal(0, 10, (1944, 2592, 1))
+    return Image.fromarray(np.clip(np.asarray(photo, dtype=np.float32) + noise, 0, 255).astype(np.uint8))
+
+
+def faded_scan(page: Image.Image) -> Image.Image:
+    """Greyscale, low contrast and unevenly lit, as from an old flatbed scanner."""
+    values = np.asarray(page.convert("L"), dtype=np.float32) * 0.45 + 130
+    values += np.linspace(-25, 25, page.width)[None, :]
+    return Image.fromarray(np.clip(values, 0, 255).astype(np.uint8))
+
+
+def encode(page: Image.Image, fmt: str, rng: random.Random) -> bytes:
+    buffer = io.BytesIO()
+    if fmt == "png":
+        page.save(buffer, format="PNG")
+    elif fmt == "jpg":
+        phone_photo(page, rng).save(buffer, format="JPEG", quality=85)
+    elif fmt == "pdf":
+        faded_scan(page).save(buffer, format="PDF", resolution=300)
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
+    return buffer.getvalue()
+
+
+def generate(output_dir: Path, count: int, formats=FORMATS, types=tuple(GENERATORS), seed: int = 0) -> list:
+    """Write `count` documents (types and formats in turn) and manifest.json; returns the manifest."""
+    rng = random.Random(seed)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = []
+    for index in range(count):
+        kind = types[index % len(types)]
+        fmt = formats[(index // len(types)) % len(formats)]
+        text, fields = GENERATORS[kind](rng)
+        name = f"{index:04d}_{kind}.{fmt}"
+        (output_dir / name).write_bytes(encode(render(text, rng), fmt, rng))
+        manifest.append({
+            "file": name, "kind": kind, "format": fmt,
+            "document_type": DOCUMENT_TYPES[kind], "text": text, "fields": fields,
+        })
+    (output_dir / "manifest.json").write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output_dir", type=Path)
+    parser.add_argument("--count", type=int, default=30, help="Documents to write")
+    parser.add_argument("--formats", default=",".join(FORMATS), help="Comma-separated: png, jpg, pdf")
+    parser.add_argument("--types", default=",".join(GENERATORS), help="Comma-separated: passport, pan, aadhaar")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    formats = tuple(args.formats.split(","))
+    types = tuple(args.types.split(","))
+    unknown = [value for value in formats + types if value not in FORMATS and value not in GENERATORS]
+    if unknown:
+        sys.exit(f"Unknown format or type: {', '.join(unknown)}")
+    manifest = generate(args.output_dir, args.count, formats, types, args.seed)
+    total = sum((args.output_dir / entry["file"]).stat().st_size for entry in manifest)
+    print(f"{len(manifest)} documents ({total // 1024} KB) and manifest.json written to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
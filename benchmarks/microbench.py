@@ -0,0 +1,496 @@
+"""
+Microbenchmarks of each text extraction branch against a golden corpus.
+
+Cases, one per branch of textract_service's extraction:
+  - pdf_text:     digital PDFs (text layer only);
+  - pdf_scanned:  image-only PDFs (pages rendered and OCR'd);
+  - image_auto:   PNG/JPEG scans through the OCR strategy race;
+  - image_<name>: the same images through one OCR strategy of
+                  ocr_strategies.STRATEGIES (load, prepare, recognize);
+  - docx, csv, xlsx.
+
+Every document is measured in a fresh process, which runs the branch
+in-process (no extraction pool, so no queueing) once untimed and then
+`--runs` times. Reported per document: median wall time, median CPU time
+(Tesseract subprocesses included), growth of peak RSS over the first run
+(libraries imported beforehand), characters extracted and character
+accuracy: the similarity (0-1) of the text to the expected text of the
+corpus manifest. OCR cases are skipped without Tesseract.
+
+The corpus is generated into benchmarks/golden on first use and is the
+same for the same seed and library versions; its hash is stored with each
+result. Real documents can be added to its manifest.json as
+{"file", "case", "expected"} entries ("expected": the correct text, or
+null to skip the accuracy measurement).
+
+Commands:
+    python benchmarks/microbench.py run [--cases pdf_text,docx] [--runs 5] [--label NAME]
+        appends the results to benchmarks/results/history.jsonl
+    python benchmarks/microbench.py compare [--base -2] [--head -1] [--threshold 10]
+        compares two runs of the history (index, label or commit) and exits
+        with 1 when a time or memory figure grew by more than --threshold
+        percent or accuracy dropped by more than --accuracy-drop
+    python benchmarks/microbench.py corpus [--force]
+        (re)writes the golden corpus
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import difflib
+import hashlib
+import argparse
+import platform
+import resource
+import statistics
+import subprocess
+from pathlib import Path
+from datetime import datetime, timezone
+
+BENCHMARKS = Path(__file__).resolve().parent
+ROOT = BENCHMARKS.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(BENCHMARKS))
+
+CORPUS_DIR = BENCHMARKS / "golden"
+HISTORY_PATH = BENCHMARKS / "results" / "history.jsonl"
+SAMPLES_DIR = BENCHMARKS / "samples"
+
+# Corpus family of each case
+CASE_FAMILIES = {"pdf_text": "pdf_text", "pdf_scanned": "pdf_scanned", "image_auto": "image",
+                 "docx": "docx", "csv": "csv", "xlsx": "xlsx"}
+OCR_CASES = ("pdf_scanned", "image_auto")
+
+# Figures compared by `compare`: (key, noise floor below which a change is ignored)
+COMPARED = (("wall_ms", 5.0), ("cpu_ms", 5.0), ("peak_rss_mb", 1.0))
+
+
+def all_cases() -> list:
+    import ocr_strategies
+    return list(CASE_FAMILIES) + [f"image_{name}" for name in ocr_strategies.STRATEGIES]
+
+
+def family(case: str) -> str:
+    return CASE_FAMILIES.get(case, "image")
+
+
+def similarity(expected: str, actual: str) -> float:
+    normalize = lambda text: " ".join(text.split()).upper()
+    return round(difflib.SequenceMatcher(None, normalize(expected), normalize(actual)).ratio(), 3)
+
+
+# --- Golden corpus ------------------------------------------------------------
+
+def text_pdf(pages: list) -> bytes:
+    """A PDF with a text layer: one Helvetica line per string, `pages` being lists of lines."""
+    escape = lambda line: line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        stream = "BT /F1 11 Tf 14 TL 72 760 Td " + " ".join(f"({escape(line)}) Tj T*" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    output = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    output += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return output
+
+
+def form_docx(lines: list, table: list, header: str, footer: str) -> tuple:
+    """(bytes, expected text) of a Word form: paragraphs, a two-column field table, header and footer."""
+    from docx import Document
+
+    document = Document()
+    document.sections[0].header.paragraphs[0].text = header
+    document.sections[0].footer.paragraphs[0].text = footer
+    for line in lines:
+        document.add_paragraph(line)
+    grid = document.add_table(rows=len(table), cols=2)
+    for row, (label, value) in enumerate(table):
+        grid.cell(row, 0).text = label
+        grid.cell(row, 1).text = value
+    buffer = io.BytesIO()
+    document.save(buffer)
+    expected = [header] + lines + [f"{label} | {value}" for label, value in table] + [footer]
+    return buffer.getvalue(), "\n".join(expected)
+
+
+def table_rows(count: int, rng: random.Random) -> list:
+    header = ["Account", "Customer", "Amount", "Due Date"]
+    rows = [[f"ACC-{index:06d}", f"Customer {rng.randrange(500)}", round(rng.uniform(10, 5000), 2),
+             f"2024-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}"] for index in range(count)]
+    return [header] + rows
+
+
+def small_table_text(rows: list, title: str = "Table") -> str:
+    """What table_extract renders for a table small enough to show every row."""
+    lines = [f"{title} ({len(rows) - 1} rows x {len(rows[0])} columns)", "Columns: " + " | ".join(rows[0])]
+    lines += [f"{number}: " + " | ".join(str(value) for value in row) for number, row in enumerate(rows[1:], start=1)]
+    return "\n".join(lines)
+
+
+def build_corpus(directory: Path, seed: int = 0) -> list:
+    """Write the golden corpus and its manifest.json; returns the manifest."""
+    import kyc_documents
+
+    rng = random.Random(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    manifest = []
+
+    def add(name: str, case: str, content: bytes, expected):
+        (directory / name).write_bytes(content)
+        manifest.append({"file": name, "case": case, "expected": expected})
+
+    # Scans: every KYC type as a clean PNG, a phone-photo JPEG and an image-only PDF
+    for kind, generate in kyc_documents.GENERATORS.items():
+        text, _ = generate(rng)
+        page = kyc_documents.render(text, rng)
+        add(f"{kind}.png", "image", kyc_documents.encode(page, "png", rng), text)
+        add(f"{kind}_photo.jpg", "image", kyc_documents.encode(page, "jpg", rng), text)
+        add(f"{kind}_scan.pdf", "pdf_scanned", kyc_documents.encode(page, "pdf", rng), text)
+
+    # Digital PDFs: a short statement and a long one
+    samples = [(SAMPLES_DIR / f"{name}.txt").read_text().splitlines()
+               for name in ("utility_bill", "driving_licence", "passport")]
+    add("statement_3_pages.pdf", "pdf_text", text_pdf(samples), "\n".join("\n".join(page) for page in samples))
+    long_pages = [[f"{line} {page + 1}" for line in samples[page % 3]] * 3 for page in range(30)]
+    add("statement_30_pages.pdf", "pdf_text", text_pdf(long_pages), "\n".join("\n".join(page) for page in long_pages))
+
+    # Word form
+    content, expected = form_docx(
+        ["Customer Onboarding Form", "Please fill in every field in block letters."],
+        [("Name", "PRIYA KAPOOR"), ("Date of Birth", "23/08/1988"), ("PAN Number", "ABCPK1234F"),
+         ("Address", "12 MG Road, Bengaluru 560001")],
+        header="ACME BANK", footer="Form KYC-01 | Confidential",
+    )
+    add("onboarding_form.docx", "docx", content, expected)
+
+    # Tables: small ones are shown whole (expected text known), large ones are sampled
+    small, large = table_rows(8, rng), table_rows(100000, rng)
+    to_csv = lambda rows: "\n".join(",".join(str(value) for value in row) for row in rows).encode()
+    add("accounts_small.csv", "csv", to_csv(small), small_table_text(small))
+    add("accounts_100k.csv", "csv", to_csv(large), None)
+
+    from openpyxl import Workbook
+    for name, rows in (("accounts_small.xlsx", small), ("accounts_20k.xlsx", large[:20001])):
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("Accounts")
+        for row in rows:
+            sheet.append(row)
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        add(name, "xlsx", buffer.getvalue(), small_table_text(rows, "Sheet Accounts") if rows is small else None)
+
+    (directory / "manifest.json").write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+def load_corpus(directory: Path) -> list:
+    manifest = directory / "manifest.json"
+    if not manifest.exists():
+        print(f"Writing the golden corpus to {directory} ...", file=sys.stderr)
+        return build_corpus(directory)
+    return json.loads(manifest.read_text())
+
+
+def corpus_hash(directory: Path, manifest: list) -> str:
+    digest = hashlib.sha256((directory / "manifest.json").read_bytes())
+    for entry in manifest:
+        digest.update((directory / entry["file"]).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+# --- Measurement (in a fresh process per document) ---------------------------
+
+def _max_rss_kb() -> int:
+    # Per-address-space high-water mark on Linux (ru_maxrss is inherited from the parent)
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _cpu_seconds() -> float:
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+def _extractor(case: str, filename: str):
+    """The function measured for `case`: file bytes -> text."""
+    import textract_service
+
+    if case.startswith("image_") and case != "image_auto":
+        from PIL import Image
+        import image_preprocess
+        import ocr_strategies
+
+        prepare, psm = ocr_strategies.STRATEGIES[case[len("image_"):]]
+        engine = textract_service.get_ocr_engine()
+
+        def one_strategy(file_bytes):
+            image = image_preprocess.load(Image.open(io.BytesIO(file_bytes)))
+            image.load()
+            return engine.recognize(prepare(image)[0], psm)["text"]
+        return one_strategy
+    if case == "image_auto":
+        return lambda file_bytes: textract_service._extract_image(file_bytes)["text"]
+    return lambda file_bytes: textract_service.extract_text_sync(filename, file_bytes)
+
+
+def _ocr_unavailable():
+    """Why OCR cases cannot run here, or None."""
+    import textract_service
+    if not textract_service.TESSERACT_AVAILABLE:
+        return "pytesseract/tesserocr not installed"
+    try:
+        textract_service.warm_ocr_engine()
+    except Exception as e:
+        return f"Tesseract not usable: {str(e).split('.')[0]}"
+    return None
+
+
+def measure(case: str, path: Path, runs: int, expected) -> dict:
+    """Runs in the child process; see the module docstring."""
+    import textract_service
+
+    # What an extraction worker has loaded before its first document
+    reason = _ocr_unavailable()
+    if reason and (case in OCR_CASES or case.startswith("image_")):
+        return {"skipped": reason}
+    if reason and textract_service.TESSERACT_AVAILABLE:
+        textract_service.get_ocr_engine()
+    for module in ("docx_extract", "table_extract", "openpyxl", "pdfplumber"):
+        try:
+            __import__(module)
+        except ImportError:
+            pass
+
+    extract = _extractor(case, path.name)
+    file_bytes = path.read_bytes()
+    rss_before = _max_rss_kb()
+    started = time.perf_counter()
+    text = extract(file_bytes) or ""
+    first_ms = (time.perf_counter() - started) * 1000
+    peak_rss_mb = (_max_rss_kb() - rss_before) / 1024
+
+    walls, cpus = [], []
+    for _ in range(runs):
+        started, cpu_started = time.perf_counter(), _cpu_seconds()
+        extract(file_bytes)
+        walls.append((time.perf_counter() - started) * 1000)
+        cpus.append((_cpu_seconds() - cpu_started) * 1000)
+    return {
+        "wall_ms": round(statistics.median(walls), 2),
+        "cpu_ms": round(statistics.median(cpus), 2),
+        "first_ms": round(first_ms, 2),
+        "peak_rss_mb": round(peak_rss_mb, 2),
+        "chars": len(text),
+        "accuracy": similarity(expected, text) if expected is not None else None,
+    }
+
+
+def measure_in_child(case: str, entry: dict, corpus: Path, runs: int) -> dict:
+    result = subprocess.run(
+        [sys.executable, __file__, "--measure", case, str(corpus), entry["file"], str(runs)],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        return {"error": (result.stderr.strip().splitlines() or ["exit code %d" % result.returncode])[-1]}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _child(case: str, corpus: str, file: str, runs: str) -> None:
+    import logging
+    logging.disable(logging.WARNING)  # extraction logs would interleave with the result
+    entry = next(entry for entry in json.loads((Path(corpus) / "manifest.json").read_text()) if entry["file"] == file)
+    print(json.dumps(measure(case, Path(corpus) / file, int(runs), entry.get("expected"))))
+
+
+# --- History ------------------------------------------------------------------
+
+def _git_commit() -> str:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def read_history(path: Path) -> list:
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text().splitlines() if line.strip()]
+
+
+def pick(history: list, selector: str) -> dict:
+    """A history record by index (-1 = latest), label or commit prefix."""
+    try:
+        return history[int(selector)]
+    except ValueError:
+        pass
+    except IndexError:
+        sys.exit(f"History has {len(history)} runs; no run {selector}.")
+    for record in reversed(history):
+        if record.get("label") == selector or record["commit"].startswith(selector):
+            return record
+    sys.exit(f"No run labelled or committed as {selector!r} in the history.")
+
+
+def print_results(results: list) -> None:
+    header = f"{'case':<26}{'document':<26}{'wall ms':>10}{'cpu ms':>10}{'peak MB':>9}{'chars':>8}{'accuracy':>10}"
+    print(header)
+    print("-" * len(header))
+    for row in results:
+        name = f"{row['case']:<26}{row['document']:<26}"
+        if "skipped" in row or "error" in row:
+            print(name + f"  {'skipped' if 'skipped' in row else 'error'}: {row.get('skipped') or row.get('error')}")
+            continue
+        accuracy = "-" if row["accuracy"] is None else f"{row['accuracy']:.3f}"
+        print(name + f"{row['wall_ms']:>10.1f}{row['cpu_ms']:>10.1f}{row['peak_rss_mb']:>9.1f}{row['chars']:>8}{accuracy:>10}")
+
+
+def run(args) -> None:
+    manifest = load_corpus(args.corpus)
+    cases = args.cases.split(",") if args.cases else all_cases()
+    unknown = [case for case in cases if case not in all_cases()]
+    if unknown:
+        sys.exit(f"Unknown cases: {', '.join(unknown)} (known: {', '.join(all_cases())})")
+
+    results = []
+    for case in cases:
+        for entry in manifest:
+            if entry["case"] == family(case):
+                print(f"{case} {entry['file']} ...", file=sys.stderr)
+                results.append({"case": case, "document": entry["file"],
+                                **measure_in_child(case, entry, args.corpus, args.runs)})
+
+    import textract_service
+    record = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "label": args.label,
+        "corpus": corpus_hash(args.corpus, manifest),
+        "runs": args.runs,
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs",
+        "ocr_backend": textract_service.OCR_BACKEND,
+        "results": results,
+    }
+    if not args.no_save:
+        args.history.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.history, "a") as history:
+            history.write(json.dumps(record) + "\n")
+    if args.json:
+        print(json.dumps(record, indent=2))
+        return
+    print_results(results)
+    if not args.no_save:
+        print(f"\nSaved to {args.history} (commit {record['commit']}, corpus {record['corpus']})")
+
+
+def compare(args) -> None:
+    history = read_history(args.history)
+    if not history:
+        sys.exit(f"No runs in {args.history}; run `microbench.py run` first.")
+    base, head = pick(history, args.base), pick(history, args.head)
+    if base["corpus"] != head["corpus"]:
+        print(f"warning: the runs used different corpora ({base['corpus']} vs {head['corpus']})")
+    if base["machine"] != head["machine"]:
+        print(f"warning: the runs were on different machines ({base['machine']} vs {head['machine']})")
+
+    base_rows = {(row["case"], row["document"]): row for row in base["results"]}
+    regressions = []
+    header = f"{'case':<26}{'document':<26}{'figure':<13}{'base':>10}{'head':>10}{'change':>9}"
+    print(f"base {base['commit']} {base.get('label') or ''} ({base['timestamp']})")
+    print(f"head {head['commit']} {head.get('label') or ''} ({head['timestamp']})\n")
+    print(header)
+    print("-" * len(header))
+    for row in head["results"]:
+        previous = base_rows.get((row["case"], row["document"]))
+        if previous is None or "wall_ms" not in row or "wall_ms" not in previous:
+            continue
+        name = f"{row['case']:<26}{row['document']:<26}"
+        for key, noise in COMPARED:
+            change = (row[key] - previous[key]) / previous[key] * 100 if previous[key] else 0.0
+            regressed = change > args.threshold and row[key] - previous[key] > noise
+            if regressed or args.all:
+                print(name + f"{key:<13}{previous[key]:>10.1f}{row[key]:>10.1f}{change:>+8.1f}%" + ("  REGRESSION" if regressed else ""))
+            if regressed:
+                regressions.append((row["case"], row["document"], key))
+        if row["accuracy"] is not None and previous["accuracy"] is not None:
+            drop = previous["accuracy"] - row["accuracy"]
+            regressed = drop > args.accuracy_drop
+            if regressed or args.all or drop < -args.accuracy_drop:
+                print(name + f"{'accuracy':<13}{previous['accuracy']:>10.3f}{row['accuracy']:>10.3f}{-drop:>+9.3f}"
+                      + ("  REGRESSION" if regressed else ""))
+            if regressed:
+                regressions.append((row["case"], row["document"], "accuracy"))
+
+    print(f"\n{len(regressions)} regressions (threshold {args.threshold}%, accuracy drop {args.accuracy_drop})")
+    if regressions:
+        sys.exit(1)
+
+
+def main():
+    if len(sys.argv) == 6 and sys.argv[1] == "--measure":
+        _child(*sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=Path, default=CORPUS_DIR, help="Golden corpus directory")
+    parser.add_argument("--history", type=Path, default=HISTORY_PATH, help="JSON lines history of runs")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Measure and append the results to the history")
+    run_parser.add_argument("--cases", help="Comma-separated cases (default: all)")
+    run_parser.add_argument("--runs", type=int, default=5, help="Timed runs per document")
+    run_parser.add_argument("--label", help="Name of this run, usable with compare --base/--head")
+    run_parser.add_argument("--no-save", action="store_true", help="Do not append to the history")
+    run_parser.add_argument("--json", action="store_true", help="Print the run as JSON")
+
+    compare_parser = commands.add_parser("compare", help="Flag regressions between two runs of the history")
+    compare_parser.add_argument("--base", default="-2", help="Index, label or commit of the baseline (default: -2)")
+    compare_parser.add_argument("--head", default="-1", help="Index, label or commit of the new run (default: -1)")
+    compare_parser.add_argument("--threshold", type=float, default=10, help="Percent growth of a time or memory figure")
+    compare_parser.add_argument("--accuracy-drop", type=float, default=0.01, help="Accuracy drop (0-1) flagged")
+    compare_parser.add_argument("--all", action="store_true", help="Print every figure, not only the changes")
+
+    corpus_parser = commands.add_parser("corpus", help="Write the golden corpus")
+    corpus_parser.add_argument("--seed", type=int, default=0)
+    corpus_parser.add_argument("--force", action="store_true", help="Overwrite an existing corpus")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        run(args)
+    elif args.command == "compare":
+        compare(args)
+    else:
+        if (args.corpus / "manifest.json").exists() and not args.force:
+            sys.exit(f"{args.corpus} already holds a corpus; use --force to overwrite it.")
+        manifest = build_corpus(args.corpus, args.seed)
+        print(f"{len(manifest)} documents written to {args.corpus} (hash {corpus_hash(args.corpus, manifest)})")
+
+
+if __name__ == "__main__":
+    main()
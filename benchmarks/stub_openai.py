@@ -0,0 +1,178 @@
+"""
+A local stand-in for the OpenAI chat completions API, for load tests.
+
+Serves POST /v1/chat/completions in the shape the OpenAI SDK expects, with
+a JSON answer chosen from the prompt: a document type for classification
+prompts, plausible `extracted_data` for analysis prompts. Latency follows a
+log-normal distribution (median and spread are options) and a share of the
+requests fail the way the real API does: 500s, 429s with Retry-After, or
+no answer at all until the client times out.
+
+Point the service at it with
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1 OPENAI_API_KEY=stub OPENAI_MODEL=stub-model
+
+GET /stub/stats returns the requests served so far by outcome.
+
+Usage:
+    python benchmarks/stub_openai.py [--port 8900] [--latency-ms 800] [--latency-sigma 0.4]
+        [--error-rate 0.01] [--rate-limit-rate 0.01] [--timeout-rate 0] [--seed 0]
+"""
+import re
+import json
+import time
+import math
+import random
+import asyncio
+import argparse
+from collections import Counter
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# First keyword found in the document text of the prompt wins
+DOCUMENT_KEYWORDS = [
+    ("Passport", ("REPUBLIC OF", "PASSPORT", "P<")),
+    ("PAN", ("INCOME TAX", "PERMANENT ACCOUNT")),
+    ("Aadhar", ("AADHAAR", "AADHAR", "GOVERNMENT OF INDIA")),
+    ("DrivingLicence", ("DRIVING LICENCE", "DRIVING LICENSE")),
+    ("UtilityBill", ("BILL", "CONSUMER NO", "AMOUNT DUE")),
+]
+_FIELDS = re.compile(r'"extracted_data"\s*:\s*\{(.*?)\}', re.S)
+# What precedes the document text in the service's prompts
+_TEXT_MARKERS = ("OCR Text:\n", "Extracted Text from Document:\n", "Text:\n")
+
+
+class Settings:
+    latency_ms = 800.0
+    latency_sigma = 0.4
+    error_rate = 0.0
+    rate_limit_rate = 0.0
+    timeout_rate = 0.0
+    hang_seconds = 600.0
+    rng = random.Random(0)
+
+
+app = FastAPI(title="OpenAI stub")
+stats = Counter()
+
+
+def _document_type(text: str) -> str:
+    upper = text.upper()
+    for doc_type, keywords in DOCUMENT_KEYWORDS:
+        if any(keyword in upper for keyword in keywords):
+            return doc_type
+    return "GeneralDocument"
+
+
+def _answer(messages: list) -> dict:
+    """The JSON object the model would return for these messages."""
+    prompt = messages[-1].get("content", "") if messages else ""
+    # Only the document text decides the type: the instructions name every type
+    text = prompt
+    for marker in _TEXT_MARKERS:
+        if marker in prompt:
+            text = prompt.rsplit(marker, 1)[-1]
+            break
+    doc_type = _document_type(text)
+    if "single 'document_type' key" in prompt:
+        return {"document_type": doc_type}
+    # Fill the fields the schema asks for (combined prompts list every schema)
+    section = prompt.find(f"### If the document is '{doc_type}'")
+    match = _FIELDS.search(prompt, max(section, 0))
+    names = re.findall(r'"([^"]+)"\s*:', match.group(1)) if match else ["name"]
+    return {
+        "document_type": doc_type,
+        "extracted_data": {name: f"STUB {name.upper()}" for name in names},
+        "summary": f"Synthetic {doc_type} analysis from the OpenAI stub.",
+    }
+
+
+def _latency() -> float:
+    median = Settings.latency_ms / 1000
+    if Settings.latency_sigma <= 0:
+        return median
+    return Settings.rng.lognormvariate(math.log(median), Settings.latency_sigma)
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    roll = Settings.rng.random()
+    if roll < Settings.timeout_rate:
+        stats["timeout"] += 1
+        await asyncio.sleep(Settings.hang_seconds)
+        return JSONResponse({"error": {"message": "stub timeout", "type": "timeout"}}, status_code=504)
+    roll -= Settings.timeout_rate
+    await asyncio.sleep(_latency())
+    if roll < Settings.error_rate:
+        stats["error"] += 1
+        return JSONResponse({"error": {"message": "stub server error", "type": "server_error"}}, status_code=500)
+    roll -= Settings.error_rate
+    if roll < Settings.rate_limit_rate:
+        stats["rate_limited"] += 1
+        return JSONResponse(
+            {"error": {"message": "stub rate limit", "type": "rate_limit_error"}},
+            status_code=429, headers={"Retry-After": "1"},
+        )
+
+    stats["ok"] += 1
+    content = json.dumps(_answer(body.get("messages", [])))
+    prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+    completion_tokens = len(content) // 4
+    return {
+        "id": f"chatcmpl-stub-{stats['ok']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model") or "stub-model",
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+@app.get("/v1")
+@app.get("/v1/")
+async def root():
+    # The service's warm-up opens its connection with a GET of the base URL
+    return {"stub": True}
+
+
+@app.get("/stub/stats")
+async def stub_stats():
+    return dict(stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=800, help="Median response time")
+    parser.add_argument("--latency-sigma", type=float, default=0.4,
+                        help="Spread of the log-normal latency (0: constant; 0.4 puts p99 near 2.5x the median)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share answered with a 429 and Retry-After")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Share left unanswered for --hang-seconds")
+    parser.add_argument("--hang-seconds", type=float, default=600)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    Settings.latency_ms = args.latency_ms
+    Settings.latency_sigma = args.latency_sigma
+    Settings.error_rate = args.error_rate
+    Settings.rate_limit_rate = args.rate_limit_rate
+    Settings.timeout_rate = args.timeout_rate
+    Settings.hang_seconds = args.hang_seconds
+    Settings.rng = random.Random(args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import os
+import time
+import logging
+import posixpath
+import zipfile
+from io import BytesIO
+from xml.etree import ElementTree
+from xml.parsers import expat
+
+logger = logging.getLogger(__name__)
+
+# DOCX text is read straight from the zip with an incremental (expat) parser:
+# headers, the body (tables and text boxes included), footnotes, endnotes and
+# footers, in that order. Nothing else of the package is loaded.
+
+# Embedded images are OCR'd when the text has fewer characters than this
+# (scanned pages pasted into a Word file)
+DOCX_OCR_MIN_CHARS = int(os.getenv("DOCX_OCR_MIN_CHARS", "50"))
+# Images OCR'd per document, in document order
+DOCX_OCR_MAX_IMAGES = int(os.getenv("DOCX_OCR_MAX_IMAGES", "5"))
+
+# expat reports namespaced names as "<namespace URI> <local name>"
+_W = "http://schemas.openxmlformats.org/wordprocessingml/2006/main "
+_MC_FALLBACK = "http://schemas.openxmlformats.org/markup-compatibility/2006 Fallback"
+_BLIP = "http://schemas.openxmlformats.org/drawingml/2006/main blip"
+_VML_IMAGE = "urn:schemas-microsoft-com:vml imagedata"
+_R_EMBED = "http://schemas.openxmlformats.org/officeDocument/2006/relationships embed"
+_R_ID = "http://schemas.openxmlformats.org/officeDocument/2006/relationships id"
+_RELS = "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
+
+_P, _T, _R, _TAB, _BR, _CR = (_W + name for name in ("p", "t", "r", "tab", "br", "cr"))
+_TC, _TR, _TXBX = (_W + name for name in ("tc", "tr", "txbxContent"))
+
+# Related parts read after/before the body, by relationship type
+_PARTS_BEFORE = ("header",)
+_PARTS_AFTER = ("footnotes", "endnotes", "footer")
+_OCR_IMAGE_TYPES = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".gif")
+
+
+def _relationships(archive: zipfile.ZipFile, part: str) -> dict:
+    """Relationship id -> (type suffix, zip path of the target) for `part`."""
+    folder, name = posixpath.split(part)
+    rels_path = posixpath.join(folder, "_rels", name + ".rels")
+    if rels_path not in archive.NameToInfo:
+        return {}
+    relationships = {}
+    with archive.open(rels_path) as rels:
+        for _, element in ElementTree.iterparse(rels):
+            if element.tag != _RELS or element.get("TargetMode") == "External":
+                continue
+            target = element.get("Target", "")
+            path = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join(folder, target))
+            relationships[element.get("Id")] = (element.get("Type", "").rsplit("/", 1)[-1], path)
+    return relationships
+
+
+def _main_part(archive: zipfile.ZipFile) -> str:
+    for kind, path in _relationships(archive, "").values():
+        if kind == "officeDocument":
+            return path
+    return "word/document.xml"
+
+
+class _DeadlineReached(Exception):
+    pass
+
+
+def _part_text(archive: zipfile.ZipFile, part: str, images: list = None, deadline: float = None) -> str:
+    """Text of one WordprocessingML part, parsed incrementally with expat.
+
+    Paragraphs become lines, table rows become "cell | cell" lines and text
+    boxes are read once (their VML fallback copy is skipped). No element
+    tree is built: memory is the text read so far. Relationship ids of
+    embedded images are appended to `images` in document order.
+    """
+    lines = []
+    containers = [lines]  # where finished paragraphs go: the part, a table cell or a text box
+    paragraphs = []       # text fragments of the open paragraphs (text boxes nest them)
+    rows = []             # cells of the open table rows (tables nest)
+    skipping = 0  # depth inside mc:Fallback
+    in_run = 0
+    in_text = False
+    blocks = 0
+
+    def start(name, attributes):
+        nonlocal skipping, in_run, in_text
+        if name == _MC_FALLBACK:
+            skipping += 1
+        if skipping:
+            return
+        if name == _T:
+            in_text = True
+        elif name == _R:
+            in_run += 1
+        elif name == _P:
+            paragraphs.append([])
+        elif name == _TC or name == _TXBX:
+            containers.append([])
+        elif name == _TR:
+            rows.append([])
+        elif images is not None and (name == _BLIP or name == _VML_IMAGE):
+            rid = attributes.get(_R_EMBED) or attributes.get(_R_ID)
+            if rid:
+                images.append(rid)
+
+    def text(data):
+        if in_text and paragraphs:
+            paragraphs[-1].append(data)
+
+    def end(name):
+        nonlocal skipping, in_run, in_text, blocks
+        if name == _MC_FALLBACK:
+            skipping -= 1
+        elif skipping:
+            return
+        elif name == _T:
+            in_text = False
+        elif name == _R:
+            in_run -= 1
+        elif name == _TAB:
+            # (w:tab outside a run is a tab stop definition in paragraph properties)
+            if in_run and paragraphs:
+                paragraphs[-1].append("\t")
+        elif (name == _BR or name == _CR) and paragraphs:
+            paragraphs[-1].append("\n")
+        elif name == _P:
+            line = "".join(paragraphs.pop()).strip()
+            if line:
+                containers[-1].append(line)
+            blocks += 1
+            if deadline is not None and blocks % 200 == 0 and time.time() > deadline:
+                raise _DeadlineReached()
+        elif name == _TC:
+            cell = " ".join(containers.pop())
+            if rows:
+                rows[-1].append(cell)
+        elif name == _TR:
+            cells = rows.pop()
+            if any(cells):
+                containers[-1].append(" | ".join(cells))
+        elif name == _TXBX:
+            box = "\n".join(containers.pop())
+            if box:
+                containers[-1].append(box)
+
+    parser = expat.ParserCreate(namespace_separator=" ")
+    parser.buffer_text = True
+    parser.buffer_size = 65536
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.CharacterDataHandler = text
+    with archive.open(part) as stream:
+        try:
+            parser.ParseFile(stream)
+        except _DeadlineReached:
+            logger.warning(f"DOCX extraction deadline reached in {part}")
+    return "\n".join(lines)
+
+
+def extract(file_bytes: bytes, ocr=None, deadline: float = None) -> dict:
+    """Text of a .docx file: {"text", "parts", "images_ocrd"}.
+
+    `ocr(image_bytes)` returns the text of one embedded image; it is only
+    called when the document has fewer than DOCX_OCR_MIN_CHARS characters
+    of text. Raises zipfile.BadZipFile for files that are not a zip.
+    """
+    with zipfile.ZipFile(BytesIO(file_bytes)) as archive:
+        main = _main_part(archive)
+        related = _relationships(archive, main)
+        images = []
+        sections, seen, parts = [], set(), []
+
+        def read(part: str, image_ids: list = None) -> None:
+            if part not in archive.NameToInfo:
+                return
+            text = _part_text(archive, part, image_ids, deadline)
+            parts.append(part)
+            # Sections usually repeat the same header and footer
+            if text and text not in seen:
+                seen.add(text)
+                sections.append(text)
+
+        for kind, path in related.values():
+            if kind in _PARTS_BEFORE:
+                read(path)
+        read(main, images)
+        for wanted in _PARTS_AFTER:
+            for kind, path in related.values():
+                if kind == wanted:
+                    read(path)
+
+        text = "\n".join(sections)
+        images_ocrd = 0
+        if ocr is not None and len(text.strip()) < DOCX_OCR_MIN_CHARS:
+            media = []
+            for rid in images:
+                path = related.get(rid, ("", ""))[1]
+                if path.lower().endswith(_OCR_IMAGE_TYPES) and path in archive.NameToInfo and path not in media:
+                    media.append(path)
+            for path in media[:DOCX_OCR_MAX_IMAGES]:
+                if deadline is not None and time.time() > deadline:
+                    break
+                image_text = ocr(archive.read(path))
+                images_ocrd += 1
+                if image_text:
+                    text = f"{text}\n{image_text}" if text else image_text
+    return {"text": text, "parts": parts, "images_ocrd": images_ocrd}
@@ -0,0 +1,283 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+# Pool kind: "process" (default) runs extraction in separate processes so OCR and
+# PDF parsing never hold the event loop or the GIL; "thread" is the fallback for
+# platforms where a process pool cannot be started.
+EXTRACTION_POOL_KIND = os.getenv("EXTRACTION_POOL_KIND", "process").lower()
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Maximum number of extraction jobs (running + waiting) per server process
+EXTRACTION_MAX_PENDING = int(os.getenv("EXTRACTION_MAX_PENDING", str(EXTRACTION_WORKERS * 4)))
+# Per-job deadline in seconds, measured from submission (queue wait included)
+EXTRACTION_TIMEOUT_SECONDS = float(os.getenv("EXTRACTION_TIMEOUT_SECONDS", os.getenv("MAX_OCR_SECONDS", "55")))
+# Value of the Retry-After header sent when the pool is saturated
+EXTRACTION_RETRY_AFTER = int(os.getenv("EXTRACTION_RETRY_AFTER", "5"))
+
+
+class PoolSaturatedError(Exception):
+    """Raised when the extraction queue is full and the job was not accepted."""
+
+    def __init__(self, retry_after: int = EXTRACTION_RETRY_AFTER):
+        super().__init__("Extraction queue is full")
+        self.retry_after = retry_after
+
+
+class ExtractionTimeoutError(Exception):
+    """Raised when an extraction job does not finish before its deadline."""
+
+
+_executor = None
+_executor_kind = None
+_executor_lock = threading.Lock()
+_pending = 0
+_pending_lock = threading.Lock()
+_initializers = []
+
+
+def register_initializer(func) -> None:
+    """Run func() in every worker (process, or thread in thread mode) as it starts.
+
+    Used to warm per-worker state such as OCR engine handles. Must be called
+    before the executor is created; func must be a picklable module-level
+    function.
+    """
+    if func not in _initializers:
+        _initializers.append(func)
+
+
+def _init_worker(initializers) -> None:
+    for func in initializers:
+        try:
+            func()
+        except Exception as e:
+            logger.warning(f"Extraction worker initializer {func.__name__} failed: {e}")
+
+
+def _create_executor():
+    global _executor_kind
+    if EXTRACTION_POOL_KIND == "process":
+        try:
+            executor = ProcessPoolExecutor(
+                max_workers=EXTRACTION_WORKERS, initializer=_init_worker, initargs=(tuple(_initializers),)
+            )
+            _executor_kind = "process"
+            logger.info(f"Started extraction process pool with {EXTRACTION_WORKERS} workers")
+            return executor
+        except (OSError, NotImplementedError, ImportError) as e:
+            logger.warning(f"Process pool unavailable ({e}). Falling back to thread pool.")
+    _executor_kind = "thread"
+    logger.info(f"Started extraction thread pool with {EXTRACTION_WORKERS} workers")
+    return ThreadPoolExecutor(
+        max_workers=EXTRACTION_WORKERS, thread_name_prefix="extract",
+        initializer=_init_worker, initargs=(tuple(_initializers),)
+    )
+
+
+def get_executor():
+    """Return the shared extraction executor, creating it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = _create_executor()
+        return _executor
+
+
+def _noop() -> None:
+    pass
+
+
+def warm_up() -> list:
+    """Start every worker now (running the registered initializers) instead of on first use.
+
+    Returns one future per worker; they are done once the workers have run
+    their initializers.
+    """
+    executor = get_executor()
+    return [executor.submit(_noop) for _ in range(EXTRACTION_WORKERS)]
+
+
+def _reset_executor(broken) -> None:
+    """Replace a broken process pool (e.g. a worker was OOM-killed)."""
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            logger.warning("Extraction process pool is broken. Restarting it.")
+            broken.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def shutdown() -> None:
+    """Stop the extraction executor; queued jobs are cancelled."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def pending_jobs() -> int:
+    return _pending
+
+
+def pool_kind() -> str:
+    return _executor_kind or EXTRACTION_POOL_KIND
+
+
+def _release_slot(_future=None) -> None:
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+
+
+def _acquire_slot() -> None:
+    global _pending
+    with _pending_lock:
+        if _pending >= EXTRACTION_MAX_PENDING:
+            raise PoolSaturatedError()
+        _pending += 1
+
+
+async def run(func, *args, timeout: float = None, **kwargs):
+    """Run func(*args, deadline=..., **kwargs) on the extraction pool.
+
+    The job receives an absolute wall-clock deadline (time.time() based) so it can
+    stop early and return partial results. If it is still running once the
+    deadline has passed, ExtractionTimeoutError is raised. When the number of
+    jobs in flight has reached EXTRACTION_MAX_PENDING the job is rejected with
+    PoolSaturatedError instead of being queued.
+    """
+    with tracing.span(f"pool.{func.__name__}"):
+        result = await _run(func, args, kwargs, timeout)
+        if tracing.active():
+            result, spans = result
+            tracing.graft(spans)
+        return result
+
+
+def _submit(executor, func, args, kwargs):
+    # Traced requests get the worker's spans back alongside the result
+    if tracing.active():
+        return executor.submit(tracing.call_collecting, func, *args, **kwargs)
+    return executor.submit(func, *args, **kwargs)
+
+
+async def _run(func, args, kwargs, timeout):
+    timeout = EXTRACTION_TIMEOUT_SECONDS if timeout is None else timeout
+    _acquire_slot()
+
+    deadline = time.time() + timeout
+    kwargs = dict(kwargs, deadline=deadline)
+    executor = get_executor()
+    try:
+        future = _submit(executor, func, args, kwargs)
+    except BrokenProcessPool:
+        _reset_executor(executor)
+        executor = get_executor()
+        try:
+            future = _submit(executor, func, args, kwargs)
+        except Exception:
+            _release_slot()
+            raise
+    except Exception:
+        _release_slot()
+        raise
+
+    # The slot is only released once the worker is actually free again, so a job
+    # that overran its deadline still counts against the queue limit.
+    future.add_done_callback(_release_slot)
+
+    try:
+        # Small grace period so a job that honours its deadline can hand back
+        # partial results instead of being reported as a timeout.
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout + 2)
+    except asyncio.TimeoutError:
+        future.cancel()
+        raise ExtractionTimeoutError(f"Extraction did not finish within {timeout:.0f}s")
+    except BrokenProcessPool:
+        _reset_executor(executor)
+        raise
+
+
+async def run_many(func, calls: list, timeout: float = None) -> list:
+    """Run func(*args, deadline=...) for every args tuple in `calls` concurrently.
+
+    The calls are the parts of one document (e.g. PDF pages) and together take
+    a single queue slot. Results come back in the order of `calls`; a call that
+    failed, or had not finished when the shared deadline passed, yields None.
+    Calls still waiting in the queue at the deadline are cancelled.
+    """
+    with tracing.span(f"pool.{func.__name__}", calls=len(calls)):
+        return await _run_many(func, calls, timeout)
+
+
+async def _run_many(func, calls: list, timeout: float = None) -> list:
+    timeout = EXTRACTION_TIMEOUT_SECONDS if timeout is None else timeout
+    if not calls:
+        return []
+    _acquire_slot()
+
+    traced = tracing.active()
+    deadline = time.time() + timeout
+    executor = get_executor()
+    futures = []
+    try:
+        for args in calls:
+            futures.append(_submit(executor, func, args, {"deadline": deadline}))
+    except BrokenProcessPool:
+        _reset_executor(executor)
+        for future in futures:
+            future.cancel()
+        _release_slot()
+        raise
+    except Exception:
+        for future in futures:
+            future.cancel()
+        _release_slot()
+        raise
+
+    # Release the shared slot once the last call has left the pool
+    remaining = [len(futures)]
+    remaining_lock = threading.Lock()
+
+    def _call_done(_future):
+        with remaining_lock:
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                _release_slot()
+
+    for future in futures:
+        future.add_done_callback(_call_done)
+
+    wrapped = [asyncio.wrap_future(future) for future in futures]
+    await asyncio.wait(wrapped, timeout=max(0.0, deadline - time.time()) + 2)
+
+    results = []
+    for index, (future, waiter) in enumerate(zip(futures, wrapped)):
+        if not waiter.done():
+            future.cancel()
+            waiter.cancel()
+            results.append(None)
+        elif waiter.cancelled():
+            results.append(None)
+        elif waiter.exception() is not None:
+            exc = waiter.exception()
+            if isinstance(exc, BrokenProcessPool):
+                _reset_executor(executor)
+            logger.warning(f"Extraction subtask {index} failed: {exc}")
+            results.append(None)
+        elif traced:
+            result, spans = waiter.result()
+            tracing.graft(spans)
+            results.append(result)
+        else:
+            results.append(waiter.result())
+    return results
@@ -0,0 +1,378 @@
+import re
+from datetime import date, timedelta
+from typing import Optional
+
+# Document types with a local extractor. Fields found here are validated or
+# taken from clearly labelled lines, so they take precedence over LLM output.
+SUPPORTED_TYPES = ("Passport", "Aadhar", "PAN", "DrivingLicence")
+
+# Bump whenever the rules change what they extract so cached analyses are not reused
+EXTRACTOR_VERSION = "2"
+
+_DATE = r"(\d{2}[/\-.]\d{2}[/\-.]\d{4})"
+
+# Characters OCR commonly confuses in fields that can only hold digits
+_DIGIT_FIXES = str.maketrans({"O": "0", "Q": "0", "D": "0", "I": "1", "L": "1", "Z": "2", "S": "5", "B": "8", "G": "6"})
+
+_MRZ_NATIONALITIES = {"IND": "INDIAN"}
+
+
+# --- MRZ (ICAO 9303 TD3, passports) -----------------------------------------
+
+def _mrz_value(char: str) -> int:
+    if char == "<":
+        return 0
+    if char.isdigit():
+        return int(char)
+    return ord(char) - ord("A") + 10
+
+
+def mrz_check_digit(field: str) -> str:
+    weights = (7, 3, 1)
+    total = sum(_mrz_value(c) * weights[i % 3] for i, c in enumerate(field))
+    return str(total % 10)
+
+
+def _mrz_date(yymmdd: str, future: bool) -> Optional[date]:
+    """Convert an MRZ YYMMDD date; expiry dates lie in the future, birth dates in the past."""
+    try:
+        yy, mm, dd = int(yymmdd[0:2]), int(yymmdd[2:4]), int(yymmdd[4:6])
+        today = date.today()
+        century = 2000 if future or yy <= today.year % 100 else 1900
+        return date(century + yy, mm, dd)
+    except ValueError:
+        return None
+
+
+def _normalize_mrz_line(line: str) -> str:
+    line = line.strip().upper().replace(" ", "").replace("«", "<")
+    return line
+
+
+def find_mrz_lines(text: str):
+    """Return the two TD3 MRZ lines (44 characters each) if present."""
+    lines = [_normalize_mrz_line(l) for l in (text or "").splitlines()]
+    for i in range(len(lines) - 1):
+        first, second = lines[i], lines[i + 1]
+        if first.startswith("P") and len(first) >= 40 and "<<" in first and len(second) >= 40:
+            return first[:44].ljust(44, "<"), second[:44].ljust(44, "<")
+    return None
+
+
+def parse_mrz_td3(text: str) -> Optional[dict]:
+    """Parse and validate a passport MRZ.
+
+    Returns None unless the passport number, birth date and expiry date check
+    digits all match. Digit-only positions are corrected for common OCR
+    confusions (O/0, I/1, ...) before validation.
+    """
+    lines = find_mrz_lines(text)
+    if not lines:
+        return None
+    first, second = lines
+
+    number = second[0:9]
+    number_check = second[9].translate(_DIGIT_FIXES)
+    nationality = second[10:13]
+    birth = second[13:19].translate(_DIGIT_FIXES)
+    birth_check = second[19].translate(_DIGIT_FIXES)
+    sex = second[20]
+    expiry = second[21:27].translate(_DIGIT_FIXES)
+    expiry_check = second[27].translate(_DIGIT_FIXES)
+    optional = second[28:42]
+    optional_check = second[42].translate(_DIGIT_FIXES)
+    composite_check = second[43].translate(_DIGIT_FIXES)
+
+    if mrz_check_digit(number) != number_check:
+        return None
+    if mrz_check_digit(birth) != birth_check or mrz_check_digit(expiry) != expiry_check:
+        return None
+    composite = number + number_check + birth + birth_check + expiry + expiry_check + optional + optional_check
+    composite_valid = mrz_check_digit(composite) == composite_check
+
+    birth_date = _mrz_date(birth, future=False)
+    expiry_date = _mrz_date(expiry, future=True)
+    if birth_date is None or expiry_date is None:
+        return None
+
+    names = first[5:].split("<<", 1)
+    surname = names[0].replace("<", " ").strip()
+    given_names = names[1].replace("<", " ").strip() if len(names) > 1 else ""
+
+    return {
+        "issuing_country": first[2:5].replace("<", ""),
+        "surname": surname,
+        "given_names": given_names,
+        "passport_number": number.replace("<", ""),
+        "nationality": nationality.replace("<", ""),
+        "date_of_birth": birth_date,
+        "sex": sex if sex in ("M", "F") else None,
+        "expiry_date": expiry_date,
+        "composite_valid": composite_valid,
+    }
+
+
+# --- Aadhaar (Verhoeff checksum) ---------------------------------------------
+
+_VERHOEFF_D = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9), (1, 2, 3, 4, 0, 6, 7, 8, 9, 5),
+    (2, 3, 4, 0, 1, 7, 8, 9, 5, 6), (3, 4, 0, 1, 2, 8, 9, 5, 6, 7),
+    (4, 0, 1, 2, 3, 9, 5, 6, 7, 8), (5, 9, 8, 7, 6, 0, 4, 3, 2, 1),
+    (6, 5, 9, 8, 7, 1, 0, 4, 3, 2), (7, 6, 5, 9, 8, 2, 1, 0, 4, 3),
+    (8, 7, 6, 5, 9, 3, 2, 1, 0, 4), (9, 8, 7, 6, 5, 4, 3, 2, 1, 0),
+)
+_VERHOEFF_P = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9), (1, 5, 7, 6, 2, 8, 3, 0, 9, 4),
+    (5, 8, 0, 3, 7, 9, 6, 1, 4, 2), (8, 9, 1, 6, 0, 4, 3, 5, 2, 7),
+    (9, 4, 5, 3, 1, 2, 6, 8, 7, 0), (4, 2, 8, 6, 5, 7, 3, 9, 0, 1),
+    (2, 7, 9, 3, 8, 0, 6, 4, 1, 5), (7, 0, 4, 6, 9, 1, 3, 2, 5, 8),
+)
+
+
+def verhoeff_valid(number: str) -> bool:
+    checksum = 0
+    for i, digit in enumerate(reversed(number)):
+        checksum = _VERHOEFF_D[checksum][_VERHOEFF_P[i % 8][int(digit)]]
+    return checksum == 0
+
+
+_AADHAAR_RE = re.compile(r"(?<!\d)(?<!\d\s)([2-9]\d{3})\s?(\d{4})\s?(\d{4})(?!\s?\d)")
+
+
+def find_aadhaar_number(text: str) -> Optional[str]:
+    """Return the first Verhoeff-valid 12-digit Aadhaar number as 'XXXX XXXX XXXX'."""
+    for line in (text or "").splitlines():
+        # A 16-digit VID shares the Aadhaar format; skip lines that carry one
+        if re.search(r"\bVID\b", line, re.IGNORECASE):
+            continue
+        for match in _AADHAAR_RE.finditer(line):
+            number = "".join(match.groups())
+            if verhoeff_valid(number):
+                return " ".join(match.groups())
+    return None
+
+
+# --- PAN and driving licence -------------------------------------------------
+
+# Fourth character encodes the holder type (P = person, C = company, ...)
+_PAN_RE = re.compile(r"\b[A-Z]{3}[ABCFGHJLPT][A-Z][0-9]{4}[A-Z]\b")
+_DL_RE = re.compile(r"\b([A-Z]{2})[-\s]?(\d{2})[-\s]?((?:19|20)\d{2})\s?(\d{7})\b")
+
+
+def find_pan_number(text: str) -> Optional[str]:
+    match = _PAN_RE.search(text or "")
+    return match.group(0) if match else None
+
+
+def find_dl_number(text: str) -> Optional[str]:
+    match = _DL_RE.search(text or "")
+    if not match:
+        return None
+    state, rto, year, serial = match.groups()
+    return f"{state}{rto} {year}{serial}"
+
+
+# --- Label helpers -----------------------------------------------------------
+
+def _format_date(value: date) -> str:
+    return value.strftime("%d/%m/%Y")
+
+
+def _parse_date(value: str) -> Optional[date]:
+    day, month, year = re.split(r"[/\-.]", value)
+    try:
+        return date(int(year), int(month), int(day))
+    except ValueError:
+        return None
+
+
+def find_labelled_date(text: str, labels: str) -> Optional[str]:
+    """Return the first DD/MM/YYYY date following one of the labels (regex alternation)."""
+    match = re.search(r"(?:" + labels + r")\W{0,5}" + _DATE, text or "", re.IGNORECASE)
+    if match and _parse_date(match.group(1)):
+        return match.group(1).replace("-", "/").replace(".", "/")
+    return None
+
+
+def find_labelled_value(text: str, labels: str) -> Optional[str]:
+    """Return the value after a label, on the same line ('Name: X') or the next line.
+
+    Only upper-case name-like values are accepted from the next line, so a
+    following label or a number is never picked up by mistake.
+    """
+    lines = (text or "").splitlines()
+    label_re = re.compile(r"^\s*(?:" + labels + r")\s*[:\-]?\s*(.*)$", re.IGNORECASE)
+    for i, line in enumerate(lines):
+        match = label_re.match(line)
+        if not match:
+            continue
+        same_line = match.group(1).strip()
+        if same_line:
+            return same_line
+        for following in lines[i + 1:i + 3]:
+            following = following.strip()
+            if not following:
+                continue
+            if re.fullmatch(r"[A-Z][A-Z .,'\-]{1,60}", following):
+                return following
+            break
+    return None
+
+
+def _find_gender_word(text: str) -> Optional[str]:
+    for word in ("Transgender", "Female", "Male"):
+        if re.search(r"\b" + word + r"\b", text or "", re.IGNORECASE):
+            return word
+    return None
+
+
+# --- Per document type -------------------------------------------------------
+
+def _passport_fields(text: str) -> dict:
+    fields = {}
+    mrz = parse_mrz_td3(text)
+    if mrz:
+        fields["Passport Number"] = mrz["passport_number"]
+        fields["Name"] = " ".join(p for p in (mrz["given_names"], mrz["surname"]) if p)
+        fields["Date of Birth"] = _format_date(mrz["date_of_birth"])
+        if mrz["sex"]:
+            fields["Gender"] = mrz["sex"]
+        fields["Expiry Date"] = _format_date(mrz["expiry_date"])
+        fields["Nationality"] = _MRZ_NATIONALITIES.get(mrz["nationality"], mrz["nationality"])
+
+        # Indian passports are valid for 10 years (5 for minors) less one day, so
+        # their issue date can be confirmed against the MRZ expiry date. Other
+        # countries' validity rules differ: their issue date is left to the LLM.
+        for raw in (re.findall(_DATE, text) if mrz["issuing_country"] == "IND" else []):
+            issued = _parse_date(raw)
+            if not issued:
+                continue
+            for years in (10, 5):
+                try:
+                    expected_expiry = issued.replace(year=issued.year + years) - timedelta(days=1)
+                except ValueError:
+                    continue
+                if expected_expiry == mrz["expiry_date"]:
+                    fields["Issue Date"] = _format_date(issued)
+                    break
+            if "Issue Date" in fields:
+                break
+
+    place_of_birth = find_labelled_value(text, r"Place\s+of\s+Birth")
+    if place_of_birth:
+        fields["Place of Birth"] = place_of_birth
+    place_of_issue = find_labelled_value(text, r"Place\s+of\s+Issue")
+    if place_of_issue:
+        fields["Place of Issue"] = place_of_issue
+    return fields
+
+
+def _aadhaar_fields(text: str) -> dict:
+    fields = {}
+    number = find_aadhaar_number(text)
+    if number:
+        fields["Aadhar Number"] = number
+    dob = find_labelled_date(text, r"DOB|Date\s+of\s+Birth|Birth")
+    if dob:
+        fields["Date of Birth"] = dob
+        # The holder's name is printed on the line right above the DOB
+        lines = text.splitlines()
+        for i, line in enumerate(lines):
+            if dob in line.replace("-", "/").replace(".", "/") and i > 0:
+                candidate = lines[i - 1].strip()
+                if re.fullmatch(r"[A-Za-z][A-Za-z .]{2,60}", candidate) and "india" not in candidate.lower():
+                    fields["Name"] = candidate
+                break
+    gender = _find_gender_word(text)
+    if gender:
+        fields["Gender"] = gender
+    # Only the back of the card carries the address; without the label there is
+    # nothing for the LLM to find either.
+    if not re.search(r"\bAddress\b", text, re.IGNORECASE):
+        fields["Address"] = "Not provided"
+    return fields
+
+
+def _pan_fields(text: str) -> dict:
+    fields = {}
+    number = find_pan_number(text)
+    if number:
+        fields["PAN Number"] = number
+    name = find_labelled_value(text, r"Name")
+    if name:
+        fields["Name"] = name
+    father = find_labelled_value(text, r"Father'?s\s+Name")
+    if father:
+        fields["Father's Name"] = father
+    # Older cards print the birth date without a label; that one is left to the LLM
+    dob = find_labelled_date(text, r"Date\s+of\s+Birth|DOB")
+    if dob:
+        fields["Date of Birth"] = dob
+    if re.search(r"\bSignature\b", text, re.IGNORECASE):
+        fields["Signature"] = "Present"
+    return fields
+
+
+def _driving_licence_fields(text: str) -> dict:
+    fields = {}
+    number = find_dl_number(text)
+    if number:
+        fields["Licence Number"] = number
+    name = find_labelled_value(text, r"Name")
+    if name:
+        fields["Name"] = name
+    dob = find_labelled_date(text, r"DOB|Date\s+of\s+Birth")
+    if dob:
+        fields["Date of Birth"] = dob
+    valid_from = find_labelled_date(text, r"Valid\s+From(?:\s*\(\w+\))?|Date\s+of\s+Issue|Issue\s+Date")
+    if valid_from:
+        fields["Valid From"] = valid_from
+    valid_until = find_labelled_date(text, r"Valid\s+(?:Till|Upto|Until)(?:\s*\(\w+\))?")
+    if valid_until:
+        fields["Valid Until"] = valid_until
+    # The address spans several lines with no reliable end; it is left to the LLM
+    classes = find_labelled_value(text, r"COV|Class\s+of\s+Vehicles?|Vehicle\s+Class(?:es)?")
+    if classes:
+        fields["Vehicle Classes"] = classes
+    return fields
+
+
+_EXTRACTORS = {
+    "Passport": _passport_fields,
+    "Aadhar": _aadhaar_fields,
+    "PAN": _pan_fields,
+    "DrivingLicence": _driving_licence_fields,
+}
+
+
+def extract_fields(text: str, doc_type: str) -> dict:
+    """Extract the fields of a document type that can be found without the LLM.
+
+    Keys match the `extracted_data` keys of the per-type prompts; fields that
+    could not be found are left out.
+    """
+    extractor = _EXTRACTORS.get(doc_type)
+    if not extractor or not text:
+        return {}
+    return extractor(text)
+
+
+def build_summary(doc_type: str, fields: dict) -> str:
+    """Deterministic summary used when every field was extracted locally."""
+    names = {
+        "Passport": "Passport",
+        "Aadhar": "Aadhar card",
+        "PAN": "PAN card",
+        "DrivingLicence": "Driving licence",
+    }
+    summary = f"{names.get(doc_type, 'Document')} of {fields.get('Name', 'the holder')}"
+    details = []
+    for key in ("Passport Number", "Aadhar Number", "PAN Number", "Licence Number"):
+        if key in fields:
+            details.append(f"{key} {fields[key]}")
+    for key in ("Expiry Date", "Valid Until"):
+        if key in fields:
+            details.append(f"valid until {fields[key]}")
+    if details:
+        summary += " (" + ", ".join(details) + ")"
+    return summary + "."
@@ -1,48 +1,164 @@
 import os
 import json
-import logging
+import time
 import asyncio
+import hashlib
+import logging
+import threading
+from io import BytesIO
+from types import SimpleNamespace
 from typing import Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-from dotenv import load_dotenv
+import metrics
+from llm_client import LLMUnavailableError
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
 try:
     import google.generativeai as genai
 except Exception as import_error:  # pragma: no cover
     genai = None
-    logging.error(f"Failed to import google-generativeai: {import_error}")
+    logger.warning(f"google-generativeai not available ({import_error}). Gemini provider is disabled.")
+
+try:
+    from google.api_core import exceptions as google_exceptions
+    # Rate limits, overload and timeouts are raised as LLMUnavailableError (503)
+    _TRANSIENT_ERRORS = (
+        google_exceptions.ResourceExhausted, google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded, google_exceptions.InternalServerError,
+    )
+except ImportError:  # pragma: no cover
+    google_exceptions = None
 
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+# Gemini requests in flight per server process; further calls wait (and can
+# be cancelled while waiting, e.g. when a hedged request loses)
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+# Threads for the blocking file uploads of extract_text_from_file
+GEMINI_UPLOAD_WORKERS = int(os.getenv("GEMINI_UPLOAD_WORKERS", "2"))
+# Uploaded files are reused by content hash; Gemini deletes them after 48 hours
+GEMINI_FILE_TTL_SECONDS = float(os.getenv("GEMINI_FILE_TTL_SECONDS", str(46 * 3600)))
+GEMINI_FILE_CACHE_ENTRIES = int(os.getenv("GEMINI_FILE_CACHE_ENTRIES", "256"))
+
+_configure_lock = threading.Lock()
+_configured = False
+_models = {}  # response MIME type -> GenerativeModel
+_semaphore = None
+_upload_executor = None
+_uploaded_files = OrderedDict()  # sha256 of content -> (uploaded file, upload time)
+_uploads_lock = threading.Lock()
+
+
+def is_configured() -> bool:
+    return genai is not None and bool(GEMINI_API_KEY)
 
 
 def _ensure_client_configured() -> None:
+    """Configure the SDK once per process."""
+    global _configured
     if genai is None:
         raise RuntimeError("google-generativeai is not installed. Add 'google-generativeai' to requirements.txt")
     if not GEMINI_API_KEY:
         raise RuntimeError("GEMINI_API_KEY (or GOOGLE_API_KEY) is not set in environment.")
-    genai.configure(api_key=GEMINI_API_KEY)
+    with _configure_lock:
+        if not _configured:
+            genai.configure(api_key=GEMINI_API_KEY)
+            _configured = True
 
 
 def _get_model(response_mime_type: Optional[str] = None):
-    _ensure_client_configured()
-    generation_config = None
-    if response_mime_type:
-        generation_config = {"response_mime_type": response_mime_type}
-    return genai.GenerativeModel(model_name=GEMINI_MODEL, generation_config=generation_config)
+    """Shared GenerativeModel per response MIME type (models hold no per-request state)."""
+    model = _models.get(response_mime_type)
+    if model is None:
+        _ensure_client_configured()
+        generation_config = None
+        if response_mime_type:
+            generation_config = {"response_mime_type": response_mime_type}
+        model = genai.GenerativeModel(model_name=GEMINI_MODEL, generation_config=generation_config)
+        _models[response_mime_type] = model
+    return model
+
+
+def warm_up() -> None:
+    """Configure the SDK and build the JSON model ahead of the first request."""
+    if is_configured():
+        _get_model(response_mime_type="application/json")
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+    return _semaphore
 
 
 async def _run_blocking(func, *args, **kwargs):
+    """Run a blocking SDK call (file uploads) on the dedicated Gemini upload threads."""
+    global _upload_executor
+    if _upload_executor is None:
+        _upload_executor = ThreadPoolExecutor(max_workers=GEMINI_UPLOAD_WORKERS, thread_name_prefix="gemini-upload")
     loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, lambda: func(*args, **kwargs))
+    return await loop.run_in_executor(_upload_executor, lambda: func(*args, **kwargs))
+
+
+async def _generate(model, contents, **kwargs):
+    """generate_content_async with bounded concurrency, recorded in the LLM metrics."""
+    async with _get_semaphore():
+        started = time.perf_counter()
+        try:
+            response = await model.generate_content_async(contents, **kwargs)
+        except Exception as e:
+            metrics.record_llm_request(GEMINI_MODEL, type(e).__name__, time.perf_counter() - started)
+            if google_exceptions is not None and isinstance(e, _TRANSIENT_ERRORS):
+                raise LLMUnavailableError(f"Gemini request failed: {e}") from e
+            raise
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        usage = SimpleNamespace(
+            prompt_tokens=getattr(usage, "prompt_token_count", 0),
+            completion_tokens=getattr(usage, "candidates_token_count", 0),
+        )
+    metrics.record_llm_request(GEMINI_MODEL, "ok", time.perf_counter() - started, usage)
+    return response
+
+
+def _upload(file_bytes: bytes, file_path: str, mime_type: Optional[str]):
+    """Upload a file once per content hash and GEMINI_FILE_TTL_SECONDS; blocking."""
+    key = hashlib.sha256(file_bytes).hexdigest() if file_bytes else None
+    if key is not None:
+        with _uploads_lock:
+            cached = _uploaded_files.get(key)
+            if cached is not None and time.time() - cached[1] < GEMINI_FILE_TTL_SECONDS:
+                _uploaded_files.move_to_end(key)
+                logger.info(f"Reusing uploaded Gemini file {cached[0].name}")
+                return cached[0]
+    if file_bytes:
+        uploaded = genai.upload_file(path=BytesIO(file_bytes), mime_type=mime_type)
+    else:
+        uploaded = genai.upload_file(path=file_path, mime_type=mime_type)
+    if key is not None:
+        with _uploads_lock:
+            _uploaded_files[key] = (uploaded, time.time())
+            while len(_uploaded_files) > GEMINI_FILE_CACHE_ENTRIES:
+                _uploaded_files.popitem(last=False)
+    return uploaded
+
+
+async def create_json_completion(system_prompt: str, prompt: str) -> dict:
+    """Generate a JSON answer; the LLM router's Gemini provider (see openai_service)."""
+    model = _get_model(response_mime_type="application/json")
+    response = await _generate(model, [system_prompt, prompt], generation_config={"temperature": 0.1})
+    content = (response.text or "").strip()
+    return json.loads(content) if content else {}
 
 
 async def classify_document(text: str) -> dict:
     """Classify document type using Gemini, returning {"document_type": str}."""
-    logging.info("Classifying document type with Gemini...")
+    logger.info("Classifying document type with Gemini...")
     prompt = (
         "Analyze the following text and respond ONLY with a JSON object containing a single "
         "'document_type' key. Choose from: 'Invoice', 'BalanceSheet', 'ProfitAndLossStatement', "
@@ -50,11 +166,7 @@ async def classify_document(text: str) -> dict:
         + (text[:4000] if text else "")
     )
     model = _get_model(response_mime_type="application/json")
-
-    def _invoke():
-        return model.generate_content(prompt)
-
-    response = await _run_blocking(_invoke)
+    response = await _generate(model, prompt)
     content = (response.text or "").strip()
     try:
         data = json.loads(content) if content else {}
@@ -62,13 +174,13 @@ async def classify_document(text: str) -> dict:
             return {"document_type": data["document_type"]}
         return {"document_type": str(data) or "GeneralDocument"}
     except Exception as e:
-        logging.warning(f"Gemini classification parse error: {e}; raw={content[:200]}")
+        logger.warning(f"Gemini classification parse error: {e}; raw={content[:200]}")
         return {"document_type": "GeneralDocument"}
 
 
 async def analyze_document_by_type(text: str, doc_type: str) -> dict:
     """Analyze document and return structured JSON summary using Gemini."""
-    logging.info(f"Analyzing document with Gemini. Type hint: {doc_type}")
+    logger.info(f"Analyzing document with Gemini. Type hint: {doc_type}")
     system_instructions = (
         "You are an expert document analysis AI. Respond ONLY with a valid JSON object. "
         "Include: 'language', 'document_type', 1-3 sentence 'summary', and 'extracted_data'"
@@ -83,11 +195,7 @@ async def analyze_document_by_type(text: str, doc_type: str) -> dict:
     )
 
     model = _get_model(response_mime_type="application/json")
-
-    def _invoke():
-        return model.generate_content([system_instructions, prompt])
-
-    response = await _run_blocking(_invoke)
+    response = await _generate(model, [system_instructions, prompt])
     content = (response.text or "").strip()
     try:
         data = json.loads(content) if content else {}
@@ -95,52 +203,33 @@ async def analyze_document_by_type(text: str, doc_type: str) -> dict:
             return data
         return {"analysis_output": str(data)}
     except Exception as e:
-        logging.warning(f"Gemini analysis parse error: {e}; raw={content[:200]}")
+        logger.warning(f"Gemini analysis parse error: {e}; raw={content[:200]}")
         return {"error": "Failed to analyze document."}
 
 
 async def extract_text_from_file(file_path: str, file_bytes: bytes, mime_type: Optional[str]) -> str:
     """Use Gemini Multimodal to extract raw text from a file (pdf, docx, xlsx, csv, images)."""
-    logging.info(f"Extracting text with Gemini from file: {file_path}")
+    logger.info(f"Extracting text with Gemini from file: {file_path}")
     model = _get_model()
+    prompt = (
+        "Extract the plain textual content from the provided file. "
+        "Return ONLY the extracted text with no additional commentary."
+    )
 
-    def _upload_and_generate():
-        # For images, use direct content generation instead of file upload
+    try:
+        # Images go inline; other file types are uploaded once per content hash
         if file_bytes and mime_type and mime_type.startswith('image/'):
-            from io import BytesIO
             from PIL import Image
             try:
-                # Convert bytes to PIL Image
                 image = Image.open(BytesIO(file_bytes))
-                prompt = (
-                    "Extract the plain textual content from this image. "
-                    "Return ONLY the extracted text with no additional commentary."
-                )
-                resp = model.generate_content([prompt, image])
-                return (resp.text or "").strip()
             except Exception as e:
-                logging.error(f"Error processing image with PIL: {e}")
+                logger.error(f"Error processing image with PIL: {e}")
                 return ""
+            resp = await _generate(model, [prompt, image])
         else:
-            # For other file types, use file upload
-            if file_bytes:
-                from io import BytesIO
-                file_obj = BytesIO(file_bytes)
-                uploaded = genai.upload_file(path=file_obj, mime_type=mime_type)
-            else:
-                uploaded = genai.upload_file(path=file_path, mime_type=mime_type)
-            prompt = (
-                "Extract the plain textual content from the provided file. "
-                "Return ONLY the extracted text with no additional commentary."
-            )
-            resp = model.generate_content([prompt, uploaded])
-            return (resp.text or "").strip()
-
-    try:
-        text = await _run_blocking(_upload_and_generate)
-        return text
+            uploaded = await _run_blocking(_upload, file_bytes, file_path, mime_type)
+            resp = await _generate(model, [prompt, uploaded])
+        return (resp.text or "").strip()
     except Exception as e:
-        logging.error(f"Gemini extract_text_from_file error: {e}")
+        logger.error(f"Gemini extract_text_from_file error: {e}")
         return ""
-
-
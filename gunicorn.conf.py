@@ -0,0 +1,7 @@
+# Loaded by start.sh (gunicorn --config gunicorn.conf.py)
+import metrics
+
+
+def child_exit(server, worker):
+    # Drop the in-flight gauge samples of workers that exited or were restarted
+    metrics.mark_process_dead(worker.pid)
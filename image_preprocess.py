@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import logging
+
+import numpy as np
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Longest side images are reduced to before OCR (large phone photos gain
+# nothing above this but cost a lot of Tesseract time)
+OCR_MAX_IMAGE_DIM = int(os.getenv("OCR_MAX_IMAGE_DIM", "2500"))
+
+# Preprocessing settings per document type. "default" applies to every type
+# without an entry of its own; per-type entries only list what differs.
+#   crop:     crop to the region that contains edges (the document)
+#   deskew:   rotate so text lines are horizontal (up to +-5 degrees)
+#   binarize: Sauvola adaptive thresholding with `window` (px) and `k`
+#   min_dim:  upscale so the shorter side is at least this many pixels
+PROFILES = {
+    "default": {"crop": True, "deskew": True, "binarize": True, "window": 31, "k": 0.2, "min_dim": 1200},
+    # Full-page bills: keep the whole page, smaller print needs a smaller window
+    "UtilityBill": {"crop": False, "window": 25},
+    # The MRZ font is large and high contrast; a wider window avoids hollow glyphs
+    "Passport": {"window": 41},
+    "GeneralDocument": {"crop": False},
+}
+# JSON overrides, e.g. PREPROCESS_PROFILES='{"PAN": {"binarize": false}}'
+_overrides = os.getenv("PREPROCESS_PROFILES")
+if _overrides:
+    try:
+        for _doc_type, _settings in json.loads(_overrides).items():
+            PROFILES.setdefault(_doc_type, {}).update(_settings)
+    except (ValueError, AttributeError) as e:
+        logger.warning(f"Ignoring invalid PREPROCESS_PROFILES: {e}")
+
+# Fraction of a row/column that must be ink for it to count as document content
+_CROP_INK_FRACTION = 0.005
+_CROP_MARGIN = 0.02
+
+
+def profile_for(doc_type: str = None) -> dict:
+    profile = dict(PROFILES["default"])
+    profile.update(PROFILES.get(doc_type or "default", {}))
+    return profile
+
+
+def load(image: Image.Image) -> Image.Image:
+    """Apply EXIF orientation and cap the longest side at OCR_MAX_IMAGE_DIM.
+
+    For JPEGs the size reduction starts in the decoder (draft mode), so a
+    12 MP photo is never fully decoded. Call before image.load().
+    """
+    if max(image.size) > OCR_MAX_IMAGE_DIM and image.format == "JPEG":
+        image.draft(image.mode, (OCR_MAX_IMAGE_DIM, OCR_MAX_IMAGE_DIM))
+    image = ImageOps.exif_transpose(image)
+    if max(image.size) > OCR_MAX_IMAGE_DIM:
+        image.thumbnail((OCR_MAX_IMAGE_DIM, OCR_MAX_IMAGE_DIM), Image.Resampling.LANCZOS)
+    return image
+
+
+def estimate_skew(gray: np.ndarray, step: float = 1.0) -> float:
+    """Correction angle (degrees, -5..5) that makes text lines horizontal.
+
+    Rotating the ink pixels by the right angle gives the row profile with the
+    highest variance (lines and gaps alternate sharply). Ink is found with
+    adaptive thresholding so dark backgrounds around the document do not
+    count. Pass a small image.
+    """
+    height, width = gray.shape
+    if min(height, width) < 50:
+        return 0.0
+    dark = Image.fromarray(np.where(sauvola(gray, 15) == 0, 255, 0).astype(np.uint8))
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-5.0, 5.0 + step / 2, step):
+        rows = np.asarray(dark.rotate(float(angle), resample=Image.Resampling.NEAREST, fillcolor=0)).sum(axis=1)
+        score = float(np.var(rows))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return round(best_angle, 2)
+
+
+def _ink_mask(gray: np.ndarray, size: int = 800):
+    """Ink (text, lines, document edges) of a thumbnail, and the thumbnail scale."""
+    small = Image.fromarray(gray)
+    small.thumbnail((size, size))
+    scale = gray.shape[1] / small.size[0]
+    return sauvola(np.asarray(small, dtype=np.float32), 15) == 0, scale
+
+
+def _content_box(gray: np.ndarray):
+    """(top, bottom, left, right) of the region containing ink, or None.
+
+    Uniform surroundings (a table or scanner lid) have no ink after adaptive
+    thresholding, while the document's text and edges do.
+    """
+    ink, scale = _ink_mask(gray)
+    rows = np.flatnonzero(ink.sum(axis=1) > max(2, _CROP_INK_FRACTION * ink.shape[1]))
+    cols = np.flatnonzero(ink.sum(axis=0) > max(2, _CROP_INK_FRACTION * ink.shape[0]))
+    if rows.size == 0 or cols.size == 0:
+        return None
+    height, width = gray.shape
+    margin_y, margin_x = int(height * _CROP_MARGIN), int(width * _CROP_MARGIN)
+    return (
+        max(0, int(rows[0] * scale) - margin_y), min(height, int((rows[-1] + 1) * scale) + margin_y),
+        max(0, int(cols[0] * scale) - margin_x), min(width, int((cols[-1] + 1) * scale) + margin_x),
+    )
+
+
+def _box_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Mean over a window x window neighbourhood of every pixel (integral image)."""
+    pad = window // 2
+    integral = np.pad(np.pad(values, pad, mode="edge").cumsum(axis=0).cumsum(axis=1), ((1, 0), (1, 0)))
+    height, width = values.shape
+    total = integral[window:window + height, window:window + width] - integral[:height, window:window + width]
+    total -= integral[window:window + height, :width]
+    total += integral[:height, :width]
+    total /= window * window
+    return total
+
+
+def sauvola(gray: np.ndarray, window: int = 31, k: float = 0.2, r: float = 128.0) -> np.ndarray:
+    """Sauvola adaptive binarization: text black (0), background white (255)."""
+    window = window | 1
+    values = gray.astype(np.float64)
+    mean = _box_mean(values, window)
+    std = _box_mean(values * values, window)
+    std -= mean * mean
+    np.sqrt(np.maximum(std, 0, out=std), out=std)
+    # threshold = mean * (1 + k * (std / r - 1)), computed in place
+    std /= r
+    std -= 1
+    std *= k
+    std += 1
+    std *= mean
+    return np.where(values > std, 255, 0).astype(np.uint8)
+
+
+def preprocess(image: Image.Image, doc_type: str = None) -> tuple:
+    """Run the preprocessing stage configured for `doc_type` on a loaded image.
+
+    Returns (grayscale or binary PIL image, {step: seconds or value}). The
+    image is converted to grayscale once; crop and binarization work on the
+    NumPy array, rotation and resizing on a single PIL image per step.
+    """
+    profile = profile_for(doc_type)
+    steps = {}
+    started = time.perf_counter()
+
+    gray = np.asarray(image.convert("L"))
+    if profile["crop"]:
+        box = _content_box(gray)
+        if box is not None:
+            top, bottom, left, right = box
+            # Only crop when it removes a meaningful part of the image
+            if (bottom - top) * (right - left) < 0.9 * gray.size:
+                gray = gray[top:bottom, left:right]
+                steps["crop"] = [int(left), int(top), int(right), int(bottom)]
+
+    working = Image.fromarray(gray)
+    if profile["deskew"]:
+        small = working.copy()
+        small.thumbnail((800, 800))
+        angle = estimate_skew(np.asarray(small, dtype=np.float32), step=0.5)
+        if abs(angle) >= 0.5:
+            working = working.rotate(angle, resample=Image.Resampling.BILINEAR, expand=True, fillcolor=255)
+            steps["deskew"] = angle
+
+    width, height = working.size
+    if min(width, height) < profile["min_dim"]:
+        scale = profile["min_dim"] / min(width, height)
+        working = working.resize((int(width * scale), int(height * scale)), Image.Resampling.LANCZOS)
+        steps["upscale"] = round(scale, 2)
+
+    if profile["binarize"]:
+        working = Image.fromarray(sauvola(np.asarray(working), profile["window"], profile["k"]))
+        steps["binarize"] = True
+
+    steps["seconds"] = round(time.perf_counter() - started, 3)
+    return working, steps
@@ -0,0 +1,371 @@
+import os
+import json
+import time
+import uuid
+import socket
+import random
+import ipaddress
+import sqlite3
+import asyncio
+import logging
+import threading
+from typing import Optional
+from urllib.parse import urlsplit
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "jobs.sqlite3")
+# "inprocess": every API worker also processes jobs; "external": jobs are only
+# processed by `python job_worker.py` workers.
+JOB_WORKER_MODE = os.getenv("JOB_WORKER_MODE", "inprocess").lower()
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+# Running jobs not finished after this long are assumed to belong to a dead worker
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "900"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+JOB_WEBHOOK_TIMEOUT = float(os.getenv("JOB_WEBHOOK_TIMEOUT", "10"))
+JOB_WEBHOOK_ATTEMPTS = int(os.getenv("JOB_WEBHOOK_ATTEMPTS", "3"))
+# Webhooks may not point at private, loopback or link-local addresses (the
+# server's own network) unless their host is listed here (comma-separated)
+JOB_WEBHOOK_ALLOWED_HOSTS = {h.strip().lower() for h in os.getenv("JOB_WEBHOOK_ALLOWED_HOSTS", "").split(",") if h.strip()}
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobFailed(Exception):
+    """Raised by a job handler to fail a job with an HTTP-style status code."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: Optional[int] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        # When set, the job is put back in the queue instead of failing
+        self.retry_after = retry_after
+
+
+class JobStore:
+    """SQLite-backed job table shared by every process on the host."""
+
+    def __init__(self, path: str = JOB_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, filename TEXT NOT NULL, content_type TEXT, "
+            "options TEXT NOT NULL, file BLOB, webhook_url TEXT, result TEXT, error TEXT, status_code INTEGER, "
+            "cancel_requested INTEGER NOT NULL DEFAULT 0, attempts INTEGER NOT NULL DEFAULT 0, worker TEXT, "
+            "created_at REAL NOT NULL, available_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_available ON jobs (status, available_at)")
+
+    def enqueue(self, filename: str, data: bytes, content_type: Optional[str],
+                options: dict = None, webhook_url: Optional[str] = None) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, filename, content_type, options, file, webhook_url, created_at, available_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, filename, content_type, json.dumps(options or {}), data, webhook_url, now, now),
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, filename, content_type, webhook_url, result, error, status_code, "
+                "cancel_requested, attempts, created_at, started_at, finished_at FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def claim(self, worker_id: str) -> Optional[dict]:
+        """Atomically move the oldest available job to running and return it with its file."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = ? AND available_at <= ? ORDER BY created_at LIMIT 1",
+                    (QUEUED, now),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, worker = ?, started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                    (RUNNING, worker_id, now, row["id"]),
+                )
+                job = self._conn.execute(
+                    "SELECT id, filename, content_type, options, file, webhook_url, attempts FROM jobs WHERE id = ?",
+                    (row["id"],),
+                ).fetchone()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        job = dict(job)
+        job["options"] = json.loads(job["options"])
+        return job
+
+    def _finish(self, job_id: str, status: str, result=None, error=None, status_code=None) -> None:
+        with self._lock:
+            # The uploaded file is no longer needed once the job is finished
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, status_code = ?, file = NULL, finished_at = ? "
+                "WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, status_code, time.time(), job_id),
+            )
+
+    def complete(self, job_id: str, result: dict) -> None:
+        self._finish(job_id, SUCCEEDED, result=result, status_code=200)
+
+    def fail(self, job_id: str, status_code: int, error: str) -> None:
+        self._finish(job_id, FAILED, error=error, status_code=status_code)
+
+    def mark_cancelled(self, job_id: str) -> None:
+        self._finish(job_id, CANCELLED, error="Job was cancelled", status_code=499)
+
+    def release(self, job_id: str) -> None:
+        """Put a running job back in the queue without counting the attempt (its worker is shutting down)."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, available_at = ?, worker = NULL, started_at = NULL, "
+                "attempts = MAX(attempts - 1, 0) WHERE id = ? AND status = ?",
+                (QUEUED, time.time(), job_id, RUNNING),
+            )
+
+    def retry_later(self, job_id: str, delay: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, available_at = ?, worker = NULL WHERE id = ?",
+                (QUEUED, time.time() + delay, job_id),
+            )
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """Cancel a job. Queued jobs are cancelled at once, running ones are flagged
+        for their worker to stop. Returns the resulting status, or None if unknown."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                status = row["status"] if row else None
+                if status == QUEUED:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, error = ?, status_code = 499, file = NULL, finished_at = ? WHERE id = ?",
+                        (CANCELLED, "Job was cancelled", time.time(), job_id),
+                    )
+                    status = CANCELLED
+                elif status == RUNNING:
+                    self._conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return status
+
+    def cancel_requested(self, job_ids: list) -> set:
+        if not job_ids:
+            return set()
+        placeholders = ",".join("?" for _ in job_ids)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id FROM jobs WHERE cancel_requested = 1 AND id IN ({placeholders})", job_ids
+            ).fetchall()
+        return {row["id"] for row in rows}
+
+    def requeue_stale(self) -> int:
+        """Return jobs of crashed workers to the queue (or fail them after JOB_MAX_ATTEMPTS)."""
+        cutoff = time.time() - JOB_STALE_SECONDS
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, status_code = 500, file = NULL, finished_at = ? "
+                "WHERE status = ? AND started_at < ? AND attempts >= ?",
+                (FAILED, "Job was abandoned by its worker too many times", time.time(), RUNNING, cutoff, JOB_MAX_ATTEMPTS),
+            )
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL WHERE status = ? AND started_at < ?",
+                (QUEUED, RUNNING, cutoff),
+            )
+        return cursor.rowcount
+
+    def purge_finished(self) -> int:
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        placeholders = ",".join("?" for _ in FINISHED_STATUSES)
+        with self._lock:
+            cursor = self._conn.execute(
+                f"DELETE FROM jobs WHERE status IN ({placeholders}) AND finished_at < ?",
+                (*FINISHED_STATUSES, cutoff),
+            )
+        return cursor.rowcount
+
+    def depth(self) -> dict:
+        """Number of jobs per status."""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in (QUEUED, RUNNING, *FINISHED_STATUSES)}
+        counts.update({row["status"]: row["n"] for row in rows})
+        return counts
+
+
+def validate_webhook_url(url: str) -> None:
+    """Raise ValueError unless `url` is an http(s) URL whose host resolves to public addresses only.
+
+    Hosts in JOB_WEBHOOK_ALLOWED_HOSTS are accepted as they are. Resolves
+    the host name, so call it off the event loop.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("webhook_url must be an http(s) URL")
+    host = parts.hostname.lower()
+    if host in JOB_WEBHOOK_ALLOWED_HOSTS:
+        return
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, parts.port or None, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError) as e:
+        raise ValueError(f"webhook_url host cannot be resolved: {host}") from e
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%", 1)[0])
+        if not ip.is_global or ip.is_multicast:
+            raise ValueError(f"webhook_url may not point at a private or internal address ({host})")
+
+
+def _post_webhook(url: str, payload: dict) -> None:
+    try:
+        # Checked again at delivery: the name may resolve differently by now
+        validate_webhook_url(url)
+    except ValueError as e:
+        logger.error(f"Not posting webhook for job {payload['id']}: {e}")
+        return
+    for attempt in range(1, JOB_WEBHOOK_ATTEMPTS + 1):
+        try:
+            # Redirects are not followed: they could lead to an internal address
+            response = requests.post(url, json=payload, timeout=JOB_WEBHOOK_TIMEOUT, allow_redirects=False)
+            if response.status_code < 500:
+                if response.status_code >= 400:
+                    logger.warning(f"Webhook for job {payload['id']} rejected with status {response.status_code}")
+                return
+            logger.warning(f"Webhook for job {payload['id']} returned {response.status_code} (attempt {attempt})")
+        except requests.RequestException as e:
+            logger.warning(f"Webhook for job {payload['id']} failed (attempt {attempt}): {e}")
+        time.sleep(min(30, 2 ** attempt) + random.random())
+    logger.error(f"Giving up on webhook for job {payload['id']}")
+
+
+class JobWorker:
+    """Claims jobs from the store and runs them with `handler(job) -> dict`."""
+
+    def __init__(self, store: JobStore, handler, concurrency: int = JOB_WORKER_CONCURRENCY):
+        self.store = store
+        self.handler = handler
+        self.concurrency = concurrency
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._running = {}  # job id -> asyncio.Task
+        self._webhooks = set()
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        # Running jobs are put back in the queue (see _execute), not cancelled
+        tasks = list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def notify(self) -> None:
+        """Wake the worker up right away (called after a job was enqueued)."""
+        self._wakeup.set()
+
+    async def run(self) -> None:
+        logger.info(f"Job worker {self.worker_id} started with concurrency {self.concurrency}")
+        last_maintenance = 0.0
+        while True:
+            try:
+                if time.monotonic() - last_maintenance > 60:
+                    last_maintenance = time.monotonic()
+                    requeued = await asyncio.to_thread(self.store.requeue_stale)
+                    if requeued:
+                        logger.warning(f"Requeued {requeued} stale jobs")
+                    await asyncio.to_thread(self.store.purge_finished)
+
+                for job_id in await asyncio.to_thread(self.store.cancel_requested, list(self._running)):
+                    task = self._running.get(job_id)
+                    if task:
+                        logger.info(f"Cancelling running job {job_id}")
+                        task.cancel()
+
+                while len(self._running) < self.concurrency:
+                    job = await asyncio.to_thread(self.store.claim, self.worker_id)
+                    if job is None:
+                        break
+                    self._running[job["id"]] = asyncio.create_task(self._execute(job))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.error("Job worker loop error", exc_info=True)
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _execute(self, job: dict) -> None:
+        job_id = job["id"]
+        logger.info(f"Running job {job_id} ({job['filename']}, attempt {job['attempts']})")
+        try:
+            result = await self.handler(job)
+            await asyncio.to_thread(self.store.complete, job_id, result)
+        except asyncio.CancelledError:
+            if not await asyncio.to_thread(self.store.cancel_requested, [job_id]):
+                # The worker is shutting down: another worker (or this one after
+                # the restart) runs the job again
+                logger.info(f"Returning job {job_id} to the queue")
+                await asyncio.to_thread(self.store.release, job_id)
+                return
+            await asyncio.to_thread(self.store.mark_cancelled, job_id)
+        except JobFailed as e:
+            if e.retry_after is not None and job["attempts"] < JOB_MAX_ATTEMPTS:
+                logger.info(f"Job {job_id} will be retried in {e.retry_after}s: {e.detail}")
+                await asyncio.to_thread(self.store.retry_later, job_id, e.retry_after)
+                return
+            await asyncio.to_thread(self.store.fail, job_id, e.status_code, e.detail)
+        except Exception as e:
+            logger.error(f"Job {job_id} failed", exc_info=True)
+            await asyncio.to_thread(self.store.fail, job_id, 500, str(e))
+        finally:
+            self._running.pop(job_id, None)
+            self._wakeup.set()
+
+        if job.get("webhook_url"):
+            payload = await asyncio.to_thread(self.store.get, job_id)
+            payload.pop("webhook_url", None)
+            task = asyncio.create_task(asyncio.to_thread(_post_webhook, job["webhook_url"], payload))
+            self._webhooks.add(task)
+            task.add_done_callback(self._webhooks.discard)
+
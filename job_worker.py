@@ -0,0 +1,21 @@
+"""
+Standalone job worker: set `JOB_WORKER_MODE=external` on the API servers and
+run `python job_worker.py` as a separate process.
+
+job_queue is imported by name rather than run as __main__, so JobFailed and
+the other classes are the same objects main.process_job raises.
+"""
+import asyncio
+
+import job_queue
+import main
+
+
+async def run() -> None:
+    await main.warm_up()
+    worker = job_queue.JobWorker(job_queue.JobStore(), main.process_job)
+    await worker.run()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
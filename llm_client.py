@@ -0,0 +1,305 @@
+import os
+import time
+import random
+import asyncio
+import logging
+
+import metrics
+import tracing
+import prompt_budget
+
+logger = logging.getLogger(__name__)
+
+# The OpenAI SDK (and httpx) take most of a second to import, so they are only
+# imported when the first client is created (at startup warm-up, see main)
+
+# HTTP connection pool of the OpenAI client (per server process)
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "50"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "20"))
+OPENAI_KEEPALIVE_SECONDS = float(os.getenv("OPENAI_KEEPALIVE_SECONDS", "60"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+# Deadline of one provider call, retries included (enforced by llm_router)
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "45"))
+# One attempt; a third of the call deadline leaves time to retry a hung request
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", str(LLM_TIMEOUT_SECONDS / 3)))
+
+# Retries of 429, 5xx, timeouts and connection errors: exponential backoff with
+# full jitter, or the server's Retry-After when it sends one
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+OPENAI_BACKOFF_BASE = float(os.getenv("OPENAI_BACKOFF_BASE", "0.5"))
+OPENAI_BACKOFF_MAX = float(os.getenv("OPENAI_BACKOFF_MAX", "20"))
+
+# Client-side rate limits per server process (0 disables); divide the account
+# quota by the number of gunicorn workers
+OPENAI_RPM = float(os.getenv("OPENAI_RPM", "0"))
+OPENAI_TPM = float(os.getenv("OPENAI_TPM", "0"))
+# Completion tokens assumed per request until the response reports usage
+OPENAI_COMPLETION_TOKENS_ESTIMATE = int(os.getenv("OPENAI_COMPLETION_TOKENS_ESTIMATE", "600"))
+# Longest a request waits for the rate limiter before failing with 503
+OPENAI_MAX_QUEUE_SECONDS = float(os.getenv("OPENAI_MAX_QUEUE_SECONDS", "30"))
+
+# Consecutive failed attempts (5xx, timeouts, connection errors) that open the
+# circuit; while open, requests fail immediately for LLM_CIRCUIT_RESET_SECONDS
+LLM_CIRCUIT_FAILURES = int(os.getenv("LLM_CIRCUIT_FAILURES", "5"))
+LLM_CIRCUIT_RESET_SECONDS = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+
+
+class LLMUnavailableError(Exception):
+    """The LLM cannot be used right now (circuit open, rate limited or retries exhausted).
+
+    `upstream` is False when the request never got an answer from the provider
+    because of a limit on our side (the client-side rate limiter), so the
+    router does not count it against the provider's health.
+    """
+
+    def __init__(self, detail: str, retry_after: int = 5, upstream: bool = True):
+        super().__init__(detail)
+        self.retry_after = max(1, int(retry_after))
+        self.upstream = upstream
+
+
+class TokenBucket:
+    """Allows `per_minute` units per minute, in bursts of up to one minute's worth.
+
+    Shared by all concurrent requests of a process. A rate of 0 never waits.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1, max_wait: float = None) -> None:
+        """Take `amount` units, waiting for the bucket to refill; LLMUnavailableError past max_wait."""
+        if not self.capacity:
+            return
+        amount = min(amount, self.capacity)
+        # The lock queues waiters so they are served in arrival order
+        async with self._lock:
+            self._refill()
+            wait = (amount - self.level) / self.rate if self.level < amount else 0.0
+            if max_wait is not None and wait > max_wait:
+                raise LLMUnavailableError("LLM rate limit reached", retry_after=wait, upstream=False)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                self._refill()
+            self.level -= amount
+
+    def adjust(self, amount: float) -> None:
+        """Give back (positive) or take (negative) units once the real cost is known."""
+        if self.capacity:
+            self._refill()
+            self.level = min(self.capacity, self.level + amount)
+
+
+class CircuitBreaker:
+    """Fails fast after `failures` consecutive failures, for `reset_seconds`.
+
+    After that one trial request is let through (half-open): success closes
+    the circuit, failure opens it again.
+    """
+
+    def __init__(self, name: str, failures: int = LLM_CIRCUIT_FAILURES, reset_seconds: float = LLM_CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.consecutive = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "open" if time.monotonic() - self.opened_at < self.reset_seconds else "half_open"
+
+    def check(self, claim: bool = True) -> None:
+        """Raise LLMUnavailableError unless a request may be sent now.
+
+        With `claim`, a half-open circuit hands its single trial slot to the caller.
+        """
+        state = self.state
+        if state == "open":
+            remaining = self.reset_seconds - (time.monotonic() - self.opened_at)
+            raise LLMUnavailableError(f"{self.name} is unavailable (circuit open)", retry_after=remaining)
+        if state == "half_open":
+            if self.trial_running:
+                raise LLMUnavailableError(f"{self.name} is unavailable (circuit half-open)", retry_after=1)
+            if claim:
+                self.trial_running = True
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info(f"Circuit for {self.name} closed")
+        self.consecutive = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def record_failure(self) -> None:
+        self.consecutive += 1
+        self.trial_running = False
+        if self.opened_at is not None or self.consecutive >= self.failures:
+            if self.state != "open":
+                logger.warning(f"Circuit for {self.name} opened after {self.consecutive} consecutive failures")
+            self.opened_at = time.monotonic()
+
+
+def _is_retryable(error: Exception) -> bool:
+    import openai
+    if isinstance(error, openai.RateLimitError):
+        # An exhausted quota does not recover by retrying
+        return getattr(error, "code", None) != "insufficient_quota"
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def _is_upstream_failure(error: Exception) -> bool:
+    """Failures that count towards opening the circuit (429 means the upstream is up)."""
+    import openai
+    return _is_retryable(error) and not isinstance(error, openai.RateLimitError)
+
+
+def _retry_after(error: Exception):
+    """Seconds from the Retry-After (or retry-after-ms) header of an error response, if any."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+def backoff_delay(attempt: int, error: Exception = None) -> float:
+    """Seconds to wait before retry `attempt` (1-based)."""
+    server_delay = _retry_after(error) if error is not None else None
+    if server_delay is not None:
+        return min(server_delay, OPENAI_BACKOFF_MAX)
+    return random.uniform(0, min(OPENAI_BACKOFF_MAX, OPENAI_BACKOFF_BASE * 2 ** (attempt - 1)))
+
+
+def estimate_tokens(messages: list, max_tokens: int = None) -> int:
+    """Request cost for the TPM limiter: prompt tokens plus the expected completion."""
+    prompt_tokens = sum(prompt_budget.count_tokens(message.get("content") or "") for message in messages)
+    return prompt_tokens + (max_tokens or OPENAI_COMPLETION_TOKENS_ESTIMATE)
+
+
+class OpenAIClient:
+    """AsyncOpenAI with a tuned connection pool, retries, rate limiting and a circuit breaker.
+
+    The SDK's own retries are disabled; chat_completion() retries so every
+    attempt goes through the limiter and the breaker.
+    """
+
+    def __init__(self, api_key: str = None):
+        import httpx
+        import openai
+        self._http = openai.DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+                keepalive_expiry=OPENAI_KEEPALIVE_SECONDS,
+            ),
+        )
+        self.client = openai.AsyncOpenAI(
+            api_key=api_key,
+            max_retries=0,
+            timeout=httpx.Timeout(OPENAI_TIMEOUT_SECONDS, connect=OPENAI_CONNECT_TIMEOUT),
+            http_client=self._http,
+        )
+        self.requests = TokenBucket(OPENAI_RPM)
+        self.tokens = TokenBucket(OPENAI_TPM)
+        self.breaker = CircuitBreaker("OpenAI")
+
+    async def chat_completion(self, **request):
+        """Create a chat completion (same arguments as the SDK), retrying transient errors.
+
+        Raises LLMUnavailableError when the circuit is open, the limiter would
+        wait longer than OPENAI_MAX_QUEUE_SECONDS or retries are exhausted;
+        other API errors (400, 401, ...) are raised unchanged.
+        """
+        import openai
+        model = request.get("model") or "unknown"
+        estimate = estimate_tokens(request.get("messages", []), request.get("max_tokens"))
+        attempt = 0
+        while True:
+            attempt += 1
+            # Fail fast before queueing for the limiter, then claim the trial slot
+            self.breaker.check(claim=False)
+            await self.requests.acquire(1, max_wait=OPENAI_MAX_QUEUE_SECONDS)
+            await self.tokens.acquire(estimate, max_wait=OPENAI_MAX_QUEUE_SECONDS)
+            self.breaker.check()
+            # True when this attempt holds the half-open circuit's single trial slot
+            trial = self.breaker.trial_running
+            started = time.perf_counter()
+            with tracing.span("llm.chat_completion", model=model, attempt=attempt) as span:
+                try:
+                    with metrics.in_flight("llm"):
+                        response = await self.client.chat.completions.create(**request)
+                except asyncio.CancelledError:
+                    # Cancelled by the caller (router timeout, hedging, client gone): says
+                    # nothing about the upstream, but the trial slot must be given back
+                    if trial:
+                        self.breaker.trial_running = False
+                    raise
+                except Exception as e:
+                    metrics.record_llm_request(model, type(e).__name__, time.perf_counter() - started)
+                    if span is not None:
+                        span.set(error=type(e).__name__)
+                    error = e
+                else:
+                    usage = getattr(response, "usage", None)
+                    metrics.record_llm_request(model, "ok", time.perf_counter() - started, usage)
+                    if usage is not None:
+                        self.tokens.adjust(estimate - (usage.total_tokens or estimate))
+                        if span is not None:
+                            span.set(prompt_tokens=usage.prompt_tokens or 0, completion_tokens=usage.completion_tokens or 0)
+                    self.breaker.record_success()
+                    return response
+
+            if _is_upstream_failure(error):
+                self.breaker.record_failure()
+            else:
+                # Not a sign the upstream is down; frees a half-open trial slot
+                self.breaker.trial_running = False
+            if not _is_retryable(error):
+                if isinstance(error, openai.RateLimitError):
+                    raise LLMUnavailableError(f"OpenAI quota exhausted: {error}", retry_after=60) from error
+                raise error
+            if attempt > OPENAI_MAX_RETRIES:
+                raise LLMUnavailableError(
+                    f"OpenAI request failed after {attempt} attempts: {error}",
+                    retry_after=_retry_after(error) or LLM_CIRCUIT_RESET_SECONDS / 2,
+                    upstream=_is_upstream_failure(error),
+                ) from error
+            delay = backoff_delay(attempt, error)
+            logger.warning(f"OpenAI request failed ({type(error).__name__}); retry {attempt} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    async def warm_up(self) -> None:
+        """Open a pooled connection (DNS, TCP and TLS) to the API without sending a request to a model.
+
+        Any HTTP response will do, so no API quota is used; connection errors are raised.
+        """
+        await self._http.get(str(self.client.base_url), timeout=OPENAI_CONNECT_TIMEOUT * 2)
+
+    def stats(self) -> dict:
+        return {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive,
+            "rpm_available": round(self.requests.level, 1) if self.requests.capacity else None,
+            "tpm_available": round(self.tokens.level) if self.tokens.capacity else None,
+        }
@@ -0,0 +1,211 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+
+import metrics
+import tracing
+from llm_client import CircuitBreaker, LLMUnavailableError, LLM_TIMEOUT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Providers in order of preference; unconfigured ones (no API key or SDK) are skipped
+LLM_PROVIDERS = [name.strip() for name in os.getenv("LLM_PROVIDERS", "openai,gemini").split(",") if name.strip()]
+# Send the same request to the next provider when the first has not answered
+# within its p95 latency; the first valid JSON answer wins
+LLM_HEDGE = os.getenv("LLM_HEDGE", "true").lower() in ("1", "true", "yes")
+# Hedge delay until a provider has LLM_MIN_SAMPLES latencies, and its floor
+LLM_HEDGE_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_DELAY_SECONDS", "8"))
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "0.5"))
+LLM_MIN_SAMPLES = int(os.getenv("LLM_MIN_SAMPLES", "20"))
+# The preferred provider is only demoted when its score is this many times worse
+LLM_FAILOVER_RATIO = float(os.getenv("LLM_FAILOVER_RATIO", "2"))
+
+_LATENCY_WINDOW = 200
+_ERROR_DECAY = 0.2
+
+
+def _is_upstream_failure(error: Exception) -> bool:
+    """Errors that say the provider is unhealthy: timeouts and outages, not bad requests or answers."""
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    return isinstance(error, LLMUnavailableError) and error.upstream
+
+
+class Provider:
+    """One LLM backend: `complete(system_prompt, prompt)` returns the parsed JSON answer.
+
+    Keeps the latencies of recent successful calls, a decaying error rate and
+    a circuit breaker; together they give the score used for routing.
+    """
+
+    def __init__(self, name: str, model: str, complete, configured: bool = True):
+        self.name = name
+        self.model = model
+        self.complete = complete
+        self.configured = configured
+        self.latencies = deque(maxlen=_LATENCY_WINDOW)
+        self.error_rate = 0.0
+        self.breaker = CircuitBreaker(name)
+        self.counts = {"calls": 0, "wins": 0, "failures": 0, "hedges": 0}
+
+    def quantile(self, q: float):
+        if len(self.latencies) < LLM_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def score(self) -> float:
+        """Expected seconds to a good answer; lower is better, inf while the circuit is open."""
+        if self.breaker.state == "open":
+            return float("inf")
+        median = self.quantile(0.5) or LLM_HEDGE_DELAY_SECONDS / 2
+        return median * (1 + 4 * self.error_rate)
+
+    def hedge_delay(self) -> float:
+        return max(LLM_HEDGE_MIN_DELAY_SECONDS, self.quantile(0.95) or LLM_HEDGE_DELAY_SECONDS)
+
+    def record(self, ok: bool, seconds: float = None) -> None:
+        self.error_rate = (1 - _ERROR_DECAY) * self.error_rate + (0.0 if ok else _ERROR_DECAY)
+        if ok:
+            self.latencies.append(seconds)
+            self.breaker.record_success()
+        else:
+            self.counts["failures"] += 1
+            self.breaker.record_failure()
+
+    def stats(self) -> dict:
+        p50, p95 = self.quantile(0.5), self.quantile(0.95)
+        return {
+            "model": self.model,
+            "circuit": self.breaker.state,
+            "error_rate": round(self.error_rate, 3),
+            "p50_seconds": round(p50, 3) if p50 is not None else None,
+            "p95_seconds": round(p95, 3) if p95 is not None else None,
+            **self.counts,
+        }
+
+
+class Router:
+    """Routes JSON completions across providers with timeouts, hedging and failover."""
+
+    def __init__(self, providers: list):
+        self.providers = [provider for provider in providers if provider.configured]
+
+    @classmethod
+    def from_env(cls, available: dict) -> "Router":
+        """Router over the providers named in LLM_PROVIDERS, in that order."""
+        unknown = [name for name in LLM_PROVIDERS if name not in available]
+        if unknown:
+            logger.warning(f"Ignoring unknown LLM providers: {unknown}")
+        router = cls([available[name] for name in LLM_PROVIDERS if name in available])
+        logger.info(f"LLM providers: {[provider.name for provider in router.providers] or 'none configured'}")
+        return router
+
+    def ranked(self) -> list:
+        """Usable providers, best first.
+
+        The configured order is kept unless a later provider scores
+        LLM_FAILOVER_RATIO times better; providers with an open circuit are left out.
+        """
+        usable = [provider for provider in self.providers if provider.breaker.state != "open"]
+        if not usable:
+            return []
+        best = min(usable, key=Provider.score)
+        primary = usable[0]
+        if best is not primary and best.score() * LLM_FAILOVER_RATIO < primary.score():
+            primary = best
+        return [primary] + sorted((p for p in usable if p is not primary), key=Provider.score)
+
+    async def _call(self, provider: Provider, system_prompt: str, prompt: str) -> dict:
+        provider.breaker.check()
+        # True when this call holds the half-open circuit's single trial slot
+        trial = provider.breaker.trial_running
+        recorded = False
+        provider.counts["calls"] += 1
+        started = time.perf_counter()
+        try:
+            with tracing.span("llm.provider", provider=provider.name) as span:
+                try:
+                    result = await asyncio.wait_for(provider.complete(system_prompt, prompt), LLM_TIMEOUT_SECONDS)
+                    if not isinstance(result, dict):
+                        raise ValueError(f"{provider.name} returned {type(result).__name__}, not a JSON object")
+                except asyncio.CancelledError:
+                    # Lost the race to a hedged request; says nothing about the provider's health
+                    if span is not None:
+                        span.set(outcome="cancelled")
+                    raise
+                except Exception as e:
+                    if _is_upstream_failure(e):
+                        recorded = True
+                        provider.record(False)
+                    if span is not None:
+                        span.set(outcome=type(e).__name__)
+                    metrics.record_llm_route(provider.name, "failed")
+                    raise
+                recorded = True
+                provider.record(True, time.perf_counter() - started)
+                return result
+        finally:
+            if trial and not recorded:
+                # A cancelled trial or one that failed on our side (bad request, invalid
+                # answer) gives the slot back, or the circuit would stay half-open for good
+                provider.breaker.trial_running = False
+
+    async def complete_json(self, system_prompt: str, prompt: str) -> dict:
+        """Return the first valid JSON object any provider answers with.
+
+        The best-ranked provider is asked first. If it has not answered within
+        its hedge delay (p95 latency), or fails, the next one is asked as well.
+        Raises LLMUnavailableError when no provider could answer because of
+        timeouts or outages; other errors (bad request, invalid JSON) from the
+        last provider are raised as is.
+        """
+        candidates = self.ranked()
+        if not candidates:
+            retry_after = min((p.breaker.reset_seconds for p in self.providers), default=30)
+            raise LLMUnavailableError("No LLM provider is available", retry_after=retry_after)
+
+        tasks = {}
+        errors = []
+
+        def launch(provider: Provider, hedged: bool):
+            if hedged:
+                provider.counts["hedges"] += 1
+                metrics.record_llm_route(provider.name, "hedged")
+                logger.info(f"Hedging LLM request to {provider.name}")
+            task = asyncio.ensure_future(self._call(provider, system_prompt, prompt))
+            tasks[task] = provider
+
+        launch(candidates.pop(0), hedged=False)
+        try:
+            while tasks:
+                primary = next(iter(tasks.values()))
+                timeout = primary.hedge_delay() if LLM_HEDGE and candidates and len(tasks) == 1 else None
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launch(candidates.pop(0), hedged=True)
+                    continue
+                for task in done:
+                    provider = tasks.pop(task)
+                    if task.exception() is None:
+                        provider.counts["wins"] += 1
+                        metrics.record_llm_route(provider.name, "won")
+                        return task.result()
+                    errors.append(task.exception())
+                    logger.warning(f"LLM provider {provider.name} failed: {type(task.exception()).__name__}: {task.exception()}")
+                if not tasks and candidates:
+                    # Failover: the request has not been answered yet
+                    launch(candidates.pop(0), hedged=False)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if all(isinstance(e, (LLMUnavailableError, asyncio.TimeoutError)) for e in errors):
+            retry_after = max((e.retry_after for e in errors if isinstance(e, LLMUnavailableError)), default=5)
+            raise LLMUnavailableError(f"All LLM providers failed: {errors[-1]!r}", retry_after=retry_after)
+        raise next(e for e in reversed(errors) if not isinstance(e, (LLMUnavailableError, asyncio.TimeoutError)))
+
+    def stats(self) -> dict:
+        return {provider.name: provider.stats() for provider in self.providers}
@@ -0,0 +1,95 @@
+import os
+import re
+import threading
+
+# Minimum confidence for a local classification to be used without asking the LLM.
+# Set above 1.0 to always call the LLM.
+LOCAL_CLASSIFIER_THRESHOLD = float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", "0.8"))
+
+# (document type, signal name, pattern, weight). Weights of matching signals
+# are summed per document type and capped at 1.0.
+_SIGNALS = [
+    # Passport: a TD3 MRZ first line alone is decisive
+    ("Passport", "mrz_line", re.compile(r"^P[<A-Z][A-Z<]{3}[A-Z<]{20,}$", re.MULTILINE), 0.9),
+    ("Passport", "passport_keyword", re.compile(r"\bPASSPORT\b", re.IGNORECASE), 0.3),
+    ("Passport", "republic_of", re.compile(r"\bREPUBLIC\s+OF\b", re.IGNORECASE), 0.2),
+    ("Passport", "issue_expiry_labels", re.compile(r"\b(Date\s+of\s+Expiry|Place\s+of\s+Issue)\b", re.IGNORECASE), 0.2),
+    ("Passport", "passport_number", re.compile(r"\b[A-Z][0-9]{7}\b"), 0.1),
+
+    ("Aadhar", "aadhaar_number", re.compile(r"\b[2-9][0-9]{3}\s?[0-9]{4}\s?[0-9]{4}\b"), 0.4),
+    ("Aadhar", "aadhaar_keyword", re.compile(r"\bAadh?aa?r\b|आधार", re.IGNORECASE), 0.4),
+    ("Aadhar", "uidai", re.compile(r"Unique\s+Identification\s+Authority", re.IGNORECASE), 0.4),
+    ("Aadhar", "government_of_india", re.compile(r"\bGovernment\s+of\s+India\b", re.IGNORECASE), 0.2),
+    ("Aadhar", "vid", re.compile(r"\bVID\s*:?\s*[0-9]{4}\s?[0-9]{4}\s?[0-9]{4}\s?[0-9]{4}\b"), 0.2),
+
+    ("PAN", "income_tax_department", re.compile(r"INCOME\s+TAX\s+DEPARTMENT", re.IGNORECASE), 0.5),
+    ("PAN", "permanent_account_number", re.compile(r"Permanent\s+Account\s+Number", re.IGNORECASE), 0.4),
+    ("PAN", "pan_number", re.compile(r"\b[A-Z]{5}[0-9]{4}[A-Z]\b"), 0.4),
+
+    ("DrivingLicence", "driving_licence", re.compile(r"\bDriving\s+Licen[cs]e\b", re.IGNORECASE), 0.6),
+    ("DrivingLicence", "dl_number", re.compile(r"\b[A-Z]{2}[-\s]?[0-9]{2}[-\s]?(19|20)[0-9]{2}\s?[0-9]{7}\b"), 0.3),
+    ("DrivingLicence", "vehicle_classes", re.compile(r"\b(COV|Vehicle\s+Class(es)?|LMV|MCWG)\b", re.IGNORECASE), 0.2),
+    ("DrivingLicence", "validity", re.compile(r"\bValid\s+(Till|Upto|Until)\b", re.IGNORECASE), 0.1),
+
+    ("UtilityBill", "bill_keyword", re.compile(r"\b(Electricity|Water|Gas|Telephone|Broadband|Mobile)\s+Bill\b", re.IGNORECASE), 0.4),
+    ("UtilityBill", "amount_payable", re.compile(r"\b(Amount\s+Payable|Bill\s+Amount|Total\s+Due|Due\s+Date)\b", re.IGNORECASE), 0.3),
+    ("UtilityBill", "account_number", re.compile(r"\b(Account\s+(No|Number)|Consumer\s+(No|Number)|CA\s+No)\b", re.IGNORECASE), 0.2),
+    ("UtilityBill", "billing_period", re.compile(r"\b(Billing\s+Period|Bill\s+Period|Units\s+Consumed)\b", re.IGNORECASE), 0.2),
+]
+
+_lock = threading.Lock()
+_counts = {"local": 0, "llm": 0}
+
+
+def signal_patterns(doc_type: str = None) -> list:
+    """Regex signals of one document type (all types when None)."""
+    return [pattern for signal_type, _, pattern, _ in _SIGNALS if doc_type is None or signal_type == doc_type]
+
+
+def classify(text: str) -> dict:
+    """Classify a KYC document from its OCR text using regex signals.
+
+    Returns {"document_type": str, "confidence": float, "signals": [str]}. The
+    confidence is the best type's score reduced by half of the runner-up's, so
+    texts matching several document types are left to the LLM.
+    """
+    scores = {}
+    signals = {}
+    for doc_type, name, pattern, weight in _SIGNALS:
+        if text and pattern.search(text):
+            scores[doc_type] = scores.get(doc_type, 0.0) + weight
+            signals.setdefault(doc_type, []).append(name)
+
+    if not scores:
+        return {"document_type": "GeneralDocument", "confidence": 0.0, "signals": []}
+
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    best_type, best_score = ranked[0]
+    runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+    confidence = max(0.0, min(1.0, best_score) - 0.5 * min(1.0, runner_up))
+    return {
+        "document_type": best_type,
+        "confidence": round(confidence, 3),
+        "signals": signals[best_type],
+    }
+
+
+def is_confident(result: dict) -> bool:
+    return result["confidence"] >= LOCAL_CLASSIFIER_THRESHOLD
+
+
+def record(source: str) -> None:
+    """Count a classification decision; source is "local" or "llm"."""
+    with _lock:
+        _counts[source] += 1
+
+
+def stats() -> dict:
+    with _lock:
+        total = _counts["local"] + _counts["llm"]
+        return {
+            "threshold": LOCAL_CLASSIFIER_THRESHOLD,
+            "local": _counts["local"],
+            "llm": _counts["llm"],
+            "local_share": round(_counts["local"] / total, 3) if total else None,
+        }
@@ -0,0 +1,193 @@
+import os
+import re
+import copy
+import json
+import queue
+import random
+import logging
+import logging.handlers
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+# Root level and per-module overrides, e.g.
+# LOG_LEVELS="textract_service=WARNING,openai_service=DEBUG"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+# "json" (one object per line) or "text"
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Share of verbose debug payloads (text previews, full results) that are logged
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.01"))
+# Records waiting for the writer thread; beyond this new records are dropped
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# How extracted_data fields appear in logs:
+#   keep:  logged as is
+#   last4: only the last four characters are kept (ID numbers)
+#   mask:  replaced by its length (default for every field not listed)
+FIELD_POLICY = {
+    "Gender": "keep",
+    "Nationality": "keep",
+    "Signature": "keep",
+    "Vehicle Classes": "keep",
+    "Valid From": "keep",
+    "Valid Until": "keep",
+    "Expiry Date": "keep",
+    "Issue Date": "keep",
+    "Aadhar Number": "last4",
+    "PAN Number": "last4",
+    "Passport Number": "last4",
+    "Licence Number": "last4",
+}
+# JSON overrides, e.g. LOG_FIELD_POLICY='{"Name": "keep"}'
+_overrides = os.getenv("LOG_FIELD_POLICY")
+if _overrides:
+    try:
+        FIELD_POLICY.update(json.loads(_overrides))
+    except (ValueError, TypeError) as e:
+        logger.warning(f"Ignoring invalid LOG_FIELD_POLICY: {e}")
+
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+_TOKEN_WITH_DIGIT = re.compile(r"\w*\d\w*")
+
+_handler = None
+_listener = None
+
+
+def redact_value(field: str, value):
+    policy = FIELD_POLICY.get(field, "mask")
+    if policy == "keep" or value in (None, "", "Not provided"):
+        return value
+    if isinstance(value, (dict, list)):
+        return f"<redacted {type(value).__name__}>"
+    value = str(value)
+    if policy == "last4" and len(value) > 4:
+        return "*" * (len(value) - 4) + value[-4:]
+    return f"<redacted {len(value)} chars>"
+
+
+def redact(analysis: dict) -> dict:
+    """Copy of an analysis result that is safe to log.
+
+    extracted_data fields follow FIELD_POLICY and the free-text summary is
+    dropped; other top-level keys (document type, language, error) are kept.
+    """
+    if not isinstance(analysis, dict):
+        return {"value": f"<redacted {type(analysis).__name__}>"}
+    safe = {}
+    for key, value in analysis.items():
+        if key == "extracted_data" and isinstance(value, dict):
+            safe[key] = {field: redact_value(field, field_value) for field, field_value in value.items()}
+        elif key in ("summary", "analysis_output") and value:
+            safe[key] = f"<redacted {len(str(value))} chars>"
+        else:
+            safe[key] = value
+    return safe
+
+
+def redact_text(text: str) -> str:
+    """Document text with every word containing a digit masked (ID numbers, dates)."""
+    return _TOKEN_WITH_DIGIT.sub(lambda match: "#" * len(match.group()), text or "")
+
+
+def sampled_debug(log: logging.Logger, message: str, **payload) -> None:
+    """Log a verbose debug payload for LOG_DEBUG_SAMPLE_RATE of the calls.
+
+    Redact the payload first; it is attached to the record as fields (JSON
+    format) rather than formatted into the message.
+    """
+    if log.isEnabledFor(logging.DEBUG) and random.random() < LOG_DEBUG_SAMPLE_RATE:
+        log.debug(message, extra={"payload": payload})
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        rid = getattr(record, "request_id", None)
+        if rid:
+            entry["request_id"] = rid
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and key != "request_id":
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Adds the request id, and drops records instead of blocking when the queue is full."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.request_id = tracing.request_id.get()
+        # Arguments may change after the call returns, so merge them now; the
+        # rest of the formatting (JSON, tracebacks) happens on the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+def _parse_levels(spec: str) -> dict:
+    levels = {}
+    for part in spec.split(","):
+        name, _, level = part.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _start_listener() -> None:
+    global _listener
+    formatter = JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(
+        "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+    )
+    stream = logging.StreamHandler()
+    stream.setFormatter(formatter)
+    _handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+    _listener = logging.handlers.QueueListener(_handler.queue, stream, respect_handler_level=False)
+    _listener.start()
+
+
+def setup() -> None:
+    """Route all logging through a queue written by a background thread.
+
+    Request threads only put the record on the queue; formatting and the
+    write to stderr happen on the listener thread. Safe to call repeatedly.
+    """
+    global _handler
+    if _handler is not None:
+        return
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    _handler = _QueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    _start_listener()
+    root.addHandler(_handler)
+    root.setLevel(LOG_LEVEL)
+    for name, level in _parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+    # Forked extraction workers inherit the handler but not the listener thread
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def _after_fork() -> None:
+    if _handler is not None:
+        _start_listener()
+
+
+def shutdown() -> None:
+    """Flush queued records (call on shutdown)."""
+    if _listener is not None:
+        _listener.stop()
@@ -1,36 +1,70 @@
 # main.py
 
+import io
 import os
-import tempfile
+import time
+import asyncio
+import zipfile
 import logging
+import contextlib
 from pathlib import Path
+from mimetypes import guess_type
+from typing import List, Optional
 from dotenv import load_dotenv
-from fastapi import FastAPI, File, UploadFile, HTTPException
+
+# Load environment variables from .env file, once and before the project
+# modules read their settings at import
+load_dotenv()
+
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Header, Query, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import textract_service
+import ocr_strategies
+import metrics
+import tracing
+import log_config
 import openai_service
+import extraction_pool
+import result_cache
+import local_classifier
+import field_extractors
+import job_queue
+import upload_stream
 
-# Load environment variables from .env file
-load_dotenv()
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Document Analysis API")
-logging.basicConfig(level=logging.INFO)
+log_config.setup()
 
 # Configure CORS (use env var FRONTEND_ORIGINS for production, comma-separated)
 frontend_origins = os.getenv("FRONTEND_ORIGINS", "*")
 allow_origins = [o.strip() for o in frontend_origins.split(",")] if frontend_origins else ["*"]
 
+app.add_middleware(upload_stream.RequestSizeLimitMiddleware, single_file_paths=("/analyze", "/jobs"))
+app.add_middleware(tracing.TracingMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allow_origins,
     allow_credentials=True,
     allow_methods=["GET", "POST", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "X-Cache"],
 )
 
 # Allowed file extensions
 ALLOWED_EXTENSIONS = [".pdf", ".docx", ".csv", ".xlsx", ".png", ".jpg", ".jpeg"]
 
+# Batch analysis limits
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "20"))
+BATCH_MAX_UNCOMPRESSED_BYTES = int(os.getenv("BATCH_MAX_UNCOMPRESSED_BYTES", str(100 * 1024 * 1024)))
+BATCH_EXTRACTION_CONCURRENCY = int(os.getenv("BATCH_EXTRACTION_CONCURRENCY", str(extraction_pool.EXTRACTION_WORKERS)))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+
+# Longest the startup warm-up waits for one step (extraction workers, LLM
+# connections); /ready reports ready once every step has finished or timed out
+WARM_UP_TIMEOUT_SECONDS = float(os.getenv("WARM_UP_TIMEOUT_SECONDS", "60"))
+
 def validate_file(file: UploadFile):
     ext = Path(file.filename).suffix.lower()
     if ext not in ALLOWED_EXTENSIONS:
@@ -39,81 +73,641 @@ def validate_file(file: UploadFile):
             detail=f"Unsupported file type: {ext}. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
         )
 
+job_store = None
+job_worker = None
+warm_up_task = None
+warm_up_state = {"ready": False, "seconds": None, "steps": {}}
+
+async def _warm_up_extraction():
+    """Start the extraction workers; each resolves Tesseract, loads its language data and preloads extractors."""
+    await asyncio.gather(*(asyncio.wrap_future(future) for future in extraction_pool.warm_up()))
+
+async def _warm_up_step(name: str, step) -> None:
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(step(), WARM_UP_TIMEOUT_SECONDS)
+        outcome = "ok"
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        logger.warning(f"Warm-up step {name} did not finish within {WARM_UP_TIMEOUT_SECONDS}s")
+    except Exception as e:
+        # Requests still work, they just pay the cold start themselves
+        outcome = f"failed: {type(e).__name__}: {e}"
+        logger.warning(f"Warm-up step {name} failed: {e}")
+    warm_up_state["steps"][name] = {"outcome": outcome, "seconds": round(time.perf_counter() - started, 3)}
+
+async def warm_up():
+    """Prepare this worker for its first request; /ready turns 200 when done."""
+    started = time.perf_counter()
+    await asyncio.gather(
+        _warm_up_step("extraction", _warm_up_extraction),
+        _warm_up_step("llm", openai_service.warm_up),
+    )
+    warm_up_state["seconds"] = round(time.perf_counter() - started, 3)
+    warm_up_state["ready"] = True
+    logger.info(f"Warm-up finished in {warm_up_state['seconds']}s: {warm_up_state['steps']}")
+
+@app.on_event("startup")
+async def startup():
+    global job_store, job_worker, warm_up_task
+    # Warm up in the background so /health answers right away; /ready waits for it
+    warm_up_task = asyncio.create_task(warm_up())
+    job_store = job_queue.JobStore()
+    if job_queue.JOB_WORKER_MODE == "inprocess":
+        job_worker = job_queue.JobWorker(job_store, process_job)
+        job_worker.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    if warm_up_task and not warm_up_task.done():
+        warm_up_task.cancel()
+    if job_worker:
+        await job_worker.stop()
+    extraction_pool.shutdown()
+    log_config.shutdown()
+
 @app.get("/")
 async def root():
     return {
         "message": "Document Analysis API",
         "endpoints": {
             "health": "GET /health",
-            "analyze": "POST /analyze"
+            "ready": "GET /ready",
+            "stats": "GET /stats",
+            "metrics": "GET /metrics",
+            "analyze": "POST /analyze",
+            "analyze_batch": "POST /analyze/batch",
+            "submit_job": "POST /jobs",
+            "job_status": "GET /jobs/{job_id}",
+            "cancel_job": "DELETE /jobs/{job_id}"
         }
     }
 
 @app.get("/health", status_code=200)
 async def health_check():
+    """Liveness: the process is up and serving requests."""
     return {"status": "ok"}
 
+@app.get("/ready")
+async def ready_check():
+    """Readiness: 200 once the startup warm-up has finished, 503 until then."""
+    if not warm_up_state["ready"]:
+        return JSONResponse(status_code=503, content={"status": "warming_up", **warm_up_state})
+    return {"status": "ready", **warm_up_state}
+
+@app.get("/stats")
+async def stats():
+    """Per-process counters (cache hits/misses, extraction queue)."""
+    return {
+        "cache": result_cache.stats(),
+        "classification": local_classifier.stats(),
+        "ocr_strategies": ocr_strategies.stats(),
+        "llm": openai_service.llm_stats(),
+        "extraction": {
+            "pool": extraction_pool.pool_kind(),
+            "pending_jobs": extraction_pool.pending_jobs()
+        },
+        "jobs": await asyncio.to_thread(job_store.depth) if job_store else None
+    }
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus metrics, aggregated across gunicorn workers when PROMETHEUS_MULTIPROC_DIR is set."""
+    rendered = metrics.render()
+    if rendered is None:
+        raise HTTPException(status_code=503, detail="Metrics unavailable: prometheus_client is not installed.")
+    body, content_type = rendered
+    return Response(content=body, media_type=content_type)
+
+def _merge_local_fields(analysis_result: dict, local_fields: dict, doc_type: str) -> dict:
+    """Overlay locally extracted (validated) fields on an LLM analysis result."""
+    if not local_fields or not isinstance(analysis_result, dict):
+        return analysis_result
+    llm_fields = analysis_result.get("extracted_data")
+    if not isinstance(llm_fields, dict):
+        llm_fields = {}
+    analysis_result["extracted_data"] = {
+        field: local_fields.get(field, llm_fields.get(field, "Not provided"))
+        for field in openai_service.schema_fields(doc_type)
+    }
+    return analysis_result
+
+async def _analyze_fields(extracted_text: str, doc_type: str) -> dict:
+    """Extract fields with the local rules and ask OpenAI only for the ones still missing."""
+    if doc_type not in field_extractors.SUPPORTED_TYPES:
+        return await openai_service.analyze_document_by_type(extracted_text, doc_type)
+
+    local_fields = field_extractors.extract_fields(extracted_text, doc_type)
+    all_fields = openai_service.schema_fields(doc_type)
+    missing = [field for field in all_fields if field not in local_fields]
+    logger.info(f"Extracted {len(all_fields) - len(missing)}/{len(all_fields)} {doc_type} fields locally")
+
+    if not missing:
+        return {
+            "language": "English",
+            "document_type": doc_type,
+            "summary": field_extractors.build_summary(doc_type, local_fields),
+            "extracted_data": {field: local_fields[field] for field in all_fields}
+        }
+
+    analysis_result = await openai_service.analyze_document_by_type(
+        extracted_text, doc_type, fields=missing if local_fields else None
+    )
+    return _merge_local_fields(analysis_result, local_fields, doc_type)
+
+def _cache_directives(cache_control: Optional[str]) -> set:
+    if not cache_control:
+        return set()
+    return {d.strip().lower() for d in cache_control.split(",")}
+
+def _parse_mode(mode: Optional[str]) -> bool:
+    """Return True for the combined (single OpenAI call) flow."""
+    if mode not in (None, "combined", "two_step"):
+        raise HTTPException(status_code=400, detail="Invalid mode. Allowed values: combined, two_step")
+    return mode == "combined" if mode else openai_service.OPENAI_COMBINED_MODE
+
+def _http_status(e: Exception) -> int:
+    """Status code of the HTTP error a pipeline error maps to, without logging it."""
+    if isinstance(e, HTTPException):
+        return e.status_code
+    if isinstance(e, upload_stream.UploadTooLargeError):
+        return 413
+    if isinstance(e, (extraction_pool.PoolSaturatedError, openai_service.LLMUnavailableError)):
+        return 503
+    if isinstance(e, extraction_pool.ExtractionTimeoutError):
+        return 504
+    return 500
+
+def _to_http_exception(e: Exception) -> HTTPException:
+    """Map pipeline errors to the HTTP error returned to the client (and log them)."""
+    if isinstance(e, HTTPException):
+        # Preserve intended HTTP status codes like 400/422
+        return e
+    status_code = _http_status(e)
+    if isinstance(e, upload_stream.UploadTooLargeError):
+        return HTTPException(status_code=status_code, detail=str(e))
+    if isinstance(e, extraction_pool.PoolSaturatedError):
+        logger.warning("Extraction queue is full. Rejecting request.")
+        return HTTPException(
+            status_code=status_code,
+            detail="Server is busy processing other documents. Please retry later.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    if isinstance(e, openai_service.LLMUnavailableError):
+        logger.warning(f"LLM unavailable: {e}")
+        return HTTPException(
+            status_code=status_code,
+            detail="Document analysis is temporarily unavailable. Please retry later.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    if isinstance(e, extraction_pool.ExtractionTimeoutError):
+        logger.error(f"Text extraction timed out: {e}")
+        return HTTPException(status_code=status_code, detail="Text extraction timed out. Please try a smaller or clearer document.")
+    logger.error("An error occurred while analyzing a document", exc_info=e)
+    return HTTPException(status_code=status_code, detail=str(e))
+
+async def run_pipeline(filename: str, file_bytes: bytes, content_type: Optional[str], **options) -> dict:
+    """Extract, classify and analyze one document, recording metrics.
+
+    See _run_pipeline for the options and the returned keys.
+    """
+    started = time.perf_counter()
+    with metrics.in_flight("documents"), tracing.span("pipeline"):
+        try:
+            result = await _run_pipeline(filename, file_bytes, content_type, **options)
+        except Exception as e:
+            # The caller turns the error into its response (and logs it) with _to_http_exception
+            metrics.record_document("unknown", f"http_{_http_status(e)}")
+            raise
+    metrics.observe_stage("total", time.perf_counter() - started)
+    if result["cache"] == "HIT":
+        outcome = "cache_hit"
+    else:
+        outcome = "analysis_error" if "error" in result["analysis"] else "ok"
+    metrics.record_document(result["document_type"], outcome)
+    return result
+
+def _extraction_method(filename: str, pages: Optional[list], ocr: Optional[dict]) -> str:
+    """Metrics label for how a document's text was extracted."""
+    ext = Path(filename).suffix.lower().lstrip(".")
+    if pages is not None:
+        return "pdf_ocr" if any(page["source"] != "text_layer" for page in pages) else "pdf_text_layer"
+    if ocr is not None:
+        return "image_ocr"
+    return ext or "unknown"
+
+async def _run_pipeline(
+    filename: str,
+    file_bytes: bytes,
+    content_type: Optional[str],
+    combined: bool = False,
+    read_cache: bool = True,
+    write_cache: bool = True,
+    extraction_semaphore: Optional[asyncio.Semaphore] = None,
+    llm_semaphore: Optional[asyncio.Semaphore] = None,
+    file_hash: Optional[str] = None
+) -> dict:
+    """Extract, classify and analyze one document.
+
+    `file_hash` is the SHA-256 of `file_bytes` when the caller already has it.
+    `extraction_semaphore` is held only while the text is extracted and
+    `llm_semaphore` only during classification and analysis.
+    Returns the response body plus "cache" ("HIT"/"MISS") and "timings"
+    (seconds per stage; for freshly extracted PDFs also "pages", the source and
+    timings of every page) keys.
+    """
+    started = time.perf_counter()
+    timings = {}
+
+    file_hash = file_hash or result_cache.hash_bytes(file_bytes)
+    analysis_key = result_cache.make_key(
+        result_cache.TIER_ANALYSIS, file_hash, openai_service.model_signature(), openai_service.PROMPT_VERSION,
+        field_extractors.EXTRACTOR_VERSION, "combined" if combined else "two_step"
+    )
+    text_key = result_cache.make_key(result_cache.TIER_TEXT, file_hash, textract_service.EXTRACTOR_VERSION)
+
+    if read_cache:
+        with tracing.span("cache_lookup"):
+            cached = await result_cache.get(result_cache.TIER_ANALYSIS, analysis_key)
+        if cached is not None:
+            logger.info(f"Serving cached analysis for file: {filename}")
+            timings["total"] = round(time.perf_counter() - started, 3)
+            return {
+                "document_type": cached["document_type"],
+                "analysis": cached["analysis"],
+                "cache": "HIT",
+                "timings": timings
+            }
+
+    # 1. Extract text using pdfplumber and Tesseract OCR
+    logger.info(f"Processing file: {filename}, content_type: {content_type}")
+    extraction_started = time.perf_counter()
+    with tracing.span("extraction") as extraction_span:
+        extracted_text = await result_cache.get(result_cache.TIER_TEXT, text_key) if read_cache else None
+        pages = ocr = None
+        if extracted_text is None:
+            async with (extraction_semaphore or contextlib.nullcontext()):
+                with metrics.in_flight("extraction"):
+                    details = await textract_service.extract_text_with_details(filename, file_bytes, content_type)
+            extracted_text, pages, ocr = details["text"], details["pages"], details.get("ocr")
+            if extracted_text and extracted_text.strip() and write_cache:
+                await result_cache.put(result_cache.TIER_TEXT, text_key, extracted_text)
+            method = _extraction_method(filename, pages, ocr)
+        else:
+            method = "text_cache"
+        if extraction_span is not None:
+            extraction_span.set(method=method, chars=len(extracted_text or ""))
+    metrics.observe_extraction(method, time.perf_counter() - extraction_started)
+    metrics.observe_stage("extraction", time.perf_counter() - extraction_started)
+    timings["extraction"] = round(time.perf_counter() - extraction_started, 3)
+    if pages:
+        # Per-page provenance (text layer or OCR) and timings of PDFs
+        timings["pages"] = pages
+    if ocr:
+        # Winning OCR strategy of an image and the candidates tried
+        timings["ocr"] = ocr
+    logger.info(f"Extracted text length: {len(extracted_text) if extracted_text else 0}")
+    if not extracted_text or not extracted_text.strip():
+        raise HTTPException(
+            status_code=422, 
+            detail="Failed to extract text from document. Please check if the document is readable and Tesseract OCR is installed."
+        )
+
+    log_config.sampled_debug(logger, "Extracted text preview", text=log_config.redact_text(extracted_text[:300]))
+    analysis_started = time.perf_counter()
+    async with (llm_semaphore or contextlib.nullcontext()):
+        # 2. Classify locally first; only ask the LLM when the rules are unsure
+        classification_started = time.perf_counter()
+        with tracing.span("classification.local") as local_span:
+            local_result = local_classifier.classify(extracted_text)
+            if local_span is not None:
+                local_span.set(document_type=local_result["document_type"], confidence=local_result["confidence"])
+        if local_classifier.is_confident(local_result):
+            local_classifier.record("local")
+            metrics.record_classification("local")
+            doc_type = local_result["document_type"]
+            logger.info(
+                f"Document classified locally as: {doc_type} "
+                f"(confidence {local_result['confidence']}, signals {local_result['signals']})"
+            )
+        else:
+            local_classifier.record("llm")
+            metrics.record_classification("llm")
+            doc_type = None
+
+        if doc_type is None and combined:
+            # 2+3. Classify and analyze with a single OpenAI request
+            metrics.observe_stage("classification", time.perf_counter() - classification_started)
+            analysis_stage_started = time.perf_counter()
+            with tracing.span("classify_and_analyze"):
+                analysis_result = await openai_service.classify_and_analyze(extracted_text)
+            doc_type = analysis_result.get("document_type", "GeneralDocument")
+            logger.info(f"Document classified as: {doc_type}")
+            analysis_result = _merge_local_fields(
+                analysis_result, field_extractors.extract_fields(extracted_text, doc_type), doc_type
+            )
+        else:
+            if doc_type is None:
+                with tracing.span("classification.llm"):
+                    classification_result = await openai_service.classify_document(extracted_text)
+                if not isinstance(classification_result, dict):
+                    classification_result = {"document_type": str(classification_result)}
+                doc_type = classification_result.get("document_type", "GeneralDocument")
+                logger.info(f"Document classified as: {doc_type}")
+            metrics.observe_stage("classification", time.perf_counter() - classification_started)
+
+            # 3. Perform specialized KYC analysis (local rules first, OpenAI for the rest)
+            logger.info(f"Proceeding with analysis for document type: {doc_type}")
+            analysis_stage_started = time.perf_counter()
+            with tracing.span("analysis", document_type=doc_type):
+                analysis_result = await _analyze_fields(extracted_text, doc_type)
+        metrics.observe_stage("analysis", time.perf_counter() - analysis_stage_started)
+    timings["analysis"] = round(time.perf_counter() - analysis_started, 3)
+    if ocr and ocr["strategy"]:
+        ocr_strategies.record_win(doc_type, ocr["strategy"])
+
+    # Ensure analysis_result is a dictionary
+    if not isinstance(analysis_result, dict):
+        logger.warning("OpenAI returned non-dict analysis result. Wrapping it.")
+        analysis_result = {"analysis_output": str(analysis_result)}
+
+    log_config.sampled_debug(logger, "Analysis result", document_type=doc_type, analysis=log_config.redact(analysis_result))
+
+    # Failed analyses are not cached so a retry gets a fresh attempt
+    if write_cache and "error" not in analysis_result:
+        await result_cache.put(result_cache.TIER_ANALYSIS, analysis_key, {
+            "document_type": doc_type,
+            "analysis": analysis_result
+        })
+
+    timings["total"] = round(time.perf_counter() - started, 3)
+    return {
+        "document_type": doc_type,
+        "analysis": analysis_result,
+        "cache": "MISS",
+        "timings": timings
+    }
+
 @app.post("/analyze")
-async def analyze(file: UploadFile = File(...)):
-    """Main endpoint to upload and analyze a document."""
-    tmp_path = None
+async def analyze(
+    response: Response,
+    file: UploadFile = File(...),
+    cache_control: Optional[str] = Header(None),
+    mode: Optional[str] = Query(None, description="'combined' (one OpenAI call) or 'two_step'"),
+    debug_timing: bool = Query(False, description="Include the span tree of this request in the response")
+):
+    """Main endpoint to upload and analyze a document.
+
+    Results are cached by file content; send `Cache-Control: no-cache` to force a
+    fresh analysis or `no-store` to also skip storing the result.
+    """
     try:
         validate_file(file)  # ✅ Check file extension
+        combined = _parse_mode(mode)
 
-        # Save file temporarily to disk
-        with tempfile.NamedTemporaryFile(delete=False, suffix=Path(file.filename).suffix) as tmp:
-            file_bytes = await file.read()
-            tmp.write(file_bytes)
-            tmp_path = tmp.name
+        # Stream the upload into memory once; the extractors only need the
+        # bytes and the file name's extension.
+        file_bytes, file_hash = await upload_stream.read_upload(file)
 
-        # 1. Extract text using pdfplumber and Tesseract OCR
-        logging.info(f"Processing file: {file.filename}, content_type: {file.content_type}")
-        extracted_text = await textract_service.extract_text_from_upload(
-            tmp_path,
+        directives = _cache_directives(cache_control)
+        result = await run_pipeline(
+            file.filename,
             file_bytes,
-            file.content_type if hasattr(file, "content_type") else None
+            file.content_type if hasattr(file, "content_type") else None,
+            combined=combined,
+            read_cache="no-cache" not in directives and "no-store" not in directives,
+            write_cache="no-store" not in directives,
+            file_hash=file_hash
         )
-        logging.info(f"Extracted text length: {len(extracted_text) if extracted_text else 0}")
-        if not extracted_text or not extracted_text.strip():
-            raise HTTPException(
-                status_code=422, 
-                detail="Failed to extract text from document. Please check if the document is readable and Tesseract OCR is installed."
-            )
+        response.headers["X-Cache"] = result["cache"]
 
-        # 2. Classify the KYC document type
-        logging.info(f"Extracted text preview: {extracted_text[:300]}...")
-        classification_result = await openai_service.classify_document(extracted_text)
-        logging.info(f"classification_result type: {type(classification_result)}, value: {classification_result}")
-        if not isinstance(classification_result, dict):
-            classification_result = {"document_type": str(classification_result)}
-        doc_type = classification_result.get("document_type", "GeneralDocument")
-        logging.info(f"Document classified as: {doc_type}")
-
-        # 3. Perform specialized KYC analysis
-        logging.info(f"Proceeding with analysis for document type: {doc_type}")
-        analysis_result = await openai_service.analyze_document_by_type(extracted_text, doc_type)
-        
-        # Ensure analysis_result is a dictionary
-        if not isinstance(analysis_result, dict):
-            logging.warning("OpenAI returned non-dict analysis result. Wrapping it.")
-            analysis_result = {"analysis_output": str(analysis_result)}
-
-        # Optional debug logging
-        logging.info(f"analysis_result type: {type(analysis_result)}, value: {analysis_result}")
+        body = {
+            "filename": file.filename,
+            "document_type": result["document_type"],
+            "analysis": result["analysis"]
+        }
+        if debug_timing:
+            # TracingMiddleware traces requests that ask for debug_timing
+            body["debug_timing"] = {"request_id": tracing.request_id.get(), "spans": tracing.tree()}
+        return body
 
+    except Exception as e:
+        raise _to_http_exception(e)
+
+def _unpack_zip(filename: str, data: bytes) -> list:
+    """Return (name, bytes, content_type) for every document inside a zip upload.
+
+    Members larger than MAX_UPLOAD_BYTES are returned with None instead of bytes
+    so they fail on their own.
+    """
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(data))
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail=f"Invalid zip file: {filename}")
+
+    members = [
+        info for info in archive.infolist()
+        if not info.is_dir() and not info.filename.startswith("__MACOSX/") and not Path(info.filename).name.startswith(".")
+    ]
+    if len(members) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many files in {filename}. Maximum is {BATCH_MAX_FILES}.")
+    if sum(info.file_size for info in members) > BATCH_MAX_UNCOMPRESSED_BYTES:
+        raise HTTPException(status_code=413, detail=f"Uncompressed size of {filename} exceeds {BATCH_MAX_UNCOMPRESSED_BYTES} bytes.")
+
+    items = []
+    for info in members:
+        name = Path(info.filename).name
+        data = archive.read(info) if info.file_size <= upload_stream.MAX_UPLOAD_BYTES else None
+        items.append((name, data, guess_type(name)[0]))
+    return items
+
+async def _run_batch_item(
+    name: str,
+    data: bytes,
+    content_type: Optional[str],
+    extraction_semaphore: asyncio.Semaphore,
+    llm_semaphore: asyncio.Semaphore,
+    **pipeline_options
+) -> dict:
+    """Analyze one batch entry; errors are reported in the entry instead of raised."""
+    started = time.perf_counter()
+    try:
+        ext = Path(name).suffix.lower()
+        if ext not in ALLOWED_EXTENSIONS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported file type: {ext}. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
+            )
+        if data is None:
+            raise upload_stream.UploadTooLargeError(name, upload_stream.MAX_UPLOAD_BYTES)
+        # Extraction concurrency is capped so one batch cannot fill the whole
+        # extraction queue and get its own files rejected; the slot is given
+        # back before the LLM calls so later files extract meanwhile.
+        result = await run_pipeline(
+            name, data, content_type,
+            extraction_semaphore=extraction_semaphore, llm_semaphore=llm_semaphore, **pipeline_options
+        )
         return {
-            "filename": file.filename,
-            "document_type": doc_type,
-            "analysis": analysis_result
+            "filename": name,
+            "status": "ok",
+            "document_type": result["document_type"],
+            "analysis": result["analysis"],
+            "cache": result["cache"],
+            "timings": result["timings"]
+        }
+    except Exception as e:
+        error = _to_http_exception(e)
+        return {
+            "filename": name,
+            "status": "error",
+            "status_code": error.status_code,
+            "error": error.detail,
+            "timings": {"total": round(time.perf_counter() - started, 3)}
         }
 
-    except HTTPException as http_ex:
-        # Preserve intended HTTP status codes like 400/422
-        raise http_ex
+@app.post("/analyze/batch")
+async def analyze_batch(
+    files: List[UploadFile] = File(...),
+    cache_control: Optional[str] = Header(None),
+    mode: Optional[str] = Query(None, description="'combined' (one OpenAI call) or 'two_step'")
+):
+    """Analyze several documents (or zip archives of documents) in one request.
+
+    Files are processed concurrently; a failing file is reported in its own
+    result entry and does not fail the batch.
+    """
+    combined = _parse_mode(mode)
+    directives = _cache_directives(cache_control)
+
+    items = []
+    for file in files:
+        try:
+            data, _ = await upload_stream.read_upload(file)
+        except upload_stream.UploadTooLargeError:
+            items.append((file.filename, None, file.content_type))
+            continue
+        if Path(file.filename).suffix.lower() == ".zip":
+            items.extend(_unpack_zip(file.filename, data))
+        else:
+            items.append((file.filename, data, file.content_type))
+    if not items:
+        raise HTTPException(status_code=400, detail="No files to analyze.")
+    if len(items) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many files. Maximum is {BATCH_MAX_FILES} per batch.")
+
+    started = time.perf_counter()
+    extraction_semaphore = asyncio.Semaphore(BATCH_EXTRACTION_CONCURRENCY)
+    llm_semaphore = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
+    results = await asyncio.gather(*[
+        _run_batch_item(
+            name, data, content_type, extraction_semaphore, llm_semaphore,
+            combined=combined,
+            read_cache="no-cache" not in directives and "no-store" not in directives,
+            write_cache="no-store" not in directives
+        )
+        for name, data, content_type in items
+    ])
+
+    succeeded = sum(1 for r in results if r["status"] == "ok")
+    return {
+        "count": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "total_seconds": round(time.perf_counter() - started, 3),
+        "results": results
+    }
+
+async def process_job(job: dict) -> dict:
+    """Job queue handler: run the /analyze pipeline for a queued upload."""
+    try:
+        # Jobs have no HTTP request to hang a trace on; trace them when exporting
+        with (tracing.trace("job", job_id=job["id"]) if tracing.exporting() else contextlib.nullcontext()):
+            result = await run_pipeline(job["filename"], job["file"], job["content_type"], **job["options"])
     except Exception as e:
-        logging.error("An error occurred in the /analyze endpoint", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        # Clean up the temporary file
-        if tmp_path and os.path.exists(tmp_path):
-            os.remove(tmp_path)
+        error = _to_http_exception(e)
+        # A full extraction queue is temporary; put the job back instead of failing it
+        retry_after = int(error.headers["Retry-After"]) if error.status_code == 503 and error.headers else None
+        raise job_queue.JobFailed(error.status_code, error.detail, retry_after=retry_after)
+    return {
+        "filename": job["filename"],
+        "document_type": result["document_type"],
+        "analysis": result["analysis"],
+        "timings": result["timings"]
+    }
+
+def _job_response(job: dict) -> dict:
+    body = {
+        "job_id": job["id"],
+        "status": job["status"],
+        "filename": job["filename"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "status_url": f"/jobs/{job['id']}"
+    }
+    if job["status"] == job_queue.SUCCEEDED:
+        body["result"] = job["result"]
+    elif job["status"] in (job_queue.FAILED, job_queue.CANCELLED):
+        body["error"] = {"status_code": job["status_code"], "detail": job["error"]}
+    elif job["cancel_requested"]:
+        body["cancel_requested"] = True
+    return body
+
+@app.post("/jobs", status_code=202)
+async def submit_job(
+    file: UploadFile = File(...),
+    webhook_url: Optional[str] = Form(None),
+    cache_control: Optional[str] = Header(None),
+    mode: Optional[str] = Query(None, description="'combined' (one OpenAI call) or 'two_step'")
+):
+    """Queue a document for analysis and return a job id right away.
+
+    Poll GET /jobs/{job_id} for the result, or pass `webhook_url` to have the
+    finished job POSTed to it.
+    """
+    validate_file(file)
+    combined = _parse_mode(mode)
+    if webhook_url:
+        try:
+            await asyncio.to_thread(job_queue.validate_webhook_url, webhook_url)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    directives = _cache_directives(cache_control)
+    try:
+        file_bytes, _ = await upload_stream.read_upload(file)
+    except upload_stream.UploadTooLargeError as e:
+        raise _to_http_exception(e)
+    job_id = await asyncio.to_thread(
+        job_store.enqueue,
+        file.filename,
+        file_bytes,
+        file.content_type,
+        {
+            "combined": combined,
+            "read_cache": "no-cache" not in directives and "no-store" not in directives,
+            "write_cache": "no-store" not in directives
+        },
+        webhook_url
+    )
+    if job_worker:
+        job_worker.notify()
+    logger.info(f"Queued job {job_id} for file: {file.filename}")
+    return _job_response(await asyncio.to_thread(job_store.get, job_id))
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_response(job)
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued job, or ask the worker running it to stop."""
+    status = await asyncio.to_thread(job_store.cancel, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if status in (job_queue.SUCCEEDED, job_queue.FAILED):
+        raise HTTPException(status_code=409, detail=f"Job already {status}")
+    return _job_response(await asyncio.to_thread(job_store.get, job_id))
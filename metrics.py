@@ -0,0 +1,151 @@
+import os
+import logging
+import contextlib
+
+logger = logging.getLogger(__name__)
+
+# Optional: prometheus_client. Without it every recording function is a no-op
+# and GET /metrics answers 503.
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+    )
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+    logger.warning("prometheus_client not installed. GET /metrics is disabled.")
+
+# With several gunicorn workers every process writes its samples to files in
+# this directory and /metrics aggregates them (set it before starting the server)
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+_STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+if PROMETHEUS_AVAILABLE:
+    STAGE_SECONDS = Histogram(
+        "kyc_stage_seconds", "Time spent per pipeline stage",
+        ["stage"], buckets=_STAGE_BUCKETS
+    )
+    EXTRACTION_SECONDS = Histogram(
+        "kyc_extraction_seconds", "Text extraction time by method",
+        ["method"], buckets=_STAGE_BUCKETS
+    )
+    DOCUMENTS = Counter(
+        "kyc_documents_total", "Documents processed by document type and outcome",
+        ["document_type", "outcome"]
+    )
+    CLASSIFICATIONS = Counter(
+        "kyc_classifications_total", "Classification decisions by source (local rules or LLM)",
+        ["source"]
+    )
+    LLM_REQUESTS = Counter(
+        "kyc_llm_requests_total", "LLM requests by model and outcome",
+        ["model", "outcome"]
+    )
+    LLM_SECONDS = Histogram(
+        "kyc_llm_request_seconds", "LLM request latency",
+        ["model"], buckets=_STAGE_BUCKETS
+    )
+    LLM_TOKENS = Counter(
+        "kyc_llm_tokens_total", "LLM token usage reported by the API",
+        ["model", "kind"]
+    )
+    LLM_ROUTES = Counter(
+        "kyc_llm_routes_total", "LLM router decisions by provider (won, hedged, failed)",
+        ["provider", "outcome"]
+    )
+    PROMPT_TOKENS = Counter(
+        "kyc_prompt_tokens_total", "Document text tokens sent to the LLM and saved by the prompt budget",
+        ["purpose", "kind"]
+    )
+    CACHE_REQUESTS = Counter(
+        "kyc_cache_requests_total", "Result cache lookups and writes by tier and outcome",
+        ["tier", "outcome"]
+    )
+    IN_FLIGHT = Gauge(
+        "kyc_in_flight", "Work currently in progress by stage",
+        ["stage"], multiprocess_mode="livesum"
+    )
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    if PROMETHEUS_AVAILABLE:
+        STAGE_SECONDS.labels(stage).observe(seconds)
+
+
+def observe_extraction(method: str, seconds: float) -> None:
+    if PROMETHEUS_AVAILABLE:
+        EXTRACTION_SECONDS.labels(method).observe(seconds)
+
+
+def record_document(document_type: str, outcome: str) -> None:
+    if PROMETHEUS_AVAILABLE:
+        DOCUMENTS.labels(document_type or "unknown", outcome).inc()
+
+
+def record_classification(source: str) -> None:
+    if PROMETHEUS_AVAILABLE:
+        CLASSIFICATIONS.labels(source).inc()
+
+
+def record_cache(tier: str, outcome: str) -> None:
+    if PROMETHEUS_AVAILABLE:
+        CACHE_REQUESTS.labels(tier, outcome).inc()
+
+
+def record_llm_request(model: str, outcome: str, seconds: float, usage=None) -> None:
+    """Count one LLM request; `usage` is the response's usage object, if any."""
+    if not PROMETHEUS_AVAILABLE:
+        return
+    model = model or "unknown"
+    LLM_REQUESTS.labels(model, outcome).inc()
+    LLM_SECONDS.labels(model).observe(seconds)
+    if usage is not None:
+        LLM_TOKENS.labels(model, "prompt").inc(getattr(usage, "prompt_tokens", 0) or 0)
+        LLM_TOKENS.labels(model, "completion").inc(getattr(usage, "completion_tokens", 0) or 0)
+
+
+def record_llm_route(provider: str, outcome: str) -> None:
+    if PROMETHEUS_AVAILABLE:
+        LLM_ROUTES.labels(provider, outcome).inc()
+
+
+def record_prompt_tokens(purpose: str, sent: int, saved: int) -> None:
+    if PROMETHEUS_AVAILABLE:
+        PROMPT_TOKENS.labels(purpose, "sent").inc(sent)
+        PROMPT_TOKENS.labels(purpose, "saved").inc(saved)
+
+
+@contextlib.contextmanager
+def in_flight(stage: str):
+    """Count the enclosed block in the kyc_in_flight gauge."""
+    if not PROMETHEUS_AVAILABLE:
+        yield
+        return
+    gauge = IN_FLIGHT.labels(stage)
+    gauge.inc()
+    try:
+        yield
+    finally:
+        gauge.dec()
+
+
+def render():
+    """Return (body, content type) for GET /metrics, or None without prometheus_client.
+
+    In multiprocess mode the samples of all worker processes are aggregated.
+    """
+    if not PROMETHEUS_AVAILABLE:
+        return None
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    from prometheus_client import REGISTRY
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int) -> None:
+    """gunicorn child_exit hook: drop the live gauge samples of a dead worker."""
+    if PROMETHEUS_AVAILABLE and PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,246 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+from PIL import Image
+
+import tracing
+import local_classifier
+import image_preprocess
+
+logger = logging.getLogger(__name__)
+
+# A candidate with at least this mean word confidence (0-100) and OCR_MIN_WORDS
+# words is accepted right away and the remaining strategies are cancelled
+OCR_CONFIDENCE_THRESHOLD = float(os.getenv("OCR_CONFIDENCE_THRESHOLD", "80"))
+OCR_MIN_WORDS = int(os.getenv("OCR_MIN_WORDS", "5"))
+# Strategies OCR'd at the same time for one image; 1 runs them one after another
+OCR_STRATEGY_CONCURRENCY = max(1, int(os.getenv("OCR_STRATEGY_CONCURRENCY", "2")))
+
+# Image statistics below which preprocessing is tried first
+LOW_RESOLUTION_PX = 1000
+LOW_CONTRAST = 100.0
+SKEW_DEGREES = 2.0
+
+
+def _original(image: Image.Image, doc_type: str = None) -> tuple:
+    return image, None
+
+
+def _preprocessed(image: Image.Image, doc_type: str = None) -> tuple:
+    return image_preprocess.preprocess(image, doc_type)
+
+
+# name -> (preparation function, Tesseract page segmentation mode or None for automatic)
+STRATEGIES = {
+    "no_preprocessing": (_original, None),
+    "preprocessed_psm6": (_preprocessed, 6),
+    "preprocessed_psm11": (_preprocessed, 11),
+}
+DEFAULT_ORDER = list(STRATEGIES)
+
+_wins_lock = threading.Lock()
+_wins = {}  # document type -> {strategy: wins}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def record_win(doc_type: str, strategy: str) -> None:
+    """Count the strategy whose text was used for a document of `doc_type`."""
+    if strategy not in STRATEGIES:
+        return
+    with _wins_lock:
+        counts = _wins.setdefault(doc_type, {})
+        counts[strategy] = counts.get(strategy, 0) + 1
+
+
+def wins() -> dict:
+    """Snapshot of the win counts, passed to extraction workers."""
+    with _wins_lock:
+        return {doc_type: dict(counts) for doc_type, counts in _wins.items()}
+
+
+def stats() -> dict:
+    return {
+        "confidence_threshold": OCR_CONFIDENCE_THRESHOLD,
+        "concurrency": OCR_STRATEGY_CONCURRENCY,
+        "wins": wins(),
+    }
+
+
+def order_for(win_counts: dict = None, doc_type: str = None) -> list:
+    """Strategies ordered by past wins for `doc_type` (all types when None)."""
+    win_counts = win_counts or {}
+    if doc_type is not None and doc_type in win_counts:
+        counts = win_counts[doc_type]
+    else:
+        counts = {}
+        for type_counts in win_counts.values():
+            for strategy, count in type_counts.items():
+                counts[strategy] = counts.get(strategy, 0) + count
+    # sorted() is stable, so ties keep the default order
+    return sorted(DEFAULT_ORDER, key=lambda strategy: -counts.get(strategy, 0))
+
+
+def image_stats(image: Image.Image) -> dict:
+    """Cheap statistics of an image: size, grayscale contrast and estimated skew.
+
+    Contrast is the spread between the darkest and lightest 0.1% of pixels, so
+    a mostly white page with crisp black text still counts as high contrast.
+    """
+    gray_image = image.convert('L')
+    # Thin strokes blur away in small thumbnails, so contrast uses a larger one
+    gray_image.thumbnail((1000, 1000))
+    low, high = np.percentile(np.asarray(gray_image), [0.1, 99.9])
+    gray_image.thumbnail((400, 400))
+    return {
+        "width": image.size[0],
+        "height": image.size[1],
+        "contrast": round(float(high - low), 1),
+        "skew": image_preprocess.estimate_skew(np.asarray(gray_image, dtype=np.float32)),
+    }
+
+
+def predict_order(image_info: dict, order: list) -> list:
+    """Move strategies the image statistics favour to the front of `order`."""
+    preferred = []
+    if abs(image_info["skew"]) >= SKEW_DEGREES:
+        # Sparse-text segmentation copes better with tilted lines
+        preferred.append("preprocessed_psm11")
+    if min(image_info["width"], image_info["height"]) < LOW_RESOLUTION_PX or image_info["contrast"] < LOW_CONTRAST:
+        preferred.append("preprocessed_psm6")
+    return preferred + [strategy for strategy in order if strategy not in preferred]
+
+
+def score(candidate: dict) -> float:
+    """Mean word confidence, scaled down for candidates with very few words."""
+    if "error" in candidate or not candidate["words"]:
+        return 0.0
+    return candidate["confidence"] * min(1.0, candidate["words"] / OCR_MIN_WORDS)
+
+
+def _recognize(engine, image: Image.Image, psm: int, name: str) -> dict:
+    with tracing.span("ocr.strategy", strategy=name):
+        return engine.recognize(image, psm)
+
+
+def _accepted(candidate: dict) -> bool:
+    return candidate.get("confidence", 0) >= OCR_CONFIDENCE_THRESHOLD and candidate.get("words", 0) >= OCR_MIN_WORDS
+
+
+def _get_executor(warm=None) -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = OCR_STRATEGY_CONCURRENCY
+            if os.getenv("EXTRACTION_POOL_KIND", "process").lower() == "thread":
+                # Shared by all extraction threads of this process
+                workers *= int(os.getenv("EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ocr", initializer=warm)
+        return _executor
+
+
+def warm_up(warm) -> None:
+    """Create the strategy threads, running `warm` (e.g. loading an OCR handle) in each."""
+    executor = _get_executor(warm)
+    for _ in range(OCR_STRATEGY_CONCURRENCY):
+        executor.submit(lambda: None)
+
+
+def run(image: Image.Image, engine, win_counts: dict = None, deadline: float = None) -> dict:
+    """OCR `image` with several strategies and return the best candidate.
+
+    Up to OCR_STRATEGY_CONCURRENCY strategies run at once, in an order
+    predicted from the image statistics and past wins. As soon as one is
+    accepted (see OCR_CONFIDENCE_THRESHOLD) the rest are cancelled. After the
+    first result the text is classified locally; the remaining strategies are
+    reordered by that document type's wins and preprocessed with its profile.
+
+    Returns {"text", "strategy", "confidence", "words", "image", "candidates"};
+    "strategy" is None if nothing produced text.
+    """
+    info = image_stats(image)
+    queue = predict_order(info, order_for(win_counts))
+    executor = _get_executor()
+    prepared = {}
+    pending = {}
+    candidates = []
+    guessed_type = None
+
+    def deadline_exceeded() -> bool:
+        return deadline is not None and time.time() > deadline
+
+    def submit_next():
+        name = queue.pop(0)
+        prepare, psm = STRATEGIES[name]
+        started = time.perf_counter()
+        key = (prepare, guessed_type)
+        if key not in prepared:
+            with tracing.span("ocr.prepare", strategy=name):
+                prepared[key] = prepare(image, guessed_type)
+        prepared_image, steps = prepared[key]
+        future = executor.submit(tracing.wrap(_recognize), engine, prepared_image, psm, name)
+        pending[future] = (name, started, steps)
+
+    def fill():
+        while queue and len(pending) < OCR_STRATEGY_CONCURRENCY and not deadline_exceeded():
+            submit_next()
+
+    fill()
+    while pending:
+        timeout = None if deadline is None else max(0.0, deadline - time.time())
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            name, started, steps = pending.pop(future)
+            candidate = {"strategy": name}
+            if steps:
+                candidate["preprocessing"] = steps
+            try:
+                candidate.update(future.result())
+            except Exception as e:
+                logger.warning(f"OCR strategy {name} failed: {e}")
+                candidate["error"] = str(e)
+            candidate["seconds"] = round(time.perf_counter() - started, 3)
+            candidates.append(candidate)
+
+        if any(_accepted(candidate) for candidate in candidates):
+            break
+        if guessed_type is None:
+            texts = [candidate["text"] for candidate in candidates if candidate.get("text")]
+            if texts:
+                guess = local_classifier.classify(texts[0])
+                guessed_type = guess["document_type"] if guess["confidence"] > 0 else "GeneralDocument"
+                ranked = order_for(win_counts, guessed_type)
+                queue.sort(key=ranked.index)
+        fill()
+
+    # Strategies still queued or running are abandoned; a running Tesseract
+    # call cannot be interrupted, but its result is ignored.
+    for future in pending:
+        future.cancel()
+
+    best = max(candidates, key=score, default=None)
+    result = {
+        "text": "",
+        "strategy": None,
+        "confidence": None,
+        "words": 0,
+        "image": info,
+        "candidates": [
+            {key: value for key, value in candidate.items() if key != "text"} for candidate in candidates
+        ],
+    }
+    if best is not None and best.get("text"):
+        result.update({
+            "text": best["text"],
+            "strategy": best["strategy"],
+            "confidence": best["confidence"],
+            "words": best["words"],
+        })
+    return result
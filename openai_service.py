@@ -1,119 +1,234 @@
 import os
 import json
+import asyncio
 import logging
+import threading
 from typing import Optional
 
-from dotenv import load_dotenv
-from openai import AsyncOpenAI
+import metrics
+import tracing
+import log_config
+import llm_client
+import llm_router
+import gemini_service
+import prompt_budget
+from llm_client import LLMUnavailableError
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL")
+# Bump whenever the classification or analysis prompts change so cached
+# analysis results produced by older prompts are not reused.
+PROMPT_VERSION = "kyc-v3"
 
-client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+# Combined mode classifies and extracts in one request instead of two
+OPENAI_COMBINED_MODE = os.getenv("OPENAI_COMBINED_MODE", "false").lower() in ("1", "true", "yes")
+
+# Created on first use (or by warm_up at startup); None without an API key
+client = None
+_client_lock = threading.Lock()
+
+KYC_DOCUMENT_TYPES = ["Passport", "Aadhar", "PAN", "DrivingLicence", "UtilityBill", "GeneralDocument"]
+
+_CLASSIFICATION_GUIDE = (
+    "Document types:\n"
+    "- 'Passport': Contains passport number, issue date, expiry date, MRZ (machine readable zone), nationality, 'REPUBLIC OF', 'P<'\n"
+    "- 'Aadhar': Contains 12-digit Aadhar number, 'Government of India', 'My Aadhar My Identity'\n"
+    "- 'PAN': Contains 10-character alphanumeric PAN number, 'INCOME TAX DEPARTMENT'\n"
+    "- 'DrivingLicence': Contains DL number, 'Driving Licence', vehicle classes, licence validity dates\n"
+    "- 'UtilityBill': Contains account number, bill amount, service provider name, bill period\n"
+    "- 'GeneralDocument': If none of the above match\n"
+)
 
 
 def _ensure_client_configured() -> None:
-    if not OPENAI_API_KEY:
-        raise RuntimeError("OPENAI_API_KEY is not set in environment.")
+    if not router.providers:
+        raise RuntimeError("No LLM provider configured: set OPENAI_API_KEY or GEMINI_API_KEY.")
+
+
+def get_client():
+    """The process-wide OpenAI client, or None when OPENAI_API_KEY is not set."""
+    global client
+    if client is None and OPENAI_API_KEY:
+        with _client_lock:
+            if client is None:
+                client = llm_client.OpenAIClient(api_key=OPENAI_API_KEY)
+    return client
+
+
+async def warm_up() -> None:
+    """Create the LLM clients and open the OpenAI connection pool before the first request.
+
+    The SDK imports run on a thread so the event loop keeps answering /health.
+    """
+    if OPENAI_API_KEY:
+        openai_client = await asyncio.to_thread(get_client)
+        await openai_client.warm_up()
+    await asyncio.to_thread(gemini_service.warm_up)
+
+
+async def _create_json_completion(system_prompt: str, prompt: str):
+    """Send one chat completion in JSON mode and return the parsed content.
+
+    Raises LLMUnavailableError when OpenAI cannot be reached (see llm_client).
+    """
+    response = await get_client().chat_completion(
+        model=OPENAI_MODEL,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ],
+        response_format={"type": "json_object"},
+        temperature=0.1
+    )
+    content = response.choices[0].message.content.strip()
+    return json.loads(content) if content else {}
+
+
+# OpenAI and Gemini behind one interface: every request goes to the
+# best-scoring provider and is hedged to the other when slow (see llm_router)
+router = llm_router.Router.from_env({
+    "openai": llm_router.Provider("openai", OPENAI_MODEL, _create_json_completion, configured=bool(OPENAI_API_KEY)),
+    "gemini": llm_router.Provider(
+        "gemini", gemini_service.GEMINI_MODEL, gemini_service.create_json_completion,
+        configured=gemini_service.is_configured()
+    ),
+})
+
+
+def _fit_text(text: str, purpose: str) -> str:
+    """Document text trimmed to the token budget of `purpose` (see prompt_budget), with the savings recorded."""
+    with tracing.span("prompt_budget", purpose=purpose) as span:
+        fitted, report = prompt_budget.fit(text, purpose)
+        if span is not None:
+            span.set(**report)
+    metrics.record_prompt_tokens(purpose, report["tokens_after"], report["tokens_saved"])
+    logger.info(
+        f"Prompt text for {purpose}: {report['tokens_after']} tokens "
+        f"({report['tokens_saved']} saved, budget {report['budget']}, {report['lines_dropped']} lines dropped)"
+    )
+    return fitted
+
+
+def model_signature() -> str:
+    """The configured providers and models, e.g. 'openai/gpt-4o+gemini/gemini-1.5-flash', for cache keys."""
+    return "+".join(f"{provider.name}/{provider.model}" for provider in router.providers) or "none"
+
+
+def llm_stats() -> dict:
+    return {"openai_client": client.stats() if client else None, "providers": router.stats()}
 
 
 async def classify_document(text: str) -> dict:
     """Classify KYC document type using OpenAI, returning {"document_type": str}."""
-    logging.info("Classifying KYC document type with OpenAI...")
+    logger.info("Classifying KYC document type with OpenAI...")
     _ensure_client_configured()
     
     prompt = (
         "Analyze the following OCR-extracted text from a KYC document. Identify what type of document this is based on the text content.\n\n"
-        "Document types:\n"
-        "- 'Passport': Contains passport number, issue date, expiry date, MRZ (machine readable zone), nationality, 'REPUBLIC OF', 'P<'\n"
-        "- 'Aadhar': Contains 12-digit Aadhar number, 'Government of India', 'My Aadhar My Identity'\n"
-        "- 'PAN': Contains 10-character alphanumeric PAN number, 'INCOME TAX DEPARTMENT'\n"
-        "- 'DrivingLicence': Contains DL number, 'Driving Licence', vehicle classes, licence validity dates\n"
-        "- 'UtilityBill': Contains account number, bill amount, service provider name, bill period\n"
-        "- 'GeneralDocument': If none of the above match\n\n"
+        + _CLASSIFICATION_GUIDE + "\n"
         "Respond ONLY with a JSON object containing a single 'document_type' key. Example: {\"document_type\": \"Passport\"}.\n\n"
-        "OCR Text:\n" + (text[:4000] if text else "")
+        "OCR Text:\n" + _fit_text(text, "classification")
     )
     
     try:
-        response = await client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[
-                {"role": "system", "content": "You are a KYC document classification expert. Analyze document characteristics to identify the type. Respond only with valid JSON with document_type field."},
-                {"role": "user", "content": prompt}
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.1
+        data = await router.complete_json(
+            "You are a KYC document classification expert. Analyze document characteristics to identify the type. Respond only with valid JSON with document_type field.",
+            prompt
         )
         
-        content = response.choices[0].message.content.strip()
-        data = json.loads(content) if content else {}
-        
         if isinstance(data, dict) and "document_type" in data:
             classified_type = data["document_type"]
-            logging.info(f"Document classified as: {classified_type}")
+            logger.info(f"Document classified as: {classified_type}")
             return {"document_type": classified_type}
         
-        logging.warning(f"Unexpected classification result: {data}")
+        logger.warning(f"Unexpected classification result: {data}")
         return {"document_type": str(data) or "GeneralDocument"}
+    except LLMUnavailableError:
+        # Surfaced as 503 so a transient outage is not mistaken for a GeneralDocument
+        raise
     except Exception as e:
-        logging.error(f"OpenAI classification error: {e}")
+        logger.error(f"OpenAI classification error: {e}")
         return {"document_type": "GeneralDocument"}
 
 
-async def analyze_document_by_type(text: str, doc_type: str) -> dict:
-    """Analyze KYC document and return structured JSON summary using OpenAI."""
-    logging.info(f"Analyzing KYC document with OpenAI. Type: {doc_type}")
+async def analyze_document_by_type(text: str, doc_type: str, fields: Optional[list] = None) -> dict:
+    """Analyze KYC document and return structured JSON summary using OpenAI.
+
+    When `fields` is given, only those `extracted_data` fields are requested
+    (the rest were already extracted locally).
+    """
+    logger.info(f"Analyzing KYC document with OpenAI. Type: {doc_type}, fields: {fields or 'all'}")
     _ensure_client_configured()
     
     # Get specialized prompt based on document type
-    prompt = _get_kyc_prompt(text, doc_type)
-    
-    # Log the extracted text for debugging
-    logging.info(f"Extracted text length: {len(text)} characters")
-    logging.info(f"First 500 characters of extracted text: {text[:500]}")
+    text = _fit_text(text, doc_type)
+    prompt = _get_kyc_prompt(text, doc_type, fields)
+
+    log_config.sampled_debug(logger, "Text sent for analysis", text=log_config.redact_text(text[:500]))
     
     try:
-        response = await client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[
-                {"role": "system", "content": "You are an expert KYC document analysis AI. Respond only with valid JSON. Extract all key details accurately."},
-                {"role": "user", "content": prompt}
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.1
+        data = await router.complete_json(
+            "You are an expert KYC document analysis AI. Respond only with valid JSON. Extract all key details accurately.",
+            prompt
         )
         
-        content = response.choices[0].message.content.strip()
-        data = json.loads(content) if content else {}
-        
         if isinstance(data, dict):
             return data
         return {"error": "Failed to analyze document"}
+    except LLMUnavailableError:
+        raise
     except Exception as e:
-        logging.error(f"OpenAI analysis error: {e}")
+        logger.error(f"OpenAI analysis error: {e}")
         return {"error": str(e)}
 
 
-def _get_kyc_prompt(text: str, doc_type: str) -> str:
-    """Generate KYC-specific prompts based on document type."""
-    
-    base_prompt = (
-        "You are an expert at extracting information from KYC documents. "
-        "Analyze the following OCR-extracted text carefully and extract all visible key details. "
-        "You MUST extract ONLY the fields specified in the JSON structure below. "
-        "DO NOT add fields from other document types. "
-        "Extract ALL specified fields - DO NOT skip any field. "
-        "For fields like Gender, if you see a single letter M or F, extract it. "
-        "If any required field is not found in the text, use \"Not provided\" as the value. "
-        "Return ONLY a valid JSON object with the following structure:\n"
-    )
-    
-    if doc_type == "PAN":
-        return base_prompt + """{
+async def classify_and_analyze(text: str) -> dict:
+    """Classify and analyze a KYC document with a single OpenAI request.
+
+    Returns the same structure as analyze_document_by_type; its "document_type"
+    key holds the classification.
+    """
+    logger.info("Classifying and analyzing KYC document with a single OpenAI request...")
+    _ensure_client_configured()
+
+    prompt = _get_combined_prompt(_fit_text(text, "combined"))
+
+    try:
+        data = await router.complete_json(
+            "You are an expert KYC document classification and analysis AI. Respond only with valid JSON. Extract all key details accurately.",
+            prompt
+        )
+
+        if not isinstance(data, dict):
+            return {"document_type": "GeneralDocument", "error": "Failed to analyze document"}
+        if data.get("document_type") not in KYC_DOCUMENT_TYPES:
+            logger.warning(f"Unexpected document type in combined result: {data.get('document_type')}")
+            data["document_type"] = "GeneralDocument"
+        logger.info(f"Document classified as: {data['document_type']}")
+        return data
+    except LLMUnavailableError:
+        raise
+    except Exception as e:
+        logger.error(f"OpenAI combined analysis error: {e}")
+        return {"document_type": "GeneralDocument", "error": str(e)}
+
+
+_KYC_BASE_PROMPT = (
+    "You are an expert at extracting information from KYC documents. "
+    "Analyze the following OCR-extracted text carefully and extract all visible key details. "
+    "You MUST extract ONLY the fields specified in the JSON structure below. "
+    "DO NOT add fields from other document types. "
+    "Extract ALL specified fields - DO NOT skip any field. "
+    "For fields like Gender, if you see a single letter M or F, extract it. "
+    "If any required field is not found in the text, use \"Not provided\" as the value. "
+    "Return ONLY a valid JSON object with the following structure:\n"
+)
+
+# JSON structure the model must return for each document type
+_KYC_SCHEMAS = {
+    "PAN": """{
   "language": "English",
   "document_type": "PAN",
   "summary": "Brief summary of the PAN card",
@@ -124,10 +239,8 @@ def _get_kyc_prompt(text: str, doc_type: str) -> str:
     "Date of Birth": "...",
     "Signature": "..."
   }
-}""" + "\n\nText:\n" + text
-    
-    elif doc_type == "Aadhar":
-        return base_prompt + """{
+}""",
+    "Aadhar": """{
   "language": "English",
   "document_type": "Aadhar",
   "summary": "Brief summary of the Aadhar card including holder name and key details",
@@ -138,13 +251,8 @@ def _get_kyc_prompt(text: str, doc_type: str) -> str:
     "Gender": "Male, Female, or Transgender",
     "Address": "Complete address if visible on front side"
   }
-}
-
-CRITICAL: This is an Aadhar card document. Extract ONLY Aadhar-specific fields. DO NOT extract passport, PAN, or any other document fields.
-Look carefully for the Aadhar number - it is typically 12 digits in groups of 4 (e.g., 2895 1522 1385). Search the entire text for numbers matching this pattern.""" + "\n\nExtracted Text from Document:\n" + text
-    
-    elif doc_type == "DrivingLicence":
-        return base_prompt + """{
+}""",
+    "DrivingLicence": """{
   "language": "English",
   "document_type": "DrivingLicence",
   "summary": "Brief summary of the driving licence",
@@ -157,10 +265,8 @@ Look carefully for the Aadhar number - it is typically 12 digits in groups of 4
     "Address": "...",
     "Vehicle Classes": "..."
   }
-}""" + "\n\nText:\n" + text
-    
-    elif doc_type == "Passport":
-        return base_prompt + """{
+}""",
+    "Passport": """{
   "language": "English",
   "document_type": "Passport",
   "summary": "Brief summary of the passport including holder name and key details",
@@ -175,9 +281,36 @@ Look carefully for the Aadhar number - it is typically 12 digits in groups of 4
     "Place of Issue": "City/country where passport was issued",
     "Nationality": "Nationality (e.g., Indian, INDIAN)"
   }
+}""",
+    "UtilityBill": """{
+  "language": "English",
+  "document_type": "UtilityBill",
+  "summary": "Brief summary of the utility bill",
+  "extracted_data": {
+    "Account Number": "...",
+    "Name": "...",
+    "Address": "...",
+    "Bill Date": "...",
+    "Bill Amount": "...",
+    "Service Type": "..."
+  }
+}""",
+    "GeneralDocument": """{
+  "language": "English",
+  "document_type": "GeneralDocument",
+  "summary": "Brief summary of the document",
+  "extracted_data": {
+    "Key1": "Value1",
+    "Key2": "Value2"
+  }
+}""",
 }
 
-CRITICAL: This is a Passport document. Extract ONLY passport-specific fields. DO NOT extract Aadhar or non-passport fields.
+# Extra instructions for document types the model tends to get wrong
+_KYC_INSTRUCTIONS = {
+    "Aadhar": """CRITICAL: This is an Aadhar card document. Extract ONLY Aadhar-specific fields. DO NOT extract passport, PAN, or any other document fields.
+Look carefully for the Aadhar number - it is typically 12 digits in groups of 4 (e.g., 2895 1522 1385). Search the entire text for numbers matching this pattern.""",
+    "Passport": """CRITICAL: This is a Passport document. Extract ONLY passport-specific fields. DO NOT extract Aadhar or non-passport fields.
 
 MANDATORY EXTRACTION: You MUST extract ALL fields listed above. Every single field is required. DO NOT skip Date of Birth or Gender. These fields are CRITICAL.
 Search the ENTIRE text carefully from beginning to end. Look for:
@@ -203,31 +336,59 @@ Gender - ABSOLUTELY REQUIRED: This field is MANDATORY. The Gender field is criti
 - If you find "M" anywhere in the text near date fields, extract it as "M" or "Male"
 - DO NOT return "Not provided" for Gender - this field MUST be extracted if present
 
-VALIDATION: After extraction, verify you have extracted Gender. If not, search the entire text again looking specifically for the letters M or F.""" + "\n\nExtracted Text from Document:\n" + text
-    
-    elif doc_type == "UtilityBill":
-        return base_prompt + """{
-  "language": "English",
-  "document_type": "UtilityBill",
-  "summary": "Brief summary of the utility bill",
-  "extracted_data": {
-    "Account Number": "...",
-    "Name": "...",
-    "Address": "...",
-    "Bill Date": "...",
-    "Bill Amount": "...",
-    "Service Type": "..."
-  }
-}""" + "\n\nText:\n" + text
-    
-    else:
-        # General document
-        return base_prompt + """{
-  "language": "English",
-  "document_type": "GeneralDocument",
-  "summary": "Brief summary of the document",
-  "extracted_data": {
-    "Key1": "Value1",
-    "Key2": "Value2"
-  }
-}""" + "\n\nText:\n" + text
+VALIDATION: After extraction, verify you have extracted Gender. If not, search the entire text again looking specifically for the letters M or F.""",
+}
+
+
+def schema_fields(doc_type: str) -> list:
+    """Return the `extracted_data` field names of a document type's schema, in order."""
+    schema = _KYC_SCHEMAS.get(doc_type, _KYC_SCHEMAS["GeneralDocument"])
+    return list(json.loads(schema)["extracted_data"].keys())
+
+
+def _reduced_schema(doc_type: str, fields: list) -> str:
+    schema = json.loads(_KYC_SCHEMAS[doc_type])
+    schema["extracted_data"] = {k: v for k, v in schema["extracted_data"].items() if k in fields}
+    return json.dumps(schema, indent=2, ensure_ascii=False)
+
+
+def _get_kyc_prompt(text: str, doc_type: str, fields: Optional[list] = None) -> str:
+    """Generate KYC-specific prompts based on document type."""
+    if fields and doc_type in _KYC_SCHEMAS and set(fields) != set(schema_fields(doc_type)):
+        # Reduced prompt: the other fields were already extracted and validated
+        # locally, so the long per-type instructions are not needed either.
+        return (
+            _KYC_BASE_PROMPT + _reduced_schema(doc_type, fields)
+            + f"\n\nThis is a {doc_type} document. Extract ONLY the fields listed above."
+            + "\n\nText:\n" + text
+        )
+
+    schema = _KYC_SCHEMAS.get(doc_type, _KYC_SCHEMAS["GeneralDocument"])
+    instructions = _KYC_INSTRUCTIONS.get(doc_type)
+    if instructions:
+        return _KYC_BASE_PROMPT + schema + "\n\n" + instructions + "\n\nExtracted Text from Document:\n" + text
+    return _KYC_BASE_PROMPT + schema + "\n\nText:\n" + text
+
+
+def _get_combined_prompt(text: str) -> str:
+    """Generate a single prompt that both classifies the document and extracts its fields."""
+    sections = []
+    for doc_type, schema in _KYC_SCHEMAS.items():
+        section = f"### If the document is '{doc_type}':\n{schema}"
+        if doc_type in _KYC_INSTRUCTIONS:
+            section += "\n" + _KYC_INSTRUCTIONS[doc_type]
+        sections.append(section)
+
+    return (
+        "You are an expert at extracting information from KYC documents. "
+        "First identify what type of document the OCR-extracted text below is, using these signals:\n\n"
+        + _CLASSIFICATION_GUIDE
+        + "\nThen extract the fields of the ONE schema that matches the identified type. "
+        "Set \"document_type\" to the identified type. "
+        "You MUST extract ONLY the fields of the chosen schema and DO NOT add fields from other document types. "
+        "For fields like Gender, if you see a single letter M or F, extract it. "
+        "If any required field is not found in the text, use \"Not provided\" as the value. "
+        "Return ONLY a valid JSON object for the chosen schema.\n\n"
+        + "\n\n".join(sections)
+        + "\n\nExtracted Text from Document:\n" + text
+    )
@@ -0,0 +1,207 @@
+import os
+import re
+import json
+import logging
+
+import local_classifier
+
+logger = logging.getLogger(__name__)
+
+# Optional: tiktoken for exact token counts; without it tokens are estimated
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+    logger.warning("tiktoken not installed. Prompt tokens are estimated.")
+
+PROMPT_TOKENIZER = os.getenv("PROMPT_TOKENIZER", "o200k_base")
+
+# Tokens of document text sent to the LLM, per document type ("classification"
+# is the classify-only request, "combined" the classify-and-extract one)
+TOKEN_BUDGETS = {
+    "default": 1500,
+    "classification": 800,
+    "combined": 2000,
+    "PAN": 600,
+    "Aadhar": 800,
+    "DrivingLicence": 1000,
+    "Passport": 1200,
+    "UtilityBill": 1500,
+    "GeneralDocument": 3000,
+}
+# JSON overrides, e.g. PROMPT_TOKEN_BUDGETS='{"UtilityBill": 2500}'
+_overrides = os.getenv("PROMPT_TOKEN_BUDGETS")
+if _overrides:
+    try:
+        TOKEN_BUDGETS.update(json.loads(_overrides))
+    except (ValueError, TypeError) as e:
+        logger.warning(f"Ignoring invalid PROMPT_TOKEN_BUDGETS: {e}")
+
+# Field labels worth keeping whatever the document type
+_LABELS = re.compile(
+    r"\b(name|father|mother|husband|d\.?o\.?b|date\s+of\s+birth|birth|sex|gender|male|female|address|"
+    r"account|consumer|customer|bill|amount|due|period|number|no\.|id|nationality|issue|expiry|"
+    r"valid|licen[cs]e|passport|pan|aadh?aa?r|vid|signature)\b",
+    re.IGNORECASE,
+)
+_MRZ = re.compile(r"^[A-Z0-9<]{30,}$")
+_DATE = re.compile(r"\b\d{1,2}[/\-.]\d{1,2}[/\-.]\d{2,4}\b")
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+_SPACES = re.compile(r"[ \t]{2,}")
+_GAP = "[...]"
+# A line over the budget is cut to the room left rather than dropped, unless
+# the room is too small to carry anything useful
+_MIN_CUT_TOKENS = 20
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding, TIKTOKEN_AVAILABLE
+    if _encoding is None and TIKTOKEN_AVAILABLE:
+        try:
+            _encoding = tiktoken.get_encoding(PROMPT_TOKENIZER)
+        except Exception as e:
+            # The encoding file is downloaded on first use
+            logger.warning(f"tiktoken encoding {PROMPT_TOKENIZER} unavailable ({e}). Prompt tokens are estimated.")
+            TIKTOKEN_AVAILABLE = False
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Tokens of `text` (tiktoken when available, else about one per word or symbol)."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # Long alphanumeric runs (IDs, MRZ lines) split into several tokens
+    return sum(1 + len(piece) // 6 for piece in _TOKEN_PIECES.findall(text))
+
+
+def budget_for(doc_type: str = None) -> int:
+    return int(TOKEN_BUDGETS.get(doc_type or "default", TOKEN_BUDGETS["default"]))
+
+
+def _is_noise(line: str) -> bool:
+    """OCR debris: lines with no letters or digits, or mostly symbols.
+
+    Single letters are kept (a lone "M" may be the Sex field), and so are
+    MRZ fillers ("<").
+    """
+    visible = line.replace(" ", "")
+    alnum = sum(char.isalnum() or char == "<" for char in visible)
+    return alnum == 0 or (len(visible) > 3 and alnum < 0.4 * len(visible))
+
+
+def clean(text: str) -> list:
+    """Text lines with runs of spaces collapsed (table padding), noise and repeated lines dropped."""
+    lines, seen = [], set()
+    for raw in (text or "").splitlines():
+        line = _SPACES.sub(" ", raw.strip())
+        if not line or _is_noise(line) or line in seen:
+            continue
+        seen.add(line)
+        lines.append(line)
+    return lines
+
+
+def _line_scores(lines: list, doc_type: str = None) -> list:
+    """Relevance of every line: MRZ, type signals and labels first, the lines after labels next."""
+    # Purposes that are not a document type (classification) use every type's signals
+    type_patterns = local_classifier.signal_patterns(doc_type) or local_classifier.signal_patterns()
+    scores = []
+    for index, line in enumerate(lines):
+        if _MRZ.match(line.replace(" ", "")):
+            score = 10
+        elif any(pattern.search(line) for pattern in type_patterns):
+            score = 6
+        elif _LABELS.search(line):
+            score = 5
+        elif _DATE.search(line):
+            score = 4
+        else:
+            score = 1
+        # Headers (issuer, document title) come first
+        if index < 5:
+            score = max(score, 3)
+        scores.append(score)
+    # A label's value is often on the next line
+    for index in range(1, len(lines)):
+        if scores[index - 1] >= 5:
+            scores[index] = max(scores[index], 3)
+    return scores
+
+
+def _truncate(line: str, max_tokens: int) -> str:
+    """Longest prefix of `line` within `max_tokens`, ending at a word boundary where possible."""
+    low, high = 0, len(line)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(line[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    prefix = line[:low]
+    space = prefix.rfind(" ")
+    if low < len(line) and space > 0:
+        prefix = prefix[:space]
+    return prefix.rstrip()
+
+
+def fit(text: str, purpose: str = None) -> tuple:
+    """Fit document text into the token budget of `purpose` (a document type or "classification").
+
+    Returns (text, report). The text is cleaned first; if it is still over
+    budget, the most relevant lines are kept in their original order and
+    gaps are marked with "[...]". A line too long for the room left is cut
+    to fit it. The report has tokens before/after, tokens_saved, budget,
+    noise_lines_dropped (cleaning), lines_dropped and lines_cut (over budget).
+    """
+    budget = budget_for(purpose)
+    before = count_tokens(text)
+    raw_lines = len((text or "").splitlines())
+    lines = clean(text)
+    fitted = "\n".join(lines)
+    after = count_tokens(fitted)
+    dropped = cuts = 0
+
+    if after > budget:
+        line_tokens = [count_tokens(line) + 1 for line in lines]
+        scores = _line_scores(lines, purpose)
+        keep, used = {}, 0
+        # Highest relevance first, earlier lines first within the same score
+        for index in sorted(range(len(lines)), key=lambda i: (-scores[i], i)):
+            room = budget - used
+            if line_tokens[index] <= room:
+                keep[index] = lines[index]
+                used += line_tokens[index]
+            elif room >= _MIN_CUT_TOKENS:
+                # One long line (a PDF text layer, a DOCX paragraph) would otherwise leave nothing
+                cut = _truncate(lines[index], room - count_tokens(_GAP) - 2)
+                if cut:
+                    keep[index] = f"{cut} {_GAP}"
+                    used += count_tokens(keep[index]) + 1
+                    cuts += 1
+        parts = []
+        for index in range(len(lines)):
+            if index in keep:
+                parts.append(keep[index])
+            elif not parts or parts[-1] != _GAP:
+                parts.append(_GAP)
+        dropped = len(lines) - len(keep)
+        fitted = "\n".join(parts)
+        after = count_tokens(fitted)
+
+    report = {
+        "budget": budget,
+        "tokens_before": before,
+        "tokens_after": after,
+        "tokens_saved": max(0, before - after),
+        "noise_lines_dropped": raw_lines - len(lines),
+        "lines_dropped": dropped,
+        "lines_cut": cuts,
+        "counter": "tiktoken" if _get_encoding() is not None else "estimate",
+    }
+    return fitted, report
@@ -0,0 +1,254 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Backend: "memory" (per-process LRU), "sqlite" (shared on-disk store with a
+# small in-process LRU in front of it) or "none" to disable caching entirely.
+RESULT_CACHE_BACKEND = os.getenv("RESULT_CACHE_BACKEND", "memory").lower()
+RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", "86400"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1024"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "result_cache.sqlite3")
+RESULT_CACHE_DISK_MAX_BYTES = int(os.getenv("RESULT_CACHE_DISK_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Cache tiers: extracted text only depends on the file, the analysis also
+# depends on the model and prompts used to produce it.
+TIER_TEXT = "text"
+TIER_ANALYSIS = "analysis"
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_key(tier: str, file_hash: str, *parts) -> str:
+    """Build a cache key like 'analysis:gpt-4o:kyc-v1:<sha256>'."""
+    return ":".join([tier, *[str(p) for p in parts], file_hash])
+
+
+class MemoryBackend:
+    """In-process LRU with TTL, bounded by entry count and total value size."""
+
+    # Calls only take a lock around a dict lookup, so they run on the event loop
+    blocking = False
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, value, size in bytes)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[tuple]:
+        """(value, expires_at) of a live entry, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value, _ = entry
+            if expires_at < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value, expires_at
+
+    def set(self, key: str, value: str, ttl_seconds: float = None) -> None:
+        size = len(value.encode())
+        if size > self.max_bytes:
+            return
+        expires_at = time.time() + (ttl_seconds or self.ttl_seconds)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, value, size)
+            self._size += size
+            while self._entries and (len(self._entries) > self.max_entries or self._size > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        _, _, size = self._entries.pop(key)
+        self._size -= size
+
+
+class SQLiteBackend:
+    """On-disk cache shared by every worker process on the host."""
+
+    # Queries can wait up to the 10 s busy timeout, so they run in a thread
+    blocking = True
+
+    def __init__(self, path: str, max_bytes: int, ttl_seconds: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)")
+        self._writes = 0
+
+    def get(self, key: str) -> Optional[tuple]:
+        """(value, expires_at) of a live entry, or None."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at < now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            return value, expires_at
+
+    def set(self, key: str, value: str, ttl_seconds: float = None) -> None:
+        now = time.time()
+        expires_at = now + (ttl_seconds or self.ttl_seconds)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode()), expires_at, now),
+            )
+            self._writes += 1
+            if self._writes % 50 == 0:
+                self._evict(now)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM cache WHERE expires_at < ?", (now,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used rows until we are back under the size budget
+        excess = total - self.max_bytes
+        rows = self._conn.execute("SELECT key, size FROM cache ORDER BY accessed_at").fetchall()
+        doomed = []
+        for key, size in rows:
+            if excess <= 0:
+                break
+            doomed.append((key,))
+            excess -= size
+        self._conn.executemany("DELETE FROM cache WHERE key = ?", doomed)
+        logger.info(f"Result cache evicted {len(doomed)} entries to stay under {self.max_bytes} bytes")
+
+
+class ResultCache:
+    """Tiered JSON cache with hit/miss counters per tier."""
+
+    def __init__(self, backends: list):
+        self.backends = backends
+        self.enabled = bool(backends)
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _count(self, tier: str, outcome: str) -> None:
+        with self._lock:
+            tier_stats = self._stats.setdefault(tier, {"hits": 0, "misses": 0, "writes": 0, "errors": 0})
+            tier_stats[outcome] += 1
+        metrics.record_cache(tier, outcome)
+
+    @staticmethod
+    async def _run(backend, method: str, *args):
+        call = getattr(backend, method)
+        if backend.blocking:
+            return await asyncio.to_thread(call, *args)
+        return call(*args)
+
+    async def get(self, tier: str, key: str):
+        if not self.enabled:
+            return None
+        for index, backend in enumerate(self.backends):
+            try:
+                entry = await self._run(backend, "get", key)
+            except Exception as e:
+                logger.warning(f"Result cache read failed ({type(backend).__name__}): {e}")
+                self._count(tier, "errors")
+                continue
+            if entry is not None:
+                raw, expires_at = entry
+                # Promote entries found in a slower backend to the faster ones,
+                # expiring when they do on disk
+                remaining = expires_at - time.time()
+                if remaining > 0:
+                    for faster in self.backends[:index]:
+                        await self._run(faster, "set", key, raw, remaining)
+                self._count(tier, "hits")
+                return json.loads(raw)
+        self._count(tier, "misses")
+        return None
+
+    async def set(self, tier: str, key: str, value) -> None:
+        if not self.enabled:
+            return
+        raw = json.dumps(value, ensure_ascii=False)
+        for backend in self.backends:
+            try:
+                await self._run(backend, "set", key, raw)
+            except Exception as e:
+                logger.warning(f"Result cache write failed ({type(backend).__name__}): {e}")
+                self._count(tier, "errors")
+                return
+        self._count(tier, "writes")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": RESULT_CACHE_BACKEND,
+                "tiers": {tier: dict(values) for tier, values in self._stats.items()},
+            }
+
+
+def _build_cache() -> ResultCache:
+    if RESULT_CACHE_BACKEND == "none":
+        return ResultCache([])
+    backends = [MemoryBackend(RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL_SECONDS)]
+    if RESULT_CACHE_BACKEND == "sqlite":
+        try:
+            backends.append(SQLiteBackend(RESULT_CACHE_PATH, RESULT_CACHE_DISK_MAX_BYTES, RESULT_CACHE_TTL_SECONDS))
+            logger.info(f"Result cache using SQLite at: {RESULT_CACHE_PATH}")
+        except sqlite3.Error as e:
+            logger.warning(f"Could not open SQLite result cache ({e}). Using in-memory cache only.")
+    return ResultCache(backends)
+
+
+cache = _build_cache()
+
+
+async def get(tier: str, key: str):
+    return await cache.get(tier, key)
+
+
+async def put(tier: str, key: str, value) -> None:
+    await cache.set(tier, key, value)
+
+
+def stats() -> dict:
+    return cache.stats()
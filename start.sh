@@ -1,7 +1,14 @@
 #!/bin/bash
 PORT=${PORT:-8000}
 
+# Metrics of all gunicorn workers are collected here and aggregated by GET /metrics;
+# the directory is emptied on start so samples of old processes do not linger
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/kyc-metrics}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
 gunicorn main:app \
+    --config gunicorn.conf.py \
     --workers 3 \
     --worker-class uvicorn.workers.UvicornWorker \
     --bind 0.0.0.0:$PORT \
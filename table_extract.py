@@ -0,0 +1,226 @@
+import io
+import os
+import re
+import csv
+import time
+import random
+import logging
+from datetime import date, datetime
+
+logger = logging.getLogger(__name__)
+
+# Spreadsheets are read row by row and rendered compactly: the header, the
+# first rows, a sample of the rest and a summary per column. Memory depends
+# on these limits only, not on the size of the file.
+TABLE_MAX_COLUMNS = int(os.getenv("TABLE_MAX_COLUMNS", "30"))
+TABLE_HEAD_ROWS = int(os.getenv("TABLE_HEAD_ROWS", "10"))
+# Rows after the first TABLE_HEAD_ROWS picked uniformly from the rest of the sheet
+TABLE_SAMPLE_ROWS = int(os.getenv("TABLE_SAMPLE_ROWS", "20"))
+# Rows read per sheet; the rest of a larger sheet is neither sampled nor summarized
+TABLE_MAX_SCAN_ROWS = int(os.getenv("TABLE_MAX_SCAN_ROWS", "200000"))
+TABLE_MAX_SHEETS = int(os.getenv("TABLE_MAX_SHEETS", "10"))
+TABLE_MAX_CELL_CHARS = int(os.getenv("TABLE_MAX_CELL_CHARS", "80"))
+
+# Distinct values tracked per column for the distinct count and top values
+_DISTINCT_LIMIT = 1000
+_TOP_VALUES = 3
+_CSV_DELIMITERS = ",;\t|"
+_NUMBER = re.compile(r"^[-+]?(\d[\d,]*)?(\.\d+)?$")
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2})?)?$")
+
+
+def _cell_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        text = " ".join(value.split())
+    elif isinstance(value, datetime):
+        text = value.date().isoformat() if value.time() == datetime.min.time() else value.isoformat(sep=" ")
+    elif isinstance(value, date):
+        text = value.isoformat()
+    elif isinstance(value, float) and value.is_integer():
+        text = str(int(value))
+    else:
+        text = " ".join(str(value).split())
+    if len(text) > TABLE_MAX_CELL_CHARS:
+        text = text[:TABLE_MAX_CELL_CHARS - 3] + "..."
+    return text
+
+
+def _number(value, text: str):
+    """float of a numeric cell ("1,234.50" included), else None."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str) and _NUMBER.match(text) and text not in ("-", "+", "."):
+        return float(text.replace(",", ""))
+    return None
+
+
+class _ColumnStats:
+    """Running summary of one column, in constant memory."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.values = 0
+        self.numbers = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.dates = []  # [earliest, latest]
+        self.counts = {}  # up to _DISTINCT_LIMIT distinct values
+        self.distinct_capped = False
+
+    def add(self, value, text: str) -> None:
+        if not text:
+            return
+        self.values += 1
+        number = _number(value, text)
+        if number is not None:
+            self.numbers += 1
+            self.total += number
+            if self.minimum is None or number < self.minimum:
+                self.minimum = number
+            if self.maximum is None or number > self.maximum:
+                self.maximum = number
+        elif isinstance(value, (date, datetime)) or _ISO_DATE.match(text):
+            # ISO dates sort as text
+            if not self.dates:
+                self.dates = [text, text]
+            elif text < self.dates[0]:
+                self.dates[0] = text
+            elif text > self.dates[1]:
+                self.dates[1] = text
+        if text in self.counts:
+            self.counts[text] += 1
+        elif len(self.counts) < _DISTINCT_LIMIT:
+            self.counts[text] = 1
+        else:
+            self.distinct_capped = True
+
+    def summary(self) -> str:
+        if not self.values:
+            return f"- {self.name}: empty"
+        distinct = f"more than {_DISTINCT_LIMIT}" if self.distinct_capped else str(len(self.counts))
+        parts = [f"{self.values} values", f"{distinct} distinct"]
+        if self.numbers and self.numbers >= self.values / 2:
+            parts.insert(0, "numeric")
+            parts.append(
+                f"min {_cell_text(self.minimum)}, max {_cell_text(self.maximum)}, "
+                f"mean {round(self.total / self.numbers, 2)}"
+            )
+        elif self.dates:
+            parts.insert(0, "date")
+            parts.append(f"from {self.dates[0]} to {self.dates[1]}")
+        else:
+            parts.insert(0, "text")
+            top = sorted(self.counts.items(), key=lambda item: -item[1])[:_TOP_VALUES]
+            if top and top[0][1] > 1:
+                parts.append("top: " + ", ".join(f"{value} ({count})" for value, count in top))
+        return f"- {self.name}: " + ", ".join(parts)
+
+
+def summarize_rows(rows, title: str = None, deadline: float = None) -> str:
+    """Compact text of a table given as an iterator of row tuples (the first non-empty row is the header).
+
+    Rows are consumed one at a time; only the head rows, the sample and the
+    column summaries are kept.
+    """
+    header = None
+    columns = []
+    extra_columns = 0
+    head, sample = [], []
+    rows_seen = 0
+    truncated = False
+    sampler = random.Random(0)  # same sample for the same file
+
+    for row in rows:
+        if all(value is None or value == "" for value in row):
+            continue
+        if header is None:
+            names = [_cell_text(value) for value in row]
+            # Read-only worksheets pad rows to the widest row of the sheet
+            while names and not names[-1]:
+                names.pop()
+            extra_columns = max(0, len(names) - TABLE_MAX_COLUMNS)
+            header = [name or f"Column {index + 1}" for index, name in enumerate(names[:TABLE_MAX_COLUMNS])]
+            columns = [_ColumnStats(name) for name in header]
+            continue
+        if rows_seen >= TABLE_MAX_SCAN_ROWS or (deadline is not None and time.time() > deadline):
+            truncated = True
+            break
+        rows_seen += 1
+        values = row[:len(header)]
+        cells = [_cell_text(value) for value in values]
+        for stats, value, text in zip(columns, values, cells):
+            stats.add(value, text)
+        if len(head) < TABLE_HEAD_ROWS:
+            head.append((rows_seen, cells))
+        elif len(sample) < TABLE_SAMPLE_ROWS:
+            sample.append((rows_seen, cells))
+        else:
+            # Reservoir sampling over the rows after the head
+            slot = sampler.randrange(rows_seen - TABLE_HEAD_ROWS)
+            if slot < TABLE_SAMPLE_ROWS:
+                sample[slot] = (rows_seen, cells)
+
+    if header is None:
+        return f"{title}: empty" if title else ""
+
+    shown = head + sorted(sample)
+    described = f"{rows_seen}{'+' if truncated else ''} rows x {len(header)} columns"
+    if extra_columns:
+        described += f" ({extra_columns} more columns not shown)"
+    lines = [f"{title} ({described})" if title else f"Table ({described})"]
+    lines.append("Columns: " + " | ".join(header))
+    if len(shown) < rows_seen:
+        lines.append(f"Rows (first {len(head)} and {len(sample)} sampled):")
+    for number, cells in shown:
+        lines.append(f"{number}: " + " | ".join(cells))
+    if len(shown) < rows_seen:
+        # Only needed when some rows are not shown
+        lines.append("Column summary:")
+        lines.extend(stats.summary() for stats in columns)
+    return "\n".join(lines)
+
+
+def _csv_rows(file_bytes: bytes):
+    """Rows of a CSV file; the delimiter is sniffed from the first lines."""
+    text = io.TextIOWrapper(io.BytesIO(file_bytes), encoding="utf-8-sig", errors="replace", newline="")
+    head = text.read(8192)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(head, delimiters=_CSV_DELIMITERS)
+    except csv.Error:
+        dialect = csv.excel
+    return csv.reader(text, dialect)
+
+
+def extract_csv(file_bytes: bytes, deadline: float = None) -> str:
+    return summarize_rows(_csv_rows(file_bytes), deadline=deadline)
+
+
+def extract_xlsx(file_bytes: bytes, deadline: float = None) -> str:
+    """Every worksheet (up to TABLE_MAX_SHEETS), read in openpyxl's read-only row-iterator mode."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(io.BytesIO(file_bytes), read_only=True, data_only=True)
+    try:
+        sheets = workbook.worksheets
+        sections = []
+        non_empty = 0
+        for sheet in sheets[:TABLE_MAX_SHEETS]:
+            if deadline is not None and time.time() > deadline:
+                sections.append(f"Sheet {sheet.title}: skipped (extraction deadline)")
+                continue
+            section = summarize_rows(sheet.iter_rows(values_only=True), title=f"Sheet {sheet.title}", deadline=deadline)
+            if not section.endswith(": empty"):
+                non_empty += 1
+            sections.append(section)
+        if len(sheets) > TABLE_MAX_SHEETS:
+            sections.append(f"{len(sheets) - TABLE_MAX_SHEETS} more sheets not shown")
+        # A workbook whose sheets are all empty has no text
+        return "\n\n".join(sections) if non_empty else ""
+    finally:
+        workbook.close()
@@ -0,0 +1,91 @@
+"""
+Streaming DOCX extraction tests on small hand-built packages (no server, no Tesseract).
+
+Run with `python -m pytest test_docx_extract.py` or `python test_docx_extract.py`.
+"""
+import io
+import zipfile
+
+import docx_extract
+
+W = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+NAMESPACES = (
+    f'{W} xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships" '
+    'xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006" '
+    'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main"'
+)
+REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+
+def p(text: str) -> str:
+    return f"<w:p><w:pPr><w:tabs><w:tab w:val='left' w:pos='720'/></w:tabs></w:pPr><w:r><w:t>{text}</w:t></w:r></w:p>"
+
+
+def make_docx(body: str, header: str = None, footer: str = None, media: bytes = None) -> bytes:
+    rels = []
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("_rels/.rels", (
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f'<Relationship Id="rId1" Type="{REL}/officeDocument" Target="word/document.xml"/></Relationships>'
+        ))
+        for rid, kind, root, content in (("rId2", "header", "hdr", header), ("rId3", "footer", "ftr", footer)):
+            if content is not None:
+                archive.writestr(f"word/{kind}1.xml", f"<w:{root} {NAMESPACES}>{content}</w:{root}>")
+                rels.append(f'<Relationship Id="{rid}" Type="{REL}/{kind}" Target="{kind}1.xml"/>')
+        if media is not None:
+            archive.writestr("word/media/image1.png", media)
+            rels.append(f'<Relationship Id="rId4" Type="{REL}/image" Target="media/image1.png"/>')
+        archive.writestr("word/_rels/document.xml.rels", (
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + "".join(rels) + "</Relationships>"
+        ))
+        archive.writestr("word/document.xml", f"<w:document {NAMESPACES}><w:body>{body}</w:body></w:document>")
+    return buffer.getvalue()
+
+
+def test_headers_body_tables_and_footers_in_order():
+    table = (
+        "<w:tbl><w:tr><w:tc>" + p("Name") + "</w:tc><w:tc>" + p("Account No") + "</w:tc></w:tr>"
+        "<w:tr><w:tc>" + p("John") + p("Doe") + "</w:tc><w:tc>" + p("ACC-123") + "</w:tc></w:tr></w:tbl>"
+    )
+    text = docx_extract.extract(make_docx(
+        p("Customer Form") + table + p("Signed"), header=p("Acme Bank"), footer=p("Page 1")
+    ))["text"]
+    assert text.splitlines() == [
+        "Acme Bank", "Customer Form", "Name | Account No", "John Doe | ACC-123", "Signed", "Page 1"
+    ]
+
+
+def test_text_box_is_read_once_and_runs_keep_tabs_and_breaks():
+    text_box = "<w:txbxContent>" + p("PAN: ABCDE1234F") + "</w:txbxContent>"
+    body = (
+        "<w:p><w:r><mc:AlternateContent><mc:Choice>" + text_box + "</mc:Choice>"
+        "<mc:Fallback>" + text_box + "</mc:Fallback></mc:AlternateContent></w:r></w:p>"
+        "<w:p><w:r><w:t>Name</w:t><w:tab/><w:t>Jane</w:t><w:br/><w:t>DOB</w:t></w:r></w:p>"
+    )
+    assert docx_extract.extract(make_docx(body))["text"] == "PAN: ABCDE1234F\nName\tJane\nDOB"
+
+
+def test_images_are_ocrd_only_when_text_is_short():
+    image = "<w:p><w:r><w:drawing><a:blip r:embed='rId4'/></w:drawing></w:r></w:p>"
+    calls = []
+
+    def ocr(image_bytes):
+        calls.append(image_bytes)
+        return "Scanned text"
+
+    result = docx_extract.extract(make_docx(p("Annexure") + image, media=b"png"), ocr=ocr)
+    assert result["text"] == "Annexure\nScanned text"
+    assert result["images_ocrd"] == 1 and calls == [b"png"]
+
+    long_text = p("Text " * docx_extract.DOCX_OCR_MIN_CHARS)
+    result = docx_extract.extract(make_docx(long_text + image, media=b"png"), ocr=ocr)
+    assert result["images_ocrd"] == 0 and len(calls) == 1
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"ok  {name}")
@@ -0,0 +1,166 @@
+"""
+Local field extraction and classification tests (no server, no API keys).
+
+Run with `python -m pytest test_field_extractors.py` or `python test_field_extractors.py`.
+"""
+import datetime
+
+import field_extractors
+import local_classifier
+
+# ICAO Doc 9303 TD3 specimen
+SPECIMEN_MRZ = (
+    "P<UTOERIKSSON<<ANNA<MARIA<<<<<<<<<<<<<<<<<<<",
+    "L898902C36UTO7408122F1204159ZE184226B<<<<<10",
+)
+
+
+def mrz(second_line: str = SPECIMEN_MRZ[1]) -> str:
+    return f"PASSPORT\n{SPECIMEN_MRZ[0]}\n{second_line}"
+
+
+def test_icao_specimen_mrz():
+    parsed = field_extractors.parse_mrz_td3(mrz())
+    assert parsed == {
+        "issuing_country": "UTO",
+        "surname": "ERIKSSON",
+        "given_names": "ANNA MARIA",
+        "passport_number": "L898902C3",
+        "nationality": "UTO",
+        "date_of_birth": datetime.date(1974, 8, 12),
+        "sex": "F",
+        "expiry_date": datetime.date(2012, 4, 15),
+        "composite_valid": True,
+    }
+
+
+def test_mrz_check_digits():
+    cases = [
+        ("L898902C3", "6"),
+        ("740812", "2"),
+        ("120415", "9"),
+        ("ZE184226B<<<<<", "1"),
+        ("<<<<<<<<<", "0"),
+    ]
+    for field, expected in cases:
+        assert field_extractors.mrz_check_digit(field) == expected, field
+
+
+def test_mrz_with_a_bad_check_digit_is_rejected():
+    second = SPECIMEN_MRZ[1]
+    bad_lines = [
+        second[:9] + "5" + second[10:],    # passport number
+        second[:19] + "3" + second[20:],   # birth date
+        second[:27] + "8" + second[28:],   # expiry date
+        second[:13] + "750812" + second[19:],  # birth date changed, check digit kept
+    ]
+    for line in bad_lines:
+        assert field_extractors.parse_mrz_td3(mrz(line)) is None, line
+    # Only the composite digit wrong: the fields stand, flagged as not composite-valid
+    parsed = field_extractors.parse_mrz_td3(mrz(second[:43] + "1"))
+    assert parsed is not None and parsed["composite_valid"] is False
+
+
+def test_mrz_ocr_confusions_in_digit_positions_are_fixed():
+    second = SPECIMEN_MRZ[1]
+    cases = [
+        second[:13] + "74O8I2" + second[19:],  # O/0 and I/1 in the birth date
+        second[:9] + "6" + second[10:19] + "Z" + second[20:],  # Z/2 in a check digit
+        second[:21] + "I2O4I5" + second[27:],  # expiry date
+    ]
+    for line in cases:
+        parsed = field_extractors.parse_mrz_td3(mrz(line))
+        assert parsed is not None, line
+        assert parsed["date_of_birth"] == datetime.date(1974, 8, 12)
+        assert parsed["expiry_date"] == datetime.date(2012, 4, 15)
+
+
+def test_verhoeff():
+    cases = [
+        ("234567890124", True),
+        ("498765432102", True),
+        ("913456789018", True),
+        ("234567890123", False),
+        ("234567890142", False),  # two digits swapped
+        ("243567890124", False),
+    ]
+    for number, expected in cases:
+        assert field_extractors.verhoeff_valid(number) is expected, number
+
+
+def test_aadhaar_number_and_vid_lines():
+    cases = [
+        ("Aadhaar No: 2345 6789 0124", "2345 6789 0124"),
+        ("234567890124", "2345 6789 0124"),
+        ("2345 6789 0123", None),  # bad checksum
+        ("1234 5678 9012", None),  # Aadhaar numbers never start with 0 or 1
+        # The first 12 digits of a VID may be Verhoeff-valid by chance
+        ("VID : 2345 6789 0124 5678", None),
+        ("VID : 2345 6789 0124 5678\n4987 6543 2102", "4987 6543 2102"),
+        ("Mobile 98765 43210 2\n9134 5678 9018", "9134 5678 9018"),
+    ]
+    for text, expected in cases:
+        assert field_extractors.find_aadhaar_number(text) == expected, text
+
+
+def test_pan_numbers():
+    cases = [
+        ("Permanent Account Number\nABCPE1234F", "ABCPE1234F"),
+        ("PAN: AAACB1234C", "AAACB1234C"),
+        ("ABCXE1234F", None),  # X is not a holder type
+        ("ABCPE12345F", None),
+        ("abcpe1234f", None),
+    ]
+    for text, expected in cases:
+        assert field_extractors.find_pan_number(text) == expected, text
+
+
+def test_driving_licence_numbers():
+    cases = [
+        ("DL No: MH12 20110012345", "MH12 20110012345"),
+        ("MH-12-2011 0012345", "MH12 20110012345"),
+        ("DL-0420110149646", "DL04 20110149646"),
+        ("KA01 18990012345", None),  # issue year before 1900
+        ("MH12 2011001234", None),  # serial one digit short
+    ]
+    for text, expected in cases:
+        assert field_extractors.find_dl_number(text) == expected, text
+
+
+def test_labelled_fields_only():
+    pan = "INCOME TAX DEPARTMENT\nName\nRAHUL SHARMA\nABCPE1234F\n01/02/1990"
+    assert field_extractors.extract_fields(pan, "PAN") == {"PAN Number": "ABCPE1234F", "Name": "RAHUL SHARMA"}
+    assert field_extractors.extract_fields(pan + "\nDate of Birth: 01/02/1990", "PAN")["Date of Birth"] == "01/02/1990"
+    assert field_extractors.extract_fields("Name: X", "UtilityBill") == {}
+
+
+def test_classifier_decides_clear_documents():
+    cases = [
+        (mrz(), "Passport"),
+        ("INCOME TAX DEPARTMENT\nPermanent Account Number\nABCPE1234F", "PAN"),
+        ("Unique Identification Authority of India\nAadhaar\n2345 6789 0124", "Aadhar"),
+    ]
+    for text, expected in cases:
+        result = local_classifier.classify(text)
+        assert result["document_type"] == expected, text
+        assert local_classifier.is_confident(result), result
+
+
+def test_classifier_abstains_on_ambiguous_text():
+    cases = [
+        "",
+        "Invoice 42\nThank you for your business",
+        # Two document types' signals: left to the LLM
+        "INCOME TAX DEPARTMENT\nIndian Union Driving Licence",
+        "Government of India\nPASSPORT",
+        "Electricity Bill\nAmount Payable 1200",
+    ]
+    for text in cases:
+        assert not local_classifier.is_confident(local_classifier.classify(text)), text
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"ok  {name}")
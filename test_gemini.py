@@ -1,5 +1,9 @@
 import os
 import asyncio
+from dotenv import load_dotenv
+
+load_dotenv()
+
 import gemini_service
 
 async def test_gemini():
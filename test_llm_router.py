@@ -0,0 +1,167 @@
+"""
+LLM router tests against local stub providers (no network, no API keys).
+
+Run with `python -m pytest test_llm_router.py` or `python test_llm_router.py`.
+"""
+import asyncio
+
+import llm_router
+from llm_client import LLMUnavailableError
+
+llm_router.LLM_HEDGE = True
+llm_router.LLM_HEDGE_DELAY_SECONDS = 0.05
+llm_router.LLM_HEDGE_MIN_DELAY_SECONDS = 0.01
+llm_router.LLM_TIMEOUT_SECONDS = 0.3
+
+
+def stub(name: str, delay: float = 0.0, answer=None, error: Exception = None):
+    """Provider that answers `answer` (default {"provider": name}) after `delay` seconds."""
+    calls = []
+
+    async def complete(system_prompt, prompt):
+        calls.append(prompt)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            calls.append("cancelled")
+            raise
+        if error is not None:
+            raise error
+        return {"provider": name} if answer is None else answer
+
+    provider = llm_router.Provider(name, f"{name}-model", complete)
+    provider.calls = calls
+    return provider
+
+
+def complete(router: llm_router.Router) -> dict:
+    return asyncio.run(router.complete_json("system", "prompt"))
+
+
+def test_fast_primary_is_not_hedged():
+    primary, secondary = stub("primary", 0.01), stub("secondary")
+    assert complete(llm_router.Router([primary, secondary])) == {"provider": "primary"}
+    assert secondary.calls == []
+    assert primary.counts["wins"] == 1
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    primary, secondary = stub("primary", 0.25), stub("secondary", 0.01)
+    assert complete(llm_router.Router([primary, secondary])) == {"provider": "secondary"}
+    assert secondary.counts["hedges"] == 1
+    assert primary.calls[-1] == "cancelled"
+    # Losing a race is not a failure
+    assert primary.error_rate == 0.0
+
+
+def test_failover_after_error_without_waiting_for_hedge_delay():
+    primary = stub("primary", error=LLMUnavailableError("500"))
+    secondary = stub("secondary")
+    llm_router.LLM_HEDGE_DELAY_SECONDS = 10
+    try:
+        assert complete(llm_router.Router([primary, secondary])) == {"provider": "secondary"}
+    finally:
+        llm_router.LLM_HEDGE_DELAY_SECONDS = 0.05
+    assert secondary.counts["hedges"] == 0
+    assert primary.counts["failures"] == 1
+
+
+def test_invalid_json_answer_falls_through():
+    primary, secondary = stub("primary", answer=["not", "an", "object"]), stub("secondary")
+    assert complete(llm_router.Router([primary, secondary])) == {"provider": "secondary"}
+
+
+def test_all_timeouts_raise_unavailable():
+    router = llm_router.Router([stub("primary", 1), stub("secondary", 1)])
+    try:
+        complete(router)
+    except LLMUnavailableError as e:
+        assert e.retry_after >= 1
+    else:
+        raise AssertionError("expected LLMUnavailableError")
+
+
+def test_other_errors_are_raised_unchanged():
+    router = llm_router.Router([stub("primary", error=ValueError("bad request"))])
+    try:
+        complete(router)
+    except ValueError as e:
+        assert str(e) == "bad request"
+    else:
+        raise AssertionError("expected ValueError")
+
+
+def test_bad_requests_do_not_open_the_circuit():
+    provider = stub("primary", error=ValueError("bad request"))
+    limited = stub("limited", error=LLMUnavailableError("LLM rate limit reached", upstream=False))
+    for _ in range(provider.breaker.failures + 1):
+        for stubbed in (provider, limited):
+            try:
+                complete(llm_router.Router([stubbed]))
+            except (ValueError, LLMUnavailableError):
+                pass
+    for stubbed in (provider, limited):
+        assert stubbed.breaker.state == "closed"
+        assert stubbed.counts["failures"] == 0 and stubbed.error_rate == 0.0
+
+
+def test_bad_request_on_half_open_trial_frees_the_slot():
+    provider = stub("primary", error=ValueError("bad request"))
+    for _ in range(provider.breaker.failures):
+        provider.breaker.record_failure()
+    provider.breaker.opened_at -= provider.breaker.reset_seconds
+    try:
+        complete(llm_router.Router([provider]))
+    except ValueError:
+        pass
+    assert provider.breaker.state == "half_open" and not provider.breaker.trial_running
+
+
+def test_open_circuit_is_skipped():
+    primary, secondary = stub("primary"), stub("secondary")
+    for _ in range(primary.breaker.failures):
+        primary.breaker.record_failure()
+    router = llm_router.Router([primary, secondary])
+    assert [provider.name for provider in router.ranked()] == ["secondary"]
+    assert complete(router) == {"provider": "secondary"}
+    assert primary.calls == []
+
+
+def test_cancelled_half_open_trial_frees_the_slot():
+    primary, secondary = stub("primary", 0.25), stub("secondary", 0.01)
+    for _ in range(primary.breaker.failures):
+        primary.breaker.record_failure()
+    primary.breaker.opened_at -= primary.breaker.reset_seconds
+    assert primary.breaker.state == "half_open"
+    # The trial loses the hedge race and is cancelled
+    assert complete(llm_router.Router([primary, secondary])) == {"provider": "secondary"}
+    assert primary.calls[-1] == "cancelled"
+    assert primary.breaker.state == "half_open" and not primary.breaker.trial_running
+    # The next request may run the trial again
+    assert complete(llm_router.Router([primary])) == {"provider": "primary"}
+    assert primary.breaker.state == "closed"
+
+
+def test_slow_unreliable_primary_is_demoted():
+    primary, secondary = stub("primary"), stub("secondary")
+    primary.latencies.extend([2.0] * llm_router.LLM_MIN_SAMPLES)
+    secondary.latencies.extend([0.5] * llm_router.LLM_MIN_SAMPLES)
+    router = llm_router.Router([primary, secondary])
+    # 2.0 vs 0.5 is beyond LLM_FAILOVER_RATIO (2): the secondary goes first
+    assert [provider.name for provider in router.ranked()] == ["secondary", "primary"]
+    secondary.error_rate = 0.5
+    assert [provider.name for provider in router.ranked()] == ["primary", "secondary"]
+
+
+def test_hedge_delay_follows_p95():
+    provider = stub("primary")
+    assert provider.hedge_delay() == llm_router.LLM_HEDGE_DELAY_SECONDS
+    provider.latencies.extend([0.1] * 95 + [1.0] * 5)
+    assert provider.hedge_delay() == 1.0
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"ok  {name}")
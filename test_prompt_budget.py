@@ -0,0 +1,57 @@
+"""
+Prompt token budget tests (no server, no API keys).
+
+Run with `python -m pytest test_prompt_budget.py` or `python test_prompt_budget.py`.
+"""
+import prompt_budget
+
+
+def words(count: int, start: int = 0) -> str:
+    return " ".join(f"word{i}" for i in range(start, start + count))
+
+
+def test_text_under_budget_is_only_cleaned():
+    text = "INCOME TAX DEPARTMENT\n\n   Name:    RAHUL   SHARMA\n~~~~~~\nName: RAHUL SHARMA"
+    fitted, report = prompt_budget.fit(text, "PAN")
+    assert fitted == "INCOME TAX DEPARTMENT\nName: RAHUL SHARMA"
+    assert report["lines_dropped"] == 0 and report["lines_cut"] == 0
+
+
+def test_single_line_over_budget_is_cut_not_dropped():
+    line = words(3000)
+    budget = prompt_budget.budget_for("default")
+    assert prompt_budget.count_tokens(line) > 2 * budget
+
+    fitted, report = prompt_budget.fit(line, "default")
+    assert fitted.startswith("word0 word1 word2")
+    assert fitted.endswith(" [...]")
+    assert budget // 2 < report["tokens_after"] <= budget
+    assert report["lines_cut"] == 1 and report["lines_dropped"] == 0
+
+
+def test_relevant_lines_are_kept_and_long_line_fills_the_rest():
+    text = "\n".join([
+        "P<INDSHARMA<<RAHUL<<<<<<<<<<<<<<<<<<<<<<<<<<",
+        "Date of Birth: 01/01/1990",
+        words(5000, start=100),
+    ])
+    fitted, report = prompt_budget.fit(text, "Passport")
+    lines = fitted.splitlines()
+    assert lines[0] == "P<INDSHARMA<<RAHUL<<<<<<<<<<<<<<<<<<<<<<<<<<"
+    assert lines[1] == "Date of Birth: 01/01/1990"
+    assert lines[2].startswith("word100 ") and lines[2].endswith(" [...]")
+    assert report["tokens_after"] <= prompt_budget.budget_for("Passport")
+
+
+def test_no_cut_when_the_room_left_is_tiny():
+    assert prompt_budget._truncate(words(10), 0) == ""
+    cut = prompt_budget._truncate(words(100), 30)
+    assert prompt_budget.count_tokens(cut) <= 30
+    assert words(100).startswith(cut) and not cut.endswith(" ")
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"ok  {name}")
@@ -0,0 +1,78 @@
+"""
+Streaming CSV/XLSX extraction tests (no server, no API keys).
+
+Run with `python -m pytest test_table_extract.py` or `python test_table_extract.py`.
+"""
+import io
+import datetime
+
+import table_extract
+
+
+def csv_bytes(rows: int, delimiter: str = ",") -> bytes:
+    lines = [delimiter.join(["Name", "Amount", "Due Date"])]
+    for i in range(rows):
+        lines.append(delimiter.join([f"Customer {i % 3}", f"{i}.50", f"2024-02-{i % 28 + 1:02d}"]))
+    return "\n".join(lines).encode()
+
+
+def test_small_csv_shows_every_row_without_summary():
+    text = table_extract.extract_csv(csv_bytes(3))
+    assert text.splitlines()[:2] == ["Table (3 rows x 3 columns)", "Columns: Name | Amount | Due Date"]
+    assert "3: Customer 2 | 2.50 | 2024-02-03" in text
+    assert "Column summary:" not in text
+
+
+def test_large_csv_is_sampled_and_summarized():
+    text = table_extract.extract_csv(csv_bytes(10000, delimiter=";"))
+    lines = text.splitlines()
+    rows = [line for line in lines if line[:1].isdigit()]
+    assert len(rows) == table_extract.TABLE_HEAD_ROWS + table_extract.TABLE_SAMPLE_ROWS
+    assert "- Amount: numeric, 10000 values, more than 1000 distinct, min 0.5, max 9999.5, mean 5000.0" in lines
+    assert "- Due Date: date, 10000 values, 28 distinct, from 2024-02-01 to 2024-02-28" in lines
+    # The same file always gives the same sample (cached texts stay valid)
+    assert table_extract.extract_csv(csv_bytes(10000, delimiter=";")) == text
+
+
+def test_scan_limit_and_column_cap():
+    table_extract.TABLE_MAX_SCAN_ROWS, scan_rows = 100, table_extract.TABLE_MAX_SCAN_ROWS
+    table_extract.TABLE_MAX_COLUMNS, max_columns = 2, table_extract.TABLE_MAX_COLUMNS
+    try:
+        text = table_extract.extract_csv(csv_bytes(500))
+    finally:
+        table_extract.TABLE_MAX_SCAN_ROWS, table_extract.TABLE_MAX_COLUMNS = scan_rows, max_columns
+    assert text.splitlines()[0] == "Table (100+ rows x 2 columns (1 more columns not shown))"
+
+
+def test_xlsx_sheets_are_read_separately():
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    bills = workbook.create_sheet("Bills")
+    bills.append(["Account", "Billed", None])
+    bills.append(["ACC-1", datetime.datetime(2024, 3, 1), None])
+    workbook.create_sheet("Blank")
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+
+    text = table_extract.extract_xlsx(buffer.getvalue())
+    assert text.split("\n\n") == [
+        "Sheet Bills (1 rows x 2 columns)\nColumns: Account | Billed\n1: ACC-1 | 2024-03-01",
+        "Sheet Blank: empty",
+    ]
+
+
+def test_empty_inputs_give_no_text():
+    from openpyxl import Workbook
+
+    buffer = io.BytesIO()
+    Workbook().save(buffer)
+    assert table_extract.extract_xlsx(buffer.getvalue()) == ""
+    assert table_extract.extract_csv(b"\n\n") == ""
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"ok  {name}")
@@ -1,248 +1,517 @@
-from dotenv import load_dotenv
-load_dotenv()
-
 import os
 import logging
+import importlib
+import importlib.util
 import traceback
-import pdfplumber
-import pandas as pd
-from docx import Document
 from PIL import Image
 from io import BytesIO
-from mimetypes import guess_type
 import time
+import shutil
+import threading
+import tracing
+import docx_extract
+import table_extract
+import extraction_pool
+import ocr_strategies
+import image_preprocess
 
-try:
-    import pytesseract
-    TESSERACT_AVAILABLE = True
-except ImportError:
-    TESSERACT_AVAILABLE = False
-    logging.warning("pytesseract not installed. OCR functionality will be limited.")
-
-load_dotenv()
-
-# Configure a hard ceiling for OCR processing latency (seconds)
-MAX_OCR_SECONDS = int(os.getenv("MAX_OCR_SECONDS", "55"))
-
-# Configure Tesseract path (update this if Tesseract is installed in a different location)
-# For Windows, common path: r'C:\\Program Files\\Tesseract-OCR\\tesseract.exe'
-# For Linux/Mac: pytesseract will use system PATH
-if TESSERACT_AVAILABLE:
-    # Prefer env var, then PATH (Linux/Docker), then Windows fallbacks
-    TESSERACT_CMD = os.getenv("TESSERACT_CMD")
-    if TESSERACT_CMD and os.path.exists(TESSERACT_CMD):
-        pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
-        logging.info(f"Using Tesseract from TESSERACT_CMD: {TESSERACT_CMD}")
-    else:
-        try:
-            import shutil as _sh
-            detected = _sh.which("tesseract")
-        except Exception:
-            detected = None
-        if detected:
-            pytesseract.pytesseract.tesseract_cmd = detected
-            logging.info(f"Auto-detected Tesseract on PATH: {detected}")
-        else:
-            windows_paths = [
-                r"C:\\Program Files\\Tesseract-OCR\\tesseract.exe",
-                r"C:\\Program Files (x86)\\Tesseract-OCR\\tesseract.exe",
-                r"C:\\Users\\Public\\Tesseract-OCR\\tesseract.exe"
-            ]
-            for path in windows_paths:
-                if os.path.exists(path):
+logger = logging.getLogger(__name__)
+
+# pdfplumber, openpyxl and the OCR bindings are imported on first
+# use of their format, so a worker that never sees a spreadsheet never loads openpyxl
+PYTESSERACT_AVAILABLE = importlib.util.find_spec("pytesseract") is not None
+# Optional: tesserocr keeps Tesseract loaded in-process instead of starting the
+# tesseract binary (and re-reading its language data) for every call
+TESSEROCR_AVAILABLE = importlib.util.find_spec("tesserocr") is not None
+
+TESSERACT_AVAILABLE = PYTESSERACT_AVAILABLE or TESSEROCR_AVAILABLE
+if not TESSERACT_AVAILABLE:
+    logger.warning("Neither pytesseract nor tesserocr installed. OCR functionality will be limited.")
+
+# OCR backend: "auto" (tesserocr when installed, else pytesseract), "tesserocr" or "pytesseract"
+OCR_BACKEND = os.getenv("OCR_BACKEND", "auto").lower()
+
+# Formats whose libraries every extraction worker imports as it starts, so the
+# first upload of that format does not pay for the import (comma-separated:
+# pdf, xlsx; empty imports everything on first use)
+EXTRACTION_PRELOAD_FORMATS = [f.strip() for f in os.getenv("EXTRACTION_PRELOAD_FORMATS", "pdf").split(",") if f.strip()]
+_FORMAT_MODULES = {
+    "pdf": ["pdfplumber"],
+    "xlsx": ["openpyxl"],
+}
+
+# Bump whenever extraction output changes so cached texts are not reused
+EXTRACTOR_VERSION = "7"
+
+# Scanned PDFs: number of pages to OCR and the rasterization resolution
+OCR_MAX_PAGES = int(os.getenv("OCR_MAX_PAGES", "10"))
+OCR_PDF_DPI = int(os.getenv("OCR_PDF_DPI", "200"))
+# PDF pages whose text layer has fewer characters than this are treated as scanned
+PDF_TEXT_MIN_CHARS = int(os.getenv("PDF_TEXT_MIN_CHARS", "25"))
+
+# Tesseract locations tried after TESSERACT_CMD and the PATH
+_WINDOWS_TESSERACT_PATHS = [
+    r"C:\\Program Files\\Tesseract-OCR\\tesseract.exe",
+    r"C:\\Program Files (x86)\\Tesseract-OCR\\tesseract.exe",
+    r"C:\\Users\\Public\\Tesseract-OCR\\tesseract.exe",
+]
+_TESSDATA_PATHS = ["/usr/share/tesseract-ocr/4.00/tessdata", "/usr/share/tesseract-ocr/tessdata"]
+
+_tesseract_configured = False
+_tesseract_lock = threading.Lock()
+
+
+def configure_tesseract() -> None:
+    """Find the tesseract binary and its language data, once per process.
+
+    TESSERACT_CMD wins, then the PATH (Linux/Docker), then the usual Windows
+    install locations. TESSDATA_PREFIX is set for common Linux/Docker paths
+    unless already in the environment (used by both backends).
+    """
+    global _tesseract_configured
+    if _tesseract_configured or not TESSERACT_AVAILABLE:
+        return
+    with _tesseract_lock:
+        if _tesseract_configured:
+            return
+        if PYTESSERACT_AVAILABLE:
+            import pytesseract
+            configured = os.getenv("TESSERACT_CMD")
+            candidates = [configured, shutil.which("tesseract")] + _WINDOWS_TESSERACT_PATHS
+            for path in candidates:
+                if path and os.path.exists(path):
                     pytesseract.pytesseract.tesseract_cmd = path
-                    logging.info(f"Auto-detected Windows Tesseract at: {path}")
+                    logger.info(f"Using Tesseract at {path}")
+                    break
+            else:
+                logger.warning("Tesseract binary not found (set TESSERACT_CMD).")
+        if "TESSDATA_PREFIX" not in os.environ:
+            for candidate in _TESSDATA_PATHS:
+                if os.path.exists(candidate):
+                    os.environ["TESSDATA_PREFIX"] = candidate
+                    logger.info(f"Set TESSDATA_PREFIX to: {candidate}")
                     break
+        _tesseract_configured = True
+
+
+class PytesseractEngine:
+    """Runs the tesseract binary once per call (image passed via a temp file)."""
+
+    name = "pytesseract"
+
+    def __init__(self):
+        configure_tesseract()
+        import pytesseract
+        self._pytesseract = pytesseract
+
+    def image_to_string(self, image, psm: int = None) -> str:
+        config = f"--oem 3 --psm {psm}" if psm is not None else ""
+        return self._pytesseract.image_to_string(image, lang='eng', config=config)
+
+    def recognize(self, image, psm: int = None) -> dict:
+        """OCR with word confidences: {"text", "confidence" (mean, 0-100), "words"}."""
+        pytesseract = self._pytesseract
+        config = f"--oem 3 --psm {psm}" if psm is not None else ""
+        data = pytesseract.image_to_data(image, lang='eng', config=config, output_type=pytesseract.Output.DICT)
+        lines = {}
+        confidences = []
+        for index, word in enumerate(data["text"]):
+            confidence = float(data["conf"][index])
+            if confidence < 0 or not word.strip():
+                continue
+            confidences.append(confidence)
+            key = (data["block_num"][index], data["par_num"][index], data["line_num"][index])
+            lines.setdefault(key, []).append(word.strip())
+        return _recognition_result("\n".join(" ".join(words) for words in lines.values()), confidences)
+
+
+class TesserocrEngine:
+    """Long-lived Tesseract API handles, one per thread, reused across calls."""
+
+    name = "tesserocr"
 
-    # Attempt to set TESSDATA_PREFIX for common Linux/Docker paths
-    if 'TESSDATA_PREFIX' not in os.environ:
-        for candidate in [
-            '/usr/share/tesseract-ocr/4.00/tessdata',
-            '/usr/share/tesseract-ocr/tessdata'
-        ]:
-            if os.path.exists(candidate):
-                os.environ['TESSDATA_PREFIX'] = candidate
-                logging.info(f"Set TESSDATA_PREFIX to: {candidate}")
-                break
+    def __init__(self):
+        configure_tesseract()
+        import tesserocr
+        self._tesserocr = tesserocr
+        self._local = threading.local()
 
-async def extract_text_from_upload(file_path: str, file_bytes: bytes, mime_type_hint: str = None) -> str:
-    """Extracts text from various formats. Uses Tesseract OCR for images and scanned documents."""
+    def _api(self):
+        api = getattr(self._local, "api", None)
+        if api is None:
+            tesserocr = self._tesserocr
+            tessdata = os.environ.get("TESSDATA_PREFIX")
+            api = tesserocr.PyTessBaseAPI(path=tessdata, lang="eng") if tessdata else tesserocr.PyTessBaseAPI(lang="eng")
+            self._local.api = api
+            logger.info(f"Loaded Tesseract API handle in thread {threading.current_thread().name}")
+        return api
 
-    ext = file_path.lower()
-    logging.info(f"extract_text_from_upload called: file_path={file_path}, mime_type={mime_type_hint}, file_size={len(file_bytes)} bytes")
+    def image_to_string(self, image, psm: int = None) -> str:
+        api = self._api()
+        if image.mode not in ("1", "L", "RGB", "RGBA"):
+            image = image.convert("RGB")
+        api.SetPageSegMode(self._tesserocr.PSM.AUTO if psm is None else psm)
+        api.SetImage(image)
+        return api.GetUTF8Text()
 
-    start_time = time.monotonic()
+    def recognize(self, image, psm: int = None) -> dict:
+        """OCR with word confidences: {"text", "confidence" (mean, 0-100), "words"}."""
+        text = self.image_to_string(image, psm=psm)
+        return _recognition_result(text, [c for c in self._api().AllWordConfidences() if c >= 0])
+
+
+def _recognition_result(text: str, confidences: list) -> dict:
+    return {
+        "text": text.strip(),
+        "confidence": round(sum(confidences) / len(confidences), 1) if confidences else 0.0,
+        "words": len(confidences),
+    }
+
+
+_ocr_engine = None
+_ocr_engine_lock = threading.Lock()
+
+
+def _create_ocr_engine():
+    if OCR_BACKEND in ("auto", "tesserocr") and TESSEROCR_AVAILABLE:
+        try:
+            engine = TesserocrEngine()
+            engine._api()
+            return engine
+        except (RuntimeError, ImportError) as e:
+            logger.warning(f"tesserocr could not load Tesseract ({e}). Using pytesseract.")
+    elif OCR_BACKEND == "tesserocr":
+        logger.warning("OCR_BACKEND=tesserocr but tesserocr is not installed. Using pytesseract.")
+    return PytesseractEngine()
+
+
+def get_ocr_engine():
+    """Return the process-wide OCR engine for the configured backend."""
+    global _ocr_engine
+    with _ocr_engine_lock:
+        if _ocr_engine is None:
+            _ocr_engine = _create_ocr_engine()
+        return _ocr_engine
+
+
+def ocr_image(image, psm: int = None) -> str:
+    """OCR a PIL image with the configured engine; psm is Tesseract's page segmentation mode."""
+    return get_ocr_engine().image_to_string(image, psm=psm)
+
+
+def warm_ocr_engine() -> None:
+    """Extraction worker initializer: resolve Tesseract and load its language data up front."""
+    if not TESSERACT_AVAILABLE:
+        return
+    engine = get_ocr_engine()
+    if isinstance(engine, TesserocrEngine):
+        engine._api()
+        # Threads running OCR strategies concurrently get their own handles
+        ocr_strategies.warm_up(engine._api)
+    else:
+        # One tiny OCR run checks the binary and pulls eng.traineddata into the page cache
+        engine.image_to_string(Image.new("L", (64, 32), 255))
+
+
+def preload_extractors() -> None:
+    """Extraction worker initializer: import the libraries of EXTRACTION_PRELOAD_FORMATS."""
+    for fmt in EXTRACTION_PRELOAD_FORMATS:
+        for module in _FORMAT_MODULES.get(fmt.lower().lstrip("."), []):
+            try:
+                importlib.import_module(module)
+            except ImportError as e:
+                logger.warning(f"Cannot preload {module} for {fmt} files: {e}")
+
+
+extraction_pool.register_initializer(warm_ocr_engine)
+extraction_pool.register_initializer(preload_extractors)
+
+
+async def extract_text_from_upload(filename: str, file_bytes: bytes, mime_type_hint: str = None) -> str:
+    """Extracts text from various formats on the extraction worker pool.
+
+    Raises extraction_pool.PoolSaturatedError when the queue is full and
+    extraction_pool.ExtractionTimeoutError when the job overruns its deadline.
+    """
+    details = await extract_text_with_details(filename, file_bytes, mime_type_hint)
+    return details["text"]
+
+
+async def extract_text_with_details(filename: str, file_bytes: bytes, mime_type_hint: str = None) -> dict:
+    """Like extract_text_from_upload, but returns {"text": str, "pages": list or None}.
+
+    "pages" is only set for PDFs and describes, per page, where its text came
+    from and how long that took. Images also get "ocr": the winning OCR
+    strategy, its confidence and every candidate tried.
+    """
+    ext = filename.lower()
+    if ext.endswith(".pdf"):
+        return await _extract_pdf(file_bytes)
+    if ext.endswith((".png", ".jpg", ".jpeg")):
+        # Workers order OCR strategies by what has worked best so far
+        result = await extraction_pool.run(_extract_image, file_bytes, ocr_strategies.wins())
+        return {"text": result["text"], "pages": None, "ocr": result["ocr"]}
+    text = await extraction_pool.run(extract_text_sync, filename, file_bytes, mime_type_hint)
+    return {"text": text, "pages": None}
+
+
+async def _extract_pdf(file_bytes: bytes) -> dict:
+    """Read the text layer page by page, then OCR only the image-only pages.
+
+    Every scanned page is a separate pool task that renders and OCRs its own
+    page, so with several workers one page is rasterized while another is in
+    Tesseract. Pages still outstanding at the deadline are dropped; page order
+    is kept.
+    """
+    deadline = time.time() + extraction_pool.EXTRACTION_TIMEOUT_SECONDS
+    pages = await extraction_pool.run(_pdf_text_layer, file_bytes)
+
+    to_ocr = _pages_to_ocr(pages)
+    remaining = deadline - time.time()
+    if to_ocr and remaining > 0:
+        logger.info(f"Attempting Tesseract OCR on {len(to_ocr)} PDF pages in parallel...")
+        calls = [(file_bytes, page["page"] - 1, OCR_PDF_DPI) for page in to_ocr]
+        results = await extraction_pool.run_many(_ocr_pdf_page, calls, timeout=remaining)
+        for page, result in zip(to_ocr, results):
+            _apply_ocr_result(page, result)
+    return _combine_pdf_pages(pages)
+
+
+def _extract_pdf_sync(file_bytes: bytes, deadline: float = None) -> dict:
+    """In-process counterpart of _extract_pdf: the same steps, one page after
+    another, on a document opened once."""
+    import pdfplumber
+    with pdfplumber.open(BytesIO(file_bytes)) as pdf:
+        pages = _read_text_layer(pdf)
+        for page in _pages_to_ocr(pages):
+            _apply_ocr_result(page, _ocr_open_page(pdf, page["page"] - 1, OCR_PDF_DPI, deadline))
+    return _combine_pdf_pages(pages)
+
+
+def _pages_to_ocr(pages: list) -> list:
+    """Pages without a usable text layer that OCR should run on, at most OCR_MAX_PAGES."""
+    scanned = [page for page in pages if page["source"] == "ocr_pending"]
+    if scanned and not TESSERACT_AVAILABLE:
+        logger.warning("Tesseract not available. Cannot perform OCR on scanned PDF pages.")
+        return []
+    if len(scanned) > OCR_MAX_PAGES:
+        logger.info(f"PDF has {len(scanned)} scanned pages; OCR limited to the first {OCR_MAX_PAGES}")
+    return scanned[:OCR_MAX_PAGES]
+
+
+def _page_text_layer(page, page_number: int) -> dict:
+    started = time.perf_counter()
+    text = (page.extract_text() or "").strip()
+    return {
+        "page": page_number,
+        "source": "text_layer" if len(text) >= PDF_TEXT_MIN_CHARS else "ocr_pending",
+        "text": text,
+        "text_layer_seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def _pdf_text_layer(file_bytes: bytes, deadline: float = None) -> list:
+    """Per-page text layer of a PDF, marking pages with too little text for OCR."""
+    import pdfplumber
+    try:
+        with pdfplumber.open(BytesIO(file_bytes)) as pdf:
+            return _read_text_layer(pdf)
+    except Exception as e:
+        logger.warning(f"pdfplumber failed: {e}")
+        return []
+
+
+def _read_text_layer(pdf) -> list:
+    """Per-page text layer of an open pdfplumber document."""
+    with tracing.span("pdf.text_layer") as span:
+        pages = [_page_text_layer(page, number) for number, page in enumerate(pdf.pages, start=1)]
+        if span is not None:
+            span.set(pages=len(pages))
+        return pages
+
+
+def _ocr_page(page, dpi: int) -> dict:
+    """Rasterize an open pdfplumber page and OCR it."""
+    started = time.perf_counter()
+    with tracing.span("pdf.render", page=page.page_number, dpi=dpi):
+        image = page.to_image(resolution=dpi).original
+    rendered = time.perf_counter()
+    with tracing.span("ocr", page=page.page_number):
+        text = ocr_image(image).strip()
+    return {
+        "text": text,
+        "render_seconds": round(rendered - started, 3),
+        "ocr_seconds": round(time.perf_counter() - rendered, 3),
+    }
+
+
+def _ocr_pdf_page(file_bytes: bytes, page_index: int, dpi: int = OCR_PDF_DPI, deadline: float = None):
+    """Pool task: OCR one PDF page. Returns None if the deadline has already passed."""
+    if deadline is not None and time.time() > deadline:
+        return None
+    import pdfplumber
+    try:
+        with pdfplumber.open(BytesIO(file_bytes)) as pdf:
+            return _ocr_open_page(pdf, page_index, dpi)
+    except Exception as e:
+        logger.warning(f"OCR failed on page {page_index + 1}: {e}")
+        return {"text": "", "error": str(e)}
+
+
+def _ocr_open_page(pdf, page_index: int, dpi: int, deadline: float = None):
+    """OCR one page of an open pdfplumber document; None if the deadline has already passed."""
+    if deadline is not None and time.time() > deadline:
+        return None
+    try:
+        return _ocr_page(pdf.pages[page_index], dpi)
+    except Exception as e:
+        logger.warning(f"OCR failed on page {page_index + 1}: {e}")
+        return {"text": "", "error": str(e)}
+
+
+def _apply_ocr_result(page: dict, result) -> None:
+    """Record an OCR result on a page; the text layer is kept if OCR produced nothing."""
+    if result is None:
+        page["source"] = "ocr_timeout"
+        return
+    for key in ("render_seconds", "ocr_seconds"):
+        if key in result:
+            page[key] = result[key]
+    if result["text"]:
+        page["source"] = "ocr"
+        page["text"] = result["text"]
+    else:
+        page["source"] = "ocr_failed" if "error" in result else "ocr_empty"
+
+
+def _combine_pdf_pages(pages: list) -> dict:
+    """Join page texts in order; pages never OCR'd are reported as skipped."""
+    texts = []
+    for page in pages:
+        if page["source"] == "ocr_pending":
+            page["source"] = "ocr_skipped"
+        text = page.pop("text")
+        page["chars"] = len(text)
+        if text:
+            texts.append(text)
+    summary = {}
+    for page in pages:
+        summary[page["source"]] = summary.get(page["source"], 0) + 1
+    if pages:
+        logger.info(f"PDF pages by source: {summary}")
+    return {"text": "\n".join(texts), "pages": pages}
+
+
+def _extract_image(file_bytes: bytes, strategy_wins: dict = None, deadline: float = None) -> dict:
+    """Pool task: OCR an image, picking the strategy by word confidence.
+
+    Returns {"text": str, "ocr": dict or None}; see ocr_strategies.run.
+    """
+    if not TESSERACT_AVAILABLE:
+        logger.error("Tesseract OCR not available. Cannot process images.")
+        return {"text": "", "ocr": None}
+
+    try:
+        logger.info("Extracting text from image using Tesseract OCR...")
+        with tracing.span("image.load"):
+            image = Image.open(BytesIO(file_bytes))
+            logger.info(f"Loaded image: mode={image.mode}, size={image.size}")
+            # Upright and capped at OCR_MAX_IMAGE_DIM before any strategy sees it
+            image = image_preprocess.load(image)
+            image.load()
+
+        result = ocr_strategies.run(image, get_ocr_engine(), strategy_wins, deadline=deadline)
+        text = result.pop("text")
+        if text:
+            logger.info(
+                f"Successfully extracted text from image. Strategy: {result['strategy']}, "
+                f"confidence: {result['confidence']}, length: {len(text)}"
+            )
+        else:
+            logger.warning("OCR returned empty text for every strategy.")
+        return {"text": text, "ocr": result}
+    except Exception as e:
+        logger.error(f"Tesseract OCR error: {e}", exc_info=True)
+        logger.error(traceback.format_exc())
+        return {"text": "", "ocr": None}
+
+
+def extract_text_sync(filename: str, file_bytes: bytes, mime_type_hint: str = None, deadline: float = None) -> str:
+    """Extracts text from various formats. Uses Tesseract OCR for images and scanned documents.
+
+    Runs synchronously; `filename` is only used for its extension and
+    `deadline` is an absolute time.time() value after which no further OCR
+    passes are started.
+    """
+
+    ext = filename.lower()
+    logger.info(f"extract_text_sync called: filename={filename}, mime_type={mime_type_hint}, file_size={len(file_bytes)} bytes")
 
     # Log Tesseract status
     if TESSERACT_AVAILABLE:
-        logging.info(f"Tesseract available: True, Path: {getattr(pytesseract.pytesseract, 'tesseract_cmd', 'Not configured')}")
+        logger.info(f"Tesseract available: True, backend: {get_ocr_engine().name}")
     else:
-        logging.warning("Tesseract NOT available - pytesseract not installed")
-
-    def deadline_exceeded() -> bool:
-        return (time.monotonic() - start_time) > MAX_OCR_SECONDS
+        logger.warning("Tesseract NOT available - neither pytesseract nor tesserocr installed")
 
-    # 1. Extract text from digital PDFs
+    # 1. Extract text from PDFs: text layer where present, OCR for scanned pages
     if ext.endswith(".pdf"):
         try:
-            with pdfplumber.open(BytesIO(file_bytes)) as pdf:
-                full_text = "".join(page.extract_text() or "" for page in pdf.pages)
-            if full_text.strip():
-                logging.info("Successfully extracted text using pdfplumber.")
-                return full_text.strip()
+            full_text = _extract_pdf_sync(file_bytes, deadline)["text"]
+            if full_text:
+                logger.info("Successfully extracted text from PDF.")
+                return full_text
         except Exception as e:
-            logging.warning(f"pdfplumber failed: {e}. Falling back to Tesseract OCR.")
-
-        # Fallback to Tesseract for scanned PDFs (limited pages to honor deadline)
-        if TESSERACT_AVAILABLE and not deadline_exceeded():
-            try:
-                logging.info("Attempting Tesseract OCR on PDF pages...")
-                with pdfplumber.open(BytesIO(file_bytes)) as pdf:
-                    extracted_text = []
-                    for page_num, page in enumerate(pdf.pages[:2]):  # limit to first 2 pages for latency
-                        if deadline_exceeded():
-                            break
-                        try:
-                            image = page.to_image(resolution=200)
-                            text = pytesseract.image_to_string(image.original, lang='eng')
-                            if text.strip():
-                                extracted_text.append(text.strip())
-                        except Exception as e:
-                            logging.warning(f"OCR failed on page {page_num}: {e}")
-                    result = "\n".join(extracted_text)
-                    if result.strip():
-                        logging.info("Successfully extracted text using Tesseract OCR on PDF.")
-                        return result.strip()
-            except Exception as e:
-                logging.error(f"Tesseract OCR on PDF failed: {e}")
-        else:
-            logging.warning("Tesseract not available or deadline exceeded. Cannot perform OCR on scanned PDF.")
+            logger.error(f"PDF extraction failed: {e}")
 
-    # 2. Extract text from Word documents (.docx)
+    # 2. Extract text from Word documents (.docx): headers, body, tables, text
+    # boxes and footers streamed from the zip; embedded images are OCR'd only
+    # when there is too little text (see docx_extract)
     elif ext.endswith(".docx"):
         try:
-            doc = Document(BytesIO(file_bytes))
-            full_text = "\n".join([para.text for para in doc.paragraphs])
+            ocr = (lambda image_bytes: _extract_image(image_bytes, deadline=deadline)["text"]) if TESSERACT_AVAILABLE else None
+            with tracing.span("docx.read") as span:
+                result = docx_extract.extract(file_bytes, ocr=ocr, deadline=deadline)
+                if span is not None:
+                    span.set(parts=len(result["parts"]), images_ocrd=result["images_ocrd"])
+            full_text = result["text"]
             if full_text.strip():
-                logging.info("Successfully extracted text from DOCX.")
+                logger.info(
+                    f"Successfully extracted text from DOCX ({len(result['parts'])} parts, "
+                    f"{result['images_ocrd']} images OCR'd)."
+                )
                 return full_text.strip()
         except Exception as e:
-            logging.warning(f"python-docx failed: {e}")
+            logger.warning(f"DOCX extraction failed: {e}")
 
     # 3. Extract from plain text files (.txt)
     elif ext.endswith(".txt"):
         try:
             full_text = file_bytes.decode('utf-8')
             if full_text.strip():
-                logging.info("Successfully extracted text from TXT file.")
+                logger.info("Successfully extracted text from TXT file.")
                 return full_text.strip()
         except Exception as e:
-            logging.warning(f"Failed to read text file: {e}")
+            logger.warning(f"Failed to read text file: {e}")
 
-    # 4. Extract from Excel and CSV (.xlsx, .csv)
+    # 4. Extract from Excel and CSV (.xlsx, .csv): streamed row by row, rendered
+    # as header, sampled rows and per-column summaries (see table_extract)
     elif ext.endswith(".xlsx") or ext.endswith(".csv"):
         try:
-            if ext.endswith(".csv"):
-                df = pd.read_csv(BytesIO(file_bytes))
-            else:
-                df = pd.read_excel(BytesIO(file_bytes))
-            full_text = df.to_string(index=False)
+            with tracing.span("table.read", format=ext.rsplit(".", 1)[-1]):
+                if ext.endswith(".csv"):
+                    full_text = table_extract.extract_csv(file_bytes, deadline=deadline)
+                else:
+                    full_text = table_extract.extract_xlsx(file_bytes, deadline=deadline)
             if full_text.strip():
-                logging.info("Successfully extracted text from Excel/CSV.")
+                logger.info(f"Successfully extracted table from Excel/CSV ({len(full_text)} chars).")
                 return full_text.strip()
         except Exception as e:
-            logging.warning(f"pandas failed to extract table: {e}")
+            logger.warning(f"Failed to extract table: {e}")
 
     # 5. Extract from images (.png, .jpg, .jpeg) using Tesseract OCR
     elif ext.endswith((".png", ".jpg", ".jpeg")):
-        if not TESSERACT_AVAILABLE:
-            logging.error("Tesseract OCR not available. Cannot process images.")
-            return ""
-
-        try:
-            logging.info("Extracting text from image using Tesseract OCR...")
-
-            # Ensure Tesseract path is configured (retry)
-            if not hasattr(pytesseract.pytesseract, 'tesseract_cmd') or not pytesseract.pytesseract.tesseract_cmd:
-                retry_cmd = os.getenv("TESSERACT_CMD")
-                if not retry_cmd:
-                    try:
-                        import shutil as _sh
-                        retry_cmd = _sh.which("tesseract")
-                    except Exception:
-                        retry_cmd = None
-                if retry_cmd and os.path.exists(retry_cmd):
-                    pytesseract.pytesseract.tesseract_cmd = retry_cmd
-                    logging.info(f"Configured Tesseract path: {retry_cmd}")
-                if 'TESSDATA_PREFIX' not in os.environ:
-                    for candidate in ['/usr/share/tesseract-ocr/4.00/tessdata','/usr/share/tesseract-ocr/tessdata']:
-                        if os.path.exists(candidate):
-                            os.environ['TESSDATA_PREFIX'] = candidate
-                            logging.info(f"Set TESSDATA_PREFIX to: {candidate}")
-                            break
-
-            image = Image.open(BytesIO(file_bytes))
-            logging.info(f"Loaded image: mode={image.mode}, size={image.size}")
-
-            original_image = image.copy()
-
-            from PIL import ImageEnhance, ImageFilter
-            text = ""
-            successful_config = None
-            all_texts = []
-
-            # Strategy 1: No preprocessing
-            if not deadline_exceeded():
-                try:
-                    text = pytesseract.image_to_string(original_image, lang='eng')
-                    if text.strip():
-                        all_texts.append(("no_preprocessing", text.strip()))
-                        successful_config = "no_preprocessing"
-                except Exception as e:
-                    logging.warning(f"Strategy 1 failed: {e}")
-
-            # Strategy 2: Light preprocessing (single pass) and two configs
-            if not text.strip() and not deadline_exceeded():
-                try:
-                    processed_image = original_image.convert('L') if original_image.mode != 'L' else original_image.copy()
-                    processed_image = processed_image.filter(ImageFilter.SHARPEN)
-                    width, height = processed_image.size
-                    if min(width, height) < 1200:
-                        scale = 1200 / min(width, height)
-                        processed_image = processed_image.resize((int(width*scale), int(height*scale)), Image.Resampling.LANCZOS)
-                    for config in ['--oem 3 --psm 6', '--oem 3 --psm 11']:
-                        if deadline_exceeded():
-                            break
-                        try:
-                            temp_text = pytesseract.image_to_string(processed_image, lang='eng', config=config)
-                            if temp_text.strip():
-                                all_texts.append(("light_preprocessing_"+config, temp_text.strip()))
-                                if len(temp_text) > len(text):
-                                    text = temp_text
-                                    successful_config = f"light_preprocessing {config}"
-                        except Exception:
-                            pass
-                except Exception as e:
-                    logging.warning(f"Strategy 2 failed: {e}")
-
-            if all_texts:
-                all_texts.sort(key=lambda x: len(x[1]), reverse=True)
-                best_strategy, best_text = all_texts[0]
-                if best_text != text:
-                    text = best_text
-                    successful_config = best_strategy
-
-            if text.strip():
-                logging.info(f"Successfully extracted text from image. Strategy: {successful_config}, length: {len(text)}")
-                return text.strip()
-            else:
-                logging.warning("OCR returned empty text after limited strategies.")
-                return ""
-        except Exception as e:
-            logging.error(f"Tesseract OCR error: {e}", exc_info=True)
-            logging.error(traceback.format_exc())
-            return ""
+        return _extract_image(file_bytes, deadline=deadline)["text"]
 
     # If all methods fail
-    logging.error(f"Failed to extract text from file: {file_path}")
+    logger.error(f"Failed to extract text from file: {filename}")
     return ""
\ No newline at end of file
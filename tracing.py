@@ -0,0 +1,277 @@
+import os
+import json
+import time
+import uuid
+import queue
+import logging
+import secrets
+import threading
+import contextlib
+import contextvars
+from urllib.parse import parse_qsl
+
+logger = logging.getLogger(__name__)
+
+# Export finished traces: "none" (default), "file" (OTLP JSON, one trace per
+# line in TRACE_EXPORT_PATH) or "otlp" (POST to an OTLP/HTTP JSON collector).
+# Requests with ?debug_timing=1 are traced even when export is off.
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "none").lower()
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "kyc-analyzer")
+
+REQUEST_ID_HEADER = b"x-request-id"
+
+request_id = contextvars.ContextVar("request_id", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+# Returned by span() when no trace is active, so untraced requests only pay
+# for one ContextVar lookup per span
+_NOOP = contextlib.nullcontext()
+
+
+class Span:
+    """A timed step. Times are time.time_ns() so spans from worker processes line up."""
+
+    __slots__ = ("name", "trace_id", "span_id", "start_ns", "end_ns", "attributes", "children")
+
+    def __init__(self, name: str, trace_id: str, attributes: dict = None, start_ns: int = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+        self.children = []
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "attributes": self.attributes,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, trace_id: str) -> "Span":
+        span = cls(data["name"], trace_id, data["attributes"], data["start_ns"])
+        span.end_ns = data["end_ns"]
+        span.children = [cls.from_dict(child, trace_id) for child in data["children"]]
+        return span
+
+
+def exporting() -> bool:
+    return TRACE_EXPORT in ("file", "otlp")
+
+
+def active() -> bool:
+    return _current_span.get() is not None
+
+
+def current_span():
+    return _current_span.get()
+
+
+@contextlib.contextmanager
+def _span(name: str, parent: Span, attributes: dict):
+    span = Span(name, parent.trace_id, attributes)
+    parent.children.append(span)
+    token = _current_span.set(span)
+    try:
+        yield span
+    finally:
+        span.end_ns = time.time_ns()
+        _current_span.reset(token)
+
+
+def span(name: str, **attributes):
+    """Context manager timing a step as a child of the current span.
+
+    Yields the Span (use span.set(...) to add attributes) or None when the
+    request is not traced.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return _NOOP
+    return _span(name, parent, attributes)
+
+
+@contextlib.contextmanager
+def trace(name: str, **attributes):
+    """Start a new trace whose root span covers the enclosed block; exported on exit."""
+    root = Span(name, secrets.token_hex(16), attributes)
+    token = _current_span.set(root)
+    try:
+        yield root
+    finally:
+        root.end_ns = time.time_ns()
+        _current_span.reset(token)
+        export(root)
+
+
+def graft(spans: list) -> None:
+    """Attach spans recorded elsewhere (see call_collecting) to the current span."""
+    parent = _current_span.get()
+    if parent is None:
+        return
+    parent.children.extend(Span.from_dict(data, parent.trace_id) for data in spans)
+
+
+def call_collecting(func, *args, **kwargs):
+    """Run func with a detached trace and return (result, recorded spans as dicts).
+
+    Used for work on the extraction pool: contextvars do not cross process or
+    executor-thread boundaries, so the spans travel back with the result.
+    """
+    collector = Span("collector", "")
+    token = _current_span.set(collector)
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        _current_span.reset(token)
+    return result, [child.to_dict() for child in collector.children]
+
+
+def wrap(func):
+    """Bind func to the current context, for executor threads that should record spans."""
+    if _current_span.get() is None:
+        return func
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(func, *args, **kwargs)
+
+
+def tree(span: Span = None, origin_ns: int = None) -> dict:
+    """The span tree in milliseconds relative to the root, for ?debug_timing=1."""
+    span = span or _current_span.get()
+    if span is None:
+        return None
+    origin_ns = span.start_ns if origin_ns is None else origin_ns
+    end_ns = span.end_ns or time.time_ns()
+    node = {
+        "name": span.name,
+        "start_ms": round((span.start_ns - origin_ns) / 1e6, 2),
+        "duration_ms": round((end_ns - span.start_ns) / 1e6, 2),
+    }
+    if span.attributes:
+        node["attributes"] = span.attributes
+    if span.children:
+        node["children"] = [tree(child, origin_ns) for child in sorted(span.children, key=lambda c: c.start_ns)]
+    return node
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_spans(span: Span, parent_id: str = "") -> list:
+    spans = [{
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "parentSpanId": parent_id,
+        "name": span.name,
+        "kind": 1,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns or span.start_ns),
+        "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+    }]
+    for child in span.children:
+        spans.extend(_otlp_spans(child, span.span_id))
+    return spans
+
+
+def to_otlp(root: Span) -> dict:
+    """OTLP/JSON ExportTraceServiceRequest for one trace."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": TRACE_SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "kyc-analyzer.tracing"}, "spans": _otlp_spans(root)}],
+        }]
+    }
+
+
+_export_queue = None
+_export_lock = threading.Lock()
+
+
+def _export_loop() -> None:
+    while True:
+        payload = _export_queue.get()
+        try:
+            if TRACE_EXPORT == "file":
+                with open(TRACE_EXPORT_PATH, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(payload) + "\n")
+            else:
+                import requests
+                requests.post(TRACE_OTLP_ENDPOINT, json=payload, timeout=5)
+        except Exception as e:
+            logger.warning(f"Trace export failed: {e}")
+
+
+def export(root: Span) -> None:
+    """Queue a finished trace for export; writing happens on a background thread."""
+    global _export_queue
+    if not exporting():
+        return
+    with _export_lock:
+        if _export_queue is None:
+            _export_queue = queue.Queue(maxsize=1000)
+            threading.Thread(target=_export_loop, name="trace-export", daemon=True).start()
+    try:
+        _export_queue.put_nowait(to_otlp(root))
+    except queue.Full:
+        logger.warning("Trace export queue is full; dropping trace")
+
+
+class TracingMiddleware:
+    """Assign every HTTP request an id (X-Request-ID, echoed back) and trace it when asked.
+
+    A request is traced when export is enabled or its query string has
+    debug_timing=1; endpoints then read the tree with tracing.tree().
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rid = dict(scope["headers"]).get(REQUEST_ID_HEADER, b"").decode("latin-1")[:128] or uuid.uuid4().hex
+        token = request_id.set(rid)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(REQUEST_ID_HEADER, rid.encode("latin-1"))]
+            await send(message)
+
+        try:
+            if exporting() or debug_timing_requested(scope):
+                with trace(f"{scope['method']} {scope['path']}", request_id=rid):
+                    await self.app(scope, receive, send_with_id)
+            else:
+                await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
+
+
+# Spellings the `debug_timing: bool` query parameter parses as true
+_TRUE_VALUES = ("1", "true", "t", "yes", "y", "on")
+
+
+def debug_timing_requested(scope) -> bool:
+    query = scope.get("query_string", b"").decode("latin-1")
+    return any(
+        name == "debug_timing" and value.strip().lower() in _TRUE_VALUES
+        for name, value in parse_qsl(query, keep_blank_values=True)
+    )
@@ -0,0 +1,213 @@
+import io
+import os
+import json
+import time
+import hashlib
+import logging
+
+from fastapi import UploadFile
+import python_multipart
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import parse_options_header
+
+import metrics
+import tracing
+
+logger = logging.getLogger(__name__)
+
+# Largest single uploaded document, checked while the request body streams in
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(25 * 1024 * 1024)))
+# Largest request body (all files of a batch plus multipart overhead), checked
+# before the body is parsed
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an uploaded file exceeds MAX_UPLOAD_BYTES."""
+
+    def __init__(self, filename: str, max_bytes: int):
+        super().__init__(f"File {filename} exceeds the maximum upload size of {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+async def read_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES):
+    """Read an upload in chunks, enforcing the size limit and hashing as it goes.
+
+    Returns (file_bytes, sha256_hex). Chunks are appended to a single BytesIO
+    whose buffer is handed out by getvalue() without another copy.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise UploadTooLargeError(file.filename, max_bytes)
+
+    started = time.perf_counter()
+    digest = hashlib.sha256()
+    buffer = io.BytesIO()
+    total = 0
+    with tracing.span("upload_read") as span:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            total += len(chunk)
+            if total > max_bytes:
+                raise UploadTooLargeError(file.filename, max_bytes)
+            digest.update(chunk)
+            buffer.write(chunk)
+        if span is not None:
+            span.set(bytes=total)
+    metrics.observe_stage("upload_read", time.perf_counter() - started)
+    return buffer.getvalue(), digest.hexdigest()
+
+
+class _FilePartGuard:
+    """Follows a multipart body as it streams in and raises UploadTooLargeError
+    as soon as one file part grows past `max_bytes`.
+
+    Form fields without a filename are left to Starlette's own part limit. A
+    body the parser cannot follow is left to Starlette to reject.
+    """
+
+    def __init__(self, boundary: bytes, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.filename = None
+        self.size = 0
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self.broken = False
+        self._parser = python_multipart.MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_part_data": self._on_part_data,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+        })
+
+    def write(self, chunk: bytes):
+        if self.broken or not chunk:
+            return
+        try:
+            self._parser.write(chunk)
+        except FormParserError:
+            self.broken = True
+
+    def _on_part_begin(self):
+        self.filename = None
+        self.size = 0
+        self._disposition = b""
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        if b"filename" in options:
+            self.filename = options[b"filename"].decode("utf-8", "replace")
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self.filename is None:
+            return
+        self.size += end - start
+        if self.size > self.max_bytes:
+            raise UploadTooLargeError(self.filename, self.max_bytes)
+
+
+class RequestSizeLimitMiddleware:
+    """Reject request bodies larger than `max_bytes` with 413.
+
+    Requests declaring a larger Content-Length are rejected before any of the
+    body is read; chunked bodies are cut off as soon as the limit is crossed.
+    Multipart uploads to `single_file_paths` are also cut off as soon as the
+    file passes `max_file_bytes`, before Starlette spools the rest of it to
+    disk. Other paths (the batch endpoint) check each file in read_upload, so
+    one oversized file only fails its own entry.
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_REQUEST_BYTES, max_file_bytes: int = MAX_UPLOAD_BYTES,
+                 single_file_paths: tuple = ()):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.single_file_paths = set(single_file_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_bytes:
+            await self._reject(send, self._body_detail())
+            return
+
+        guard = None
+        content_type, params = parse_options_header(headers.get(b"content-type", b""))
+        if (scope["path"] in self.single_file_paths and content_type == b"multipart/form-data"
+                and params.get(b"boundary")):
+            guard = _FilePartGuard(params[b"boundary"], self.max_file_bytes)
+
+        received = 0
+        too_large = None
+        responded = False
+
+        async def limited_receive():
+            nonlocal received, too_large
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                received += len(body)
+                if received > self.max_bytes:
+                    too_large = self._body_detail()
+                    raise UploadTooLargeError("request body", self.max_bytes)
+                if guard is not None:
+                    try:
+                        guard.write(body)
+                    except UploadTooLargeError as e:
+                        too_large = str(e)
+                        raise
+            return message
+
+        async def guarded_send(message):
+            nonlocal responded
+            # Form parsing turns our error into a generic 400; answer 413 instead
+            if too_large:
+                if message["type"] == "http.response.start" and not responded:
+                    responded = True
+                    await self._reject(send, too_large)
+                return
+            responded = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except UploadTooLargeError:
+            if responded:
+                raise
+            responded = True
+            await self._reject(send, too_large or self._body_detail())
+        if too_large:
+            logger.warning(f"Rejected upload: {too_large}")
+
+    def _body_detail(self) -> str:
+        return f"Request body exceeds the maximum size of {self.max_bytes} bytes"
+
+    async def _reject(self, send, detail: str):
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
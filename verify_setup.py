@@ -74,7 +74,7 @@ dependencies = [
     ('uvicorn', 'Uvicorn'),
     ('pdfplumber', 'PDF Plumber'),
     ('python-docx', 'python-docx'),
-    ('pandas', 'Pandas'),
+    ('openpyxl', 'openpyxl'),
     ('PIL', 'Pillow'),
 ]
 